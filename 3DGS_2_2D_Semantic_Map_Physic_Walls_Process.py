@@ -2,8 +2,8 @@ import os
 import numpy as np
 import json
 from PIL import Image
-from shapely.geometry import Polygon, Point
 from scipy.ndimage import label as nd_label  # 用于墙体分块
+from utils.kernels import points_in_polygon
 
 def format2(x):
     return "{:.2f}".format(float(x))
@@ -59,7 +59,6 @@ for subdir in sorted(os.listdir(root_dir)):
         cat_id = label2id[label]
         poly3d = obj["bounding_box"]
         poly2d = [[v["x"], v["y"]] for v in poly3d[:4]]
-        poly = Polygon(poly2d)
         xys = np.array(poly2d)
         min_x_pixel = int(np.floor((np.min(xys[:, 0]) - x_min) / scale))
         max_x_pixel = int(np.floor((np.max(xys[:, 0]) - x_min) / scale))
@@ -70,15 +69,11 @@ for subdir in sorted(os.listdir(root_dir)):
         min_y_pixel = np.clip(min_y_pixel, 0, h - 1)
         max_y_pixel = np.clip(max_y_pixel, 0, h - 1)
         mask = np.zeros((h, w), dtype=bool)
-        for j in range(min_x_pixel, max_x_pixel + 1):
-            for i in range(min_y_pixel, max_y_pixel + 1):
-                i_flip = h - 1 - i
-                j_flip = w - 1 - j
-                cx = x_min + (j + 0.5) * scale
-                cy = y_min + (i + 0.5) * scale
-                p = Point(cx, cy)
-                if poly.covers(p):
-                    mask[i_flip, j_flip] = True
+        jj, ii = np.meshgrid(np.arange(min_x_pixel, max_x_pixel + 1), np.arange(min_y_pixel, max_y_pixel + 1))
+        cx = x_min + (jj + 0.5) * scale
+        cy = y_min + (ii + 0.5) * scale
+        covered = points_in_polygon(cx, cy, poly2d).reshape(jj.shape)
+        mask[h - 1 - ii[covered], w - 1 - jj[covered]] = True
         ys, xs = np.where(mask)
         if xs.size == 0 or ys.size == 0:
             continue
@@ -2,19 +2,47 @@
 新增接口：
 - add_wall: 直接添加墙体对象，支持自定义大小和位置，自动做碰撞检测与grid map更新。
 - check_path_collision_with_grid: 检查轨迹Path是否与grid map障碍发生碰撞。
+- check_trajectory_collision_with_grid: 检查AgentState位姿序列扫过的区域是否与grid map障碍碰撞，返回第一个碰撞时间下标。
+- check_trajectories_collision_with_grid: 批量检查多条位姿序列。
+- find_objects_in_bbox / find_objects_at_point / find_nearest_objects: 基于空间索引的物体邻近查询。
+- get_object_at: 查询某点所在格子的物体，优先使用实例标签栅格。
+- remove_object / move_object: 基于引用计数栅格删除、移动物体，只更新受影响的格子。
+- 物体变化只记录脏区域，grid map在读取时才按脏区域重新栅格化（见MapRepresentation.grid_map），
+  覆盖规则与全量生成相同（格子左下角规则）；update_grid_map_full默认全量重建，incremental=True时只处理脏区域。
+- add_objects_batch: 批量添加物体，一次碰撞检测（报告全部冲突）和一次栅格更新。
+- get_inflated_grid_map: 带缓存的膨胀grid map，通过地图变化事件自动失效。
+- get_packed_grid_map: 带缓存的位压缩grid map（PackedGrid），get_inflated_grid_map(packed=True)在压缩数据上膨胀。
+- get_height_occupancy / get_height_band_grid_map: 逐格障碍高度范围，以及任意高度区间对应的二值grid map（按区间缓存）。
+- auto_crop_canvas: 把画布收缩到物体范围，并相应平移地图原点。
+- 分辨率和原点按地图记录（MapRepresentation.resolution / origin），各接口未指定分辨率时使用地图的分辨率，
+  物体、路径和位姿始终使用世界坐标。
 """
 # 地图编辑相关通用方法
 import os
 import json
-from core.data_structures import MapRepresentation, MapObject, Path, SourceType
+from core.data_structures import MapRepresentation, MapObject, Path, SourceType, AgentState
+from core.object_table import MIN_Z, MAX_Z
+from core.bitgrid import PackedGrid
+from core.events import DerivedCache, MapEventType, OBJECT_EVENTS
+from core.height_occupancy import HeightOccupancy, build_height_occupancy
+from core.instance_map import InstanceMap
 from utils.config import config
-from typing import Tuple, List
-from processors.geometry_processor import generate_grid_map_from_objects
+from utils.grid_map_storage import GridMapStorage
+from typing import Tuple, List, Optional
+from processors.geometry_processor import generate_grid_map_from_objects, find_first_swept_collision
+from utils.kernels import path_hits_obstacle, cell_window, to_grid_frame
+from utils.map_container import is_map_container, load_map_container
+from utils.grid_cache import get_grid_cache, map_grid_cache_key
+from utils.map_cache import get_map_cache
+from planners.astar import expand_obstacles
 import numpy as np
 
-def create_map(map_id: str, canvas_size: Tuple[float, float], source_type: SourceType = SourceType.OTHER) -> MapRepresentation:
+def create_map(map_id: str, canvas_size: Tuple[float, float], source_type: SourceType = SourceType.OTHER,
+               resolution: float = None, origin: Tuple[float, float] = None) -> MapRepresentation:
     """
     新建地图对象
+    :param resolution: 地图的网格分辨率，默认为配置值
+    :param origin: 画布左下角的世界坐标，默认为(0, 0)
     """
     return MapRepresentation(
         map_id=map_id,
@@ -23,14 +51,21 @@ def create_map(map_id: str, canvas_size: Tuple[float, float], source_type: Sourc
         grid_map=None,
         scene_description="",
         canvas_size=canvas_size,
+        resolution=resolution,
+        origin=origin,
     )
 
-def load_existing_map(map_file_path: str = "data/maps/complete_indoor_scene.json") -> MapRepresentation:
+def load_existing_map(map_file_path: str = "data/maps/complete_indoor_scene.json", use_cache: bool = True,
+                      read_only: bool = False) -> MapRepresentation:
     """
-    加载已保存的地图文件
+    加载已保存的地图文件（JSON，或二进制地图容器.navimap，后者的grid map以内存映射方式加载）。
+    同一文件（及其grid map文件）未变化时从进程内地图缓存（utils.map_cache）返回，不再读盘解码。
     
     Args:
         map_file_path: 地图文件路径
+        use_cache: 是否使用地图缓存（还受配置performance.map_cache_enabled控制）
+        read_only: 为True时直接返回缓存中共享的只读地图（修改会抛出TypeError），
+                   否则返回独立的可写副本（grid_map可原地修改）
         
     Returns:
         MapRepresentation对象
@@ -43,11 +78,18 @@ def load_existing_map(map_file_path: str = "data/maps/complete_indoor_scene.json
         raise FileNotFoundError(f"地图文件不存在: {map_file_path}")
     
     try:
-        map_rep = MapRepresentation.load_from_json(map_file_path)
-        return map_rep
+        cache = get_map_cache() if use_cache else None
+        if cache is not None:
+            return cache.get(map_file_path, _load_map_file, read_only)
+        return _load_map_file(map_file_path)
     except Exception as e:
         raise Exception(f"加载地图失败: {e}")
 
+def _load_map_file(map_file_path: str) -> MapRepresentation:
+    if is_map_container(map_file_path):
+        return load_map_container(map_file_path)
+    return MapRepresentation.load_from_json(map_file_path)
+
 def add_object_from_file(map_rep: MapRepresentation, object_ref: str, new_position: Tuple[float, float, float] = (0.0, 0.0, 0.0), object_dir: str = "data/objects"):
     """
     通过引用物体名称或路径，自动加载物体配置文件并添加到地图，支持指定新位置。
@@ -99,8 +141,59 @@ def add_path(map_rep: MapRepresentation, path: Path, path_id: str = None):
     obj.footprint_2d = path.points
     map_rep.objects[path_id] = obj
 
-def set_canvas_size(map_rep: MapRepresentation, canvas_size: Tuple[float, float]):
+def set_canvas_size(map_rep: MapRepresentation, canvas_size: Tuple[float, float], origin: Tuple[float, float] = None):
+    """
+    设置画布大小（及可选的画布原点）。已有grid map时需要调用update_grid_map_full重新生成，
+    只裁剪到物体范围时使用auto_crop_canvas
+    """
+    map_rep.canvas_size = canvas_size
+    if origin is not None:
+        map_rep.origin = origin
+
+def auto_crop_canvas(map_rep: MapRepresentation, margin: float = 0.0) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """
+    把画布收缩到所有物体2D边界框的范围（向外扩展margin），减少grid map及附属栅格的内存。
+    新的原点和画布按原网格的格子边界对齐，且不超出原画布；已有grid map和实例标签栅格时
+    直接截取对应窗口（直接写入的静态障碍也会保留），不重新栅格化。
+    :param margin: 物体范围向外扩展的距离（米）
+    :return: (新原点, 新画布大小)
+    """
+    table = map_rep.object_table
+    if len(table.ids) == 0:
+        raise ValueError("地图中没有物体，无法裁剪画布")
+    resolution = map_rep.grid_resolution or map_rep.resolution
+    boxes = to_grid_frame(table.bboxes_2d(), map_rep.origin)
+    c0 = int(np.floor((boxes[:, 0].min() - margin) / resolution))
+    r0 = int(np.floor((boxes[:, 1].min() - margin) / resolution))
+    c1 = int(np.ceil((boxes[:, 2].max() + margin) / resolution))
+    r1 = int(np.ceil((boxes[:, 3].max() + margin) / resolution))
+    if map_rep.canvas_size is not None:
+        width, height = map_rep.canvas_size
+        grid_h, grid_w = int(round(height / resolution)), int(round(width / resolution))
+        r0, c0 = max(r0, 0), max(c0, 0)
+        r1, c1 = min(r1, grid_h), min(c1, grid_w)
+        if r0 >= r1 or c0 >= c1:
+            raise ValueError("物体都在画布之外，无法裁剪画布")
+    
+    window = (r0, r1, c0, c1)
+    grid_map = instance_map = None
+    if map_rep.grid_shape is not None and map_rep.canvas_size is not None and map_rep.grid_shape == (grid_h, grid_w):
+        grid_map = np.array(map_rep.read_grid_window(window), dtype=np.uint8)
+        im = map_rep.instance_map
+        if im is not None and im.shape == (grid_h, grid_w):
+            instance_map = InstanceMap(im.labels[r0:r1, c0:c1].copy(), im.object_ids,
+                                       im.z_min[r0:r1, c0:c1].copy(), im.z_max[r0:r1, c0:c1].copy())
+    
+    ox, oy = map_rep.origin
+    origin = (ox + c0 * resolution, oy + r0 * resolution)
+    canvas_size = ((c1 - c0) * resolution, (r1 - r0) * resolution)
+    map_rep.origin = origin
     map_rep.canvas_size = canvas_size
+    if grid_map is not None:
+        map_rep.instance_map = instance_map
+        map_rep.grid_map = grid_map
+        map_rep.grid_resolution = resolution
+    return origin, canvas_size
 
 def check_collision_with_grid(map_rep: MapRepresentation, map_object: MapObject, resolution: float = None) -> bool:
     """
@@ -108,58 +201,155 @@ def check_collision_with_grid(map_rep: MapRepresentation, map_object: MapObject,
     返回True表示有不可叠加的碰撞，False表示可添加。
     """
     if resolution is None:
-        resolution = config.get_default_resolution()
+        resolution = map_rep.resolution
     
-    if map_rep.grid_map is None:
+    if map_rep.grid_shape is None:
         return False
+    # 只有高度重叠且2D边界框相交的现有物体可能构成碰撞
+    rows = _height_overlapping_neighbors(map_rep, map_object)
+    return bool(_blocked_overlaps(map_rep, map_object, rows, resolution, first_only=True))
+
+def _height_overlapping_neighbors(map_rep: MapRepresentation, map_object: MapObject) -> np.ndarray:
+    """
+    通过空间索引找出与物体2D边界框相交、且高度范围重叠的现有物体，返回其在列式表中的行号。
+    """
+    table = map_rep.object_table
+    rows = table.rows_of(map_rep.spatial_index.query_bbox(map_object.get_bbox_2d()))
+    z_min, z_max = map_object.get_bbox_3d()[2], map_object.get_bbox_3d()[5]
+    bounds = table.bounds[rows]
+    return rows[(bounds[:, MAX_Z] > z_min) & (bounds[:, MIN_Z] < z_max)]
+
+def _blocked_overlaps(map_rep: MapRepresentation, map_object: MapObject, rows: np.ndarray, resolution: float, first_only: bool = False) -> List[str]:
+    """
+    找出与新物体的2D交集区域内（按格子中心判断）存在障碍格的现有物体。
+    :param rows: 候选物体在列式表中的行号
+    :param first_only: 为True时找到第一个即返回
+    :return: 发生碰撞的物体键列表
+    """
+    table = map_rep.object_table
     min_x, min_y, max_x, max_y = map_object.get_bbox_2d()
-    width, height = map_rep.canvas_size
-    grid_h, grid_w = map_rep.grid_map.shape  # (行,列)=(y,x)
-    for row in range(grid_h):
-        for col in range(grid_w):
-            x = (col + 0.5) * resolution
-            y = (row + 0.5) * resolution
-            if (min_x <= x <= max_x) and (min_y <= y <= max_y) and map_rep.grid_map[row, col] == 0:
-                # 找到重叠区域，判断高度
-                for obj in map_rep.objects.values():
-                    omin_x, omin_y, omax_x, omax_y = obj.get_bbox_2d()
-                    if (omin_x <= x <= omax_x) and (omin_y <= y <= omax_y):
-                        z_min1, z_max1 = map_object.get_bbox_3d()[2], map_object.get_bbox_3d()[5]
-                        z_min2, z_max2 = obj.get_bbox_3d()[2], obj.get_bbox_3d()[5]
-                        if not (z_max1 <= z_min2 or z_min1 >= z_max2):
-                            return True
-    return False
+    grid_shape = map_rep.grid_shape
+    hits = []
+    for row, (omin_x, omin_y, omax_x, omax_y) in zip(rows, table.bboxes_2d()[rows]):
+        overlap = (max(min_x, omin_x), max(min_y, omin_y), min(max_x, omax_x), min(max_y, omax_y))
+        r0, r1, c0, c1 = cell_window(overlap, resolution, grid_shape, centered=True, origin=map_rep.origin)
+        if r0 < r1 and c0 < c1 and np.any(map_rep.read_grid_window((r0, r1, c0, c1)) == 0):
+            hits.append(table.ids[row])
+            if first_only:
+                break
+    return hits
 
 def update_grid_map_incremental(map_rep: MapRepresentation, map_object: MapObject, resolution: float = None):
     """
     增量更新grid map，只添加新物体的障碍区域。
+    已在objects中的物体在加入时已被标记为脏，实际栅格化推迟到下一次读取grid_map时，只处理脏区域。
     """
     if resolution is None:
-        resolution = config.get_default_resolution()
+        resolution = map_rep.resolution
     
-    if map_rep.grid_map is None:
+    if map_rep.grid_shape is None:
         # 没有grid map，先全量生成
-        map_rep.grid_map = generate_grid_map_from_objects(map_rep, resolution)
+        _assign_generated_grid(map_rep, resolution)
         return
-        
-    min_x, min_y, max_x, max_y = map_object.get_bbox_2d()
-    grid_h, grid_w = map_rep.grid_map.shape
-    for row in range(grid_h):
-        for col in range(grid_w):
-            x = (col + 0.5) * resolution
-            y = (row + 0.5) * resolution
-            if (min_x <= x <= max_x) and (min_y <= y <= max_y):
-                map_rep.grid_map[row, col] = 0
+    
+    if map_rep.objects.get(map_object.id) is map_object:
+        # 加入objects时已标记为脏（原地修改过的物体需调用map_rep.mark_dirty）
+        return
+    # 不在地图中的物体直接写入grid，之后视为静态障碍
+    # 与全量生成相同，格子左下角落在bbox（右上边界开区间）内即标记为障碍
+    window = cell_window(map_object.get_bbox_2d(), resolution, map_rep.grid_shape, centered=False, origin=map_rep.origin)
+    map_rep.write_grid_window(window, 0)
+    map_rep.occupancy = None
+
+def _assign_generated_grid(map_rep: MapRepresentation, resolution: float):
+    """全量生成grid map并记录其分辨率（已有实例标签栅格时一并重建）"""
+    with_instances = map_rep.instance_map is not None
+    map_rep.grid_map = generate_grid_map_from_objects(map_rep, resolution, with_instances=with_instances)
+    map_rep.grid_resolution = resolution
+    map_rep.grid_digest = map_grid_cache_key(map_rep, resolution)
 
-def update_grid_map_full(map_rep: MapRepresentation, resolution: float = None):
+def update_grid_map_full(map_rep: MapRepresentation, resolution: float = None, incremental: bool = False,
+                         auto_crop: bool = False, crop_margin: float = 0.0):
     """
     全量更新grid map，遍历所有物体。
-    使用0.01精度，并自动保存为PNG文件。
+    默认使用地图的分辨率，并自动保存为PNG文件。
+    :param incremental: 为True且已有相同分辨率和大小的grid map时，只重新栅格化自上次更新以来变化的物体
+                        （原地修改过position/size的物体也会被发现并刷新）
+    :param auto_crop: 为True时先把画布收缩到物体范围（见auto_crop_canvas）
+    :param crop_margin: 裁剪时物体范围向外扩展的距离（米）
     """
     if resolution is None:
-        resolution = config.get_default_resolution()  # 现在默认是0.01
+        resolution = map_rep.resolution
+    # 原地修改过的物体先刷新列式表，全量和增量两种方式都以物体的当前位置为准
+    map_rep.sync_objects()
+    if auto_crop and len(map_rep.objects) > 0:
+        auto_crop_canvas(map_rep, crop_margin)
     
-    map_rep.grid_map = generate_grid_map_from_objects(map_rep, resolution)
+    if incremental and map_rep.grid_shape is not None and map_rep.grid_resolution in (None, resolution) \
+            and map_rep.canvas_size is not None \
+            and map_rep.grid_shape == GridMapStorage.grid_shape(map_rep.canvas_size, resolution):
+        # 读取grid_map即应用脏区域
+        if config.get_png_storage_enabled():
+            map_rep.save_grid_map_as_png()
+        return
+    _assign_generated_grid(map_rep, resolution)
+
+def remove_object(map_rep: MapRepresentation, object_id: str) -> MapObject:
+    """
+    删除物体。grid map中只有其覆盖区域会在下次读取时按引用计数刷新，被其他物体覆盖的格子保持为障碍。
+    :param object_id: 物体键
+    :return: 被删除的物体
+    :raises KeyError: 物体不存在
+    """
+    if object_id not in map_rep.objects:
+        raise KeyError(f"物体不存在: {object_id}")
+    return map_rep.objects.pop(object_id)
+
+def move_object(map_rep: MapRepresentation, object_id: str, new_position: Tuple[float, float, float], resolution: float = None, check_collision: bool = True) -> MapObject:
+    """
+    移动物体到新位置，只更新旧位置和新位置的覆盖区域。
+    移动后的物体是一个新的MapObject（保持label、size、id不变），原对象不被修改。
+    :param object_id: 物体键
+    :param new_position: 新的左下底角位置 (x, y, z)
+    :param check_collision: 是否对新位置做碰撞检测（墙体使用墙体规则）
+    :return: 移动后的物体
+    :raises KeyError: 物体不存在
+    :raises ValueError: 新位置发生碰撞，此时物体留在原位置
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    
+    # 临时移出再放回只对外发出一个OBJECT_MOVED事件
+    with map_rep.coalesce_object_events():
+        old_object = remove_object(map_rep, object_id)
+        new_object = MapObject(label=old_object.label, size=old_object.size, position=tuple(new_position), id=old_object.id)
+        if check_collision:
+            check = check_wall_collision_with_furniture if new_object.label == "wall" else check_collision_with_grid
+            if check(map_rep, new_object, resolution):
+                map_rep.objects[object_id] = old_object
+                raise ValueError("物体移动后与现有物体发生不可叠加的碰撞，移动失败！")
+        map_rep.objects[object_id] = new_object
+    return new_object
+
+def get_object_at(map_rep: MapRepresentation, x: float, y: float, resolution: float = None) -> Optional[MapObject]:
+    """
+    查询占据点 (x, y) 所在格子的物体，重叠时返回最高的物体。
+    有实例标签栅格时直接查表，否则退化为空间索引查询。
+    :return: MapObject，无物体时返回None
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    
+    instance_map = map_rep.instance_map
+    if instance_map is not None:
+        map_rep.flush()
+        ox, oy = map_rep.origin
+        object_id = instance_map.object_id_at(int((y - oy) // resolution), int((x - ox) // resolution))
+        return map_rep.objects.get(object_id) if object_id is not None else None
+    candidates = find_objects_at_point(map_rep, x, y)
+    if not candidates:
+        return None
+    return max(candidates, key=lambda obj: obj.get_bbox_3d()[5])
 
 def add_object_with_collision_check(map_rep: MapRepresentation, object_ref: str, new_position: Tuple[float, float, float] = (0.0, 0.0, 0.0), object_dir: str = "data/objects", resolution: float = None):
     """
@@ -170,14 +360,14 @@ def add_object_with_collision_check(map_rep: MapRepresentation, object_ref: str,
         object_ref: 物体引用（文件名或完整路径）
         new_position: 物体位置 (x, y, z)，默认为 (0.0, 0.0, 0.0)
         object_dir: 物体文件目录，默认为 "data/objects"
-        resolution: 栅格地图分辨率，默认为配置中的默认值
+        resolution: 栅格地图分辨率，默认为地图的分辨率
         
     Raises:
         FileNotFoundError: 物体配置文件不存在
         ValueError: 发生碰撞
     """
     if resolution is None:
-        resolution = config.get_default_resolution()
+        resolution = map_rep.resolution
     
     # 先加载物体但不加入map_rep
     if os.path.isfile(object_ref):
@@ -209,13 +399,119 @@ def add_object_with_collision_check(map_rep: MapRepresentation, object_ref: str,
     # 增量更新grid map
     update_grid_map_incremental(map_rep, obj, resolution)
 
+class BatchCollisionError(ValueError):
+    """
+    批量添加物体时发生碰撞。
+    conflicts为 [(批次内下标, 冲突对象), ...]，冲突对象为现有物体的键，
+    或批次内更早物体的下标（int）。
+    """
+
+    def __init__(self, conflicts: List[Tuple[int, object]]):
+        self.conflicts = conflicts
+        super().__init__(f"批量添加失败，共 {len(conflicts)} 处不可叠加的碰撞: {conflicts}")
+
+def _batch_pairwise_conflicts(bounds: np.ndarray, grid_shape: Tuple[int, int], resolution: float,
+                              origin: Tuple[float, float] = (0.0, 0.0)) -> List[Tuple[int, int]]:
+    """
+    批次内物体两两碰撞检测（向量化），规则与逐个添加时相同：
+    2D交集内存在格子中心、且高度范围重叠即视为碰撞。
+    :param bounds: (N, 6) 的3D边界框（世界坐标）
+    :param origin: grid第(0, 0)格左下角的世界坐标
+    :return: [(后加入的下标j, 先加入的下标i), ...]，i < j
+    """
+    n = len(bounds)
+    if n < 2:
+        return []
+    grid_h, grid_w = grid_shape
+    xs = (np.arange(grid_w) + 0.5) * resolution
+    ys = (np.arange(grid_h) + 0.5) * resolution
+    i, j = np.triu_indices(n, k=1)
+    bounds = to_grid_frame(bounds, origin)
+    bi, bj = bounds[i], bounds[j]
+    lo = np.maximum(bi, bj)
+    hi = np.minimum(bi, bj)
+    # 交集矩形 [lo_x, hi_x] x [lo_y, hi_y]，高度区间需严格重叠
+    lo_x, lo_y, hi_x, hi_y = lo[:, 0], lo[:, 1], hi[:, 3], hi[:, 4]
+    hit = (lo_x <= hi_x) & (lo_y <= hi_y) & (np.minimum(bi[:, 5], bj[:, 5]) > np.maximum(bi[:, 2], bj[:, 2]))
+    hit &= np.searchsorted(xs, lo_x, side="left") < np.searchsorted(xs, hi_x, side="right")
+    hit &= np.searchsorted(ys, lo_y, side="left") < np.searchsorted(ys, hi_y, side="right")
+    return [(int(b), int(a)) for a, b in zip(i[hit], j[hit])]
+
+def add_objects_batch(map_rep: MapRepresentation, items: List[Tuple[str, Tuple[float, float, float]]], object_dir: str = "data/objects", resolution: float = None) -> List[MapObject]:
+    """
+    批量添加物体：每个模板文件只读取一次，批量分配唯一id，
+    对整批物体做一次与现有地图及批次内部的碰撞检测，全部通过后再一次性更新grid map。
+    任一物体碰撞时整批都不添加。
+    
+    Args:
+        map_rep: 地图表示对象
+        items: [(物体引用, 位置(x, y, z)), ...]，物体引用含义同add_object_with_collision_check
+        object_dir: 物体文件目录，默认为 "data/objects"
+        resolution: 栅格地图分辨率，默认为地图的分辨率
+        
+    Returns:
+        按items顺序返回添加的物体
+        
+    Raises:
+        FileNotFoundError: 物体配置文件不存在
+        BatchCollisionError: 存在碰撞，conflicts中列出所有冲突
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    
+    templates = {}
+    used_ids = set(map_rep.objects)
+    next_suffix = {}
+    new_objects = []
+    for object_ref, position in items:
+        template = templates.get(object_ref)
+        if template is None:
+            path = object_ref if os.path.isfile(object_ref) else os.path.join(object_dir, f"{object_ref}.json")
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"物体配置文件不存在: {path}")
+            template = templates[object_ref] = MapObject.load_from_json(path)
+        # 与逐个添加相同的命名规则：base, base_2, base_3, ...
+        base_id = template.id
+        new_id = base_id
+        i = next_suffix.get(base_id, 1)
+        while new_id in used_ids:
+            i += 1
+            new_id = f"{base_id}_{i}"
+        next_suffix[base_id] = i
+        used_ids.add(new_id)
+        new_objects.append(MapObject(template.label, template.size, tuple(position), new_id))
+    
+    conflicts = []
+    if map_rep.grid_shape is not None:
+        for k, obj in enumerate(new_objects):
+            rows = _height_overlapping_neighbors(map_rep, obj)
+            conflicts.extend((k, key) for key in _blocked_overlaps(map_rep, obj, rows, resolution))
+        grid_shape = map_rep.grid_shape
+    else:
+        if map_rep.canvas_size is None:
+            raise ValueError("Map canvas_size未设置，无法生成grid map")
+        width, height = map_rep.canvas_size
+        grid_shape = (int(round(height / resolution)), int(round(width / resolution)))
+    bounds = np.array([obj.get_bbox_3d() for obj in new_objects], dtype=np.float64).reshape(-1, 6)
+    conflicts.extend(_batch_pairwise_conflicts(bounds, grid_shape, resolution, map_rep.origin))
+    if conflicts:
+        conflicts.sort(key=lambda c: c[0])
+        raise BatchCollisionError(conflicts)
+    
+    # 加入objects即标记为脏，下次读取grid_map时一次性栅格化
+    for obj in new_objects:
+        map_rep.objects[obj.id] = obj
+    if map_rep.grid_shape is None:
+        _assign_generated_grid(map_rep, resolution)
+    return new_objects
+
 def add_wall(map_rep: MapRepresentation, wall_id: str, size: Tuple[float, float, float], position: Tuple[float, float, float], resolution: float = None):
     """
     直接添加墙体对象（无需json文件），自动做碰撞检测与grid map更新。
     墙体有特殊的碰撞检测逻辑：允许与其他墙体重叠，但不与家具重叠。
     """
     if resolution is None:
-        resolution = config.get_default_resolution()
+        resolution = map_rep.resolution
     
     wall_obj = MapObject(
         label="wall",
@@ -246,34 +542,16 @@ def check_wall_collision_with_furniture(map_rep: MapRepresentation, wall_object:
     返回True表示有不可叠加的碰撞，False表示可添加。
     """
     if resolution is None:
-        resolution = config.get_default_resolution()
+        resolution = map_rep.resolution
     
-    if map_rep.grid_map is None:
+    if map_rep.grid_shape is None:
         return False
     
-    min_x, min_y, max_x, max_y = wall_object.get_bbox_2d()
-    width, height = map_rep.canvas_size
-    grid_h, grid_w = map_rep.grid_map.shape  # (行,列)=(y,x)
-    
-    for row in range(grid_h):
-        for col in range(grid_w):
-            x = (col + 0.5) * resolution
-            y = (row + 0.5) * resolution
-            if (min_x <= x <= max_x) and (min_y <= y <= max_y) and map_rep.grid_map[row, col] == 0:
-                # 找到重叠区域，检查是否与家具重叠
-                for obj in map_rep.objects.values():
-                    # 跳过其他墙体
-                    if obj.label == "wall":
-                        continue
-                    
-                    omin_x, omin_y, omax_x, omax_y = obj.get_bbox_2d()
-                    if (omin_x <= x <= omax_x) and (omin_y <= y <= omax_y):
-                        # 检查高度重叠
-                        z_min1, z_max1 = wall_object.get_bbox_3d()[2], wall_object.get_bbox_3d()[5]
-                        z_min2, z_max2 = obj.get_bbox_3d()[2], obj.get_bbox_3d()[5]
-                        if not (z_max1 <= z_min2 or z_min1 >= z_max2):
-                            return True
-    return False
+    table = map_rep.object_table
+    # 跳过其他墙体，只检查高度重叠且2D边界框相交的家具
+    rows = _height_overlapping_neighbors(map_rep, wall_object)
+    rows = rows[table.label_codes[rows] != table.label_index.get("wall", -1)]
+    return bool(_blocked_overlaps(map_rep, wall_object, rows, resolution, first_only=True))
 
 
 def check_path_collision_with_grid(map_rep: MapRepresentation, path: Path, resolution: float = None, sample_step: float = None) -> bool:
@@ -282,28 +560,159 @@ def check_path_collision_with_grid(map_rep: MapRepresentation, path: Path, resol
     对每一段线段采样若干点，若有点落在障碍格上则判为碰撞。
     """
     if resolution is None:
-        resolution = config.get_default_resolution()
+        resolution = map_rep.resolution
     if sample_step is None:
         sample_step = config.get_sample_step()
     
-    if map_rep.grid_map is None:
+    if map_rep.grid_shape is None:
         return False
-    grid_h, grid_w = map_rep.grid_map.shape
-    points = path.points
-    for idx in range(len(points) - 1):
-        x0, y0 = points[idx]
-        x1, y1 = points[idx + 1]
-        dx = x1 - x0
-        dy = y1 - y0
-        dist = (dx ** 2 + dy ** 2) ** 0.5
-        steps = max(2, int(dist / sample_step) + 1)
-        for s in range(steps + 1):
-            t = s / steps
-            x = x0 + t * dx
-            y = y0 + t * dy
-            col = int(x // resolution)
-            row = int(y // resolution)
-            if 0 <= row < grid_h and 0 <= col < grid_w:
-                if map_rep.grid_map[row, col] == 0:
-                    return True
-    return False
+    points = np.asarray(path.points, dtype=np.float64).reshape(-1, 2) - np.asarray(map_rep.origin)
+    return path_hits_obstacle(map_rep.grid_map, points, resolution, sample_step)
+
+def check_trajectory_collision_with_grid(map_rep: MapRepresentation, states: List[AgentState], resolution: float = None) -> Optional[int]:
+    """
+    检查按时间排序的AgentState位姿序列是否与grid map障碍发生碰撞。
+    不只检查采样位姿，还检查相邻位姿之间机器人轮廓扫过的所有格子。
+    
+    Args:
+        map_rep: 地图表示对象
+        states: 按时间排序的机器人位姿序列（轮廓为以边界框中心为原点、按orientation旋转的矩形）
+        resolution: 栅格地图分辨率，默认为地图的分辨率
+        
+    Returns:
+        第一个发生碰撞的时间下标：0表示起始位姿本身碰撞，k>0表示在states[k-1]到states[k]之间碰撞；
+        无碰撞时返回None
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    
+    if map_rep.grid_shape is None:
+        return None
+    return find_first_swept_collision(map_rep.grid_map, states, resolution, origin=map_rep.origin)
+
+def check_trajectories_collision_with_grid(map_rep: MapRepresentation, trajectories: List[List[AgentState]], resolution: float = None) -> List[Optional[int]]:
+    """
+    批量检查多条位姿序列，返回每条序列第一个发生碰撞的时间下标（无碰撞为None）。
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    
+    if map_rep.grid_shape is None:
+        return [None] * len(trajectories)
+    grid_map = map_rep.grid_map
+    return [find_first_swept_collision(grid_map, states, resolution, origin=map_rep.origin) for states in trajectories]
+
+
+def find_objects_in_bbox(map_rep: MapRepresentation, bbox_2d: Tuple[float, float, float, float], strict: bool = False) -> List[MapObject]:
+    """
+    查询2D边界框与给定区域相交的物体
+    :param bbox_2d: (min_x, min_y, max_x, max_y)
+    :param strict: True时只接触边界不算相交
+    :return: 物体列表
+    """
+    return [map_rep.objects[k] for k in map_rep.spatial_index.query_bbox(bbox_2d, strict)]
+
+def find_objects_at_point(map_rep: MapRepresentation, x: float, y: float) -> List[MapObject]:
+    """
+    查询2D边界框包含点 (x, y) 的物体（含边界）
+    :return: 物体列表
+    """
+    return [map_rep.objects[k] for k in map_rep.spatial_index.query_point(x, y)]
+
+def find_nearest_objects(map_rep: MapRepresentation, x: float, y: float, k: int = 1) -> List[Tuple[float, MapObject]]:
+    """
+    查询距离点 (x, y) 最近的k个物体，距离为点到物体2D边界框的距离（点在框内时为0）
+    :return: [(距离, 物体), ...]，按距离升序
+    """
+    return [(d, map_rep.objects[key]) for d, key in map_rep.spatial_index.nearest(x, y, k)]
+
+def get_inflated_grid_map(map_rep: MapRepresentation, collision_margin: float = None, resolution: float = None,
+                          packed: bool = False):
+    """
+    获取按碰撞边缘膨胀后的grid map，结果缓存在地图上，grid map发生变化时自动失效。
+    返回的数组为缓存本身，调用方不应原地修改。
+    :param collision_margin: 碰撞边缘距离（米），默认为配置值
+    :param packed: 为True时在位压缩数据上膨胀并返回PackedGrid（内存为uint8的1/8）
+    :return: 膨胀后的grid map
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    if collision_margin is None:
+        collision_margin = config.get_collision_margin()
+    
+    return inflated_grid_cache(map_rep, packed).get(collision_margin, resolution)
+
+def inflated_grid_cache(map_rep: MapRepresentation, packed: bool = False) -> DerivedCache:
+    """
+    膨胀grid map的派生缓存，键为 (collision_margin, resolution)
+    :param packed: 为True时返回位压缩膨胀结果的缓存
+    :return: DerivedCache
+    """
+    if packed:
+        return map_rep.derived_cache("packed_inflated_grid_map",
+                                     lambda m, margin, res: expand_obstacles(get_packed_grid_map(m), res, margin))
+    return map_rep.derived_cache("inflated_grid_map", _compute_inflated_grid_map)
+
+def _compute_inflated_grid_map(map_rep: MapRepresentation, collision_margin: float, resolution: float) -> np.ndarray:
+    """膨胀grid map；grid由全量生成且之后没有变化时，结果按内容摘要存入grid map缓存"""
+    digest = map_rep.grid_digest
+    cache = get_grid_cache() if digest is not None else None
+    layer_name = f"inflated_{collision_margin:g}_{resolution:g}"
+    if cache is not None:
+        layer = cache.get_layer(digest, layer_name)
+        if layer is not None:
+            return layer
+    layer = expand_obstacles(map_rep.grid_map, resolution, collision_margin)
+    if cache is not None:
+        cache.put_layer(digest, layer_name, layer)
+    return layer
+
+def get_packed_grid_map(map_rep: MapRepresentation) -> Optional[PackedGrid]:
+    """
+    获取位压缩的grid map，结果缓存在地图上，grid map发生变化时自动失效
+    :return: PackedGrid，没有grid map时返回None
+    """
+    cache = map_rep.derived_cache("packed_grid_map",
+                                  lambda m: PackedGrid.from_array(m.grid_map) if m.grid_shape is not None else None)
+    return cache.get()
+
+# 物体或画布变化时高度栅格失效
+_HEIGHT_EVENTS = OBJECT_EVENTS | {MapEventType.CANVAS_CHANGED}
+
+def get_height_occupancy(map_rep: MapRepresentation, resolution: float = None) -> HeightOccupancy:
+    """
+    获取逐格的障碍高度范围（最低底面、最高顶面），结果缓存在地图上，物体或画布变化时自动失效
+    :param resolution: 网格分辨率，默认为地图的分辨率
+    :return: HeightOccupancy
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    if map_rep.canvas_size is None:
+        raise ValueError("Map canvas_size未设置，无法生成高度栅格")
+    
+    def compute(m: MapRepresentation, res: float) -> HeightOccupancy:
+        width, height = m.canvas_size
+        shape = (int(round(height / res)), int(round(width / res)))
+        return build_height_occupancy(to_grid_frame(m.object_table.bounds, m.origin), shape, res)
+    
+    cache = map_rep.derived_cache("height_occupancy", compute, event_types=_HEIGHT_EVENTS)
+    return cache.get(resolution)
+
+def get_height_band_grid_map(map_rep: MapRepresentation, z_high: float, z_low: float = 0.0,
+                             resolution: float = None) -> np.ndarray:
+    """
+    获取只考虑高度区间 [z_low, z_high) 内物体的二值grid map，例如z_high取机器人高度时，
+    高于机器人的悬空物体（吊柜、货架顶层）下方可以通行。
+    由高度栅格一次比较得到，按区间缓存；更换机器人高度不需要重新栅格化物体。
+    返回的数组为缓存本身，调用方不应原地修改。
+    :param z_high: 区间上界（米），通常为机器人高度
+    :param z_low: 区间下界（米），通常为底盘离地间隙，默认0
+    :param resolution: 网格分辨率，默认为地图的分辨率
+    :return: grid map，0为障碍，1为可通行
+    """
+    if resolution is None:
+        resolution = map_rep.resolution
+    cache = map_rep.derived_cache("height_band_grid_map",
+                                  lambda m, lo, hi, res: get_height_occupancy(m, res).band_grid(lo, hi),
+                                  event_types=_HEIGHT_EVENTS)
+    return cache.get(float(z_low), float(z_high), resolution)
@@ -0,0 +1,294 @@
+"""
+位压缩grid map
+每格1位、每字节8格（按行压缩，bitorder='big'），取值约定与grid_map相同：1为可通行，0为障碍。
+内存为uint8 grid_map的1/8；膨胀、并集等运算直接在压缩数据上按字节完成，不需要解压。
+"""
+
+from typing import Tuple
+import numpy as np
+
+Window = Tuple[int, int, int, int]
+
+_HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class PackedGrid:
+    """
+    位压缩的二值栅格。
+    bits为形状 (height, ceil(width / 8)) 的uint8数组，每行末尾不足一字节的填充位恒为0。
+    """
+
+    ndim = 2
+
+    def __init__(self, bits: np.ndarray, width: int):
+        """
+        直接包装已压缩的数据（不复制，可用于内存映射或共享内存中的数据）
+
+        Args:
+            bits: (height, ceil(width / 8)) 的uint8数组
+            width: 栅格列数
+        """
+        if bits.ndim != 2 or bits.dtype != np.uint8 or bits.shape[1] != (width + 7) // 8:
+            raise ValueError(f"压缩数据形状 {bits.shape}/{bits.dtype} 与宽度 {width} 不匹配")
+        self.bits = bits
+        self.width = int(width)
+
+    @staticmethod
+    def from_array(grid_map) -> "PackedGrid":
+        """
+        由uint8 grid_map（0为障碍，非0为可通行）压缩得到
+
+        Args:
+            grid_map: (height, width) 数组，或支持np.asarray的栅格
+
+        Returns:
+            PackedGrid
+        """
+        grid_map = np.asarray(grid_map)
+        return PackedGrid(np.packbits(grid_map != 0, axis=1, bitorder="big"), grid_map.shape[1])
+
+    @staticmethod
+    def full(shape: Tuple[int, int], free: bool = True) -> "PackedGrid":
+        """创建全部可通行（或全部为障碍）的栅格"""
+        height, width = shape
+        grid = PackedGrid(np.zeros((height, (width + 7) // 8), dtype=np.uint8), width)
+        if free:
+            grid.bits[:] = 0xFF
+            grid._clear_padding()
+        return grid
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.bits.shape[0], self.width
+
+    @property
+    def dtype(self):
+        return np.dtype(np.uint8)
+
+    @property
+    def size(self) -> int:
+        return self.bits.shape[0] * self.width
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def __len__(self) -> int:
+        return self.bits.shape[0]
+
+    def copy(self) -> "PackedGrid":
+        return PackedGrid(self.bits.copy(), self.width)
+
+    def _padding_mask(self) -> int:
+        """最后一个字节中有效位的掩码"""
+        tail = self.width % 8
+        return 0xFF if tail == 0 else (0xFF << (8 - tail)) & 0xFF
+
+    def _clear_padding(self):
+        if self.width % 8 and self.bits.shape[1]:
+            self.bits[:, -1] &= np.uint8(self._padding_mask())
+
+    # ------------------------------------------------------------------
+    # 与uint8形式互转
+    # ------------------------------------------------------------------
+
+    def to_array(self) -> np.ndarray:
+        """解压为uint8 grid_map（新数组）"""
+        return np.unpackbits(self.bits, axis=1, count=self.width, bitorder="big")
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype, copy=False)
+
+    def rows(self, r0: int, r1: int) -> np.ndarray:
+        """解压第 [r0, r1) 行"""
+        return np.unpackbits(self.bits[r0:r1], axis=1, count=self.width, bitorder="big")
+
+    def read_window(self, window: Window) -> np.ndarray:
+        """
+        解压一个窗口，只处理窗口覆盖的字节列
+
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+
+        Returns:
+            uint8数组
+        """
+        r0, r1, c0, c1 = window
+        r0, r1 = max(r0, 0), min(r1, self.bits.shape[0])
+        c0, c1 = max(c0, 0), min(c1, self.width)
+        if r0 >= r1 or c0 >= c1:
+            return np.zeros((max(r1 - r0, 0), max(c1 - c0, 0)), dtype=np.uint8)
+        b0 = c0 // 8
+        chunk = np.unpackbits(self.bits[r0:r1, b0:(c1 + 7) // 8], axis=1, bitorder="big")
+        return chunk[:, c0 - b0 * 8:c1 - b0 * 8]
+
+    def write_window(self, window: Window, values):
+        """
+        写入一个窗口
+
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+            values: 标量或与窗口同形状的数组（非0为可通行）
+        """
+        r0, r1, c0, c1 = window
+        if r0 >= r1 or c0 >= c1:
+            return
+        b0, b1 = c0 // 8, (c1 + 7) // 8
+        chunk = np.unpackbits(self.bits[r0:r1, b0:b1], axis=1, bitorder="big")
+        chunk[:, c0 - b0 * 8:c1 - b0 * 8] = np.asarray(values) != 0
+        self.bits[r0:r1, b0:b1] = np.packbits(chunk, axis=1, bitorder="big")
+        self._clear_padding()
+
+    def _take(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return (self.bits[rows, cols >> 3] >> (7 - (cols & 7)).astype(np.uint8)) & np.uint8(1)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and len(key) == 2:
+            row, col = key
+            if isinstance(row, (int, np.integer)) and isinstance(col, (int, np.integer)):
+                height = self.bits.shape[0]
+                row, col = int(row) + (height if row < 0 else 0), int(col) + (self.width if col < 0 else 0)
+                if not (0 <= row < height and 0 <= col < self.width):
+                    raise IndexError(f"索引 ({key[0]}, {key[1]}) 超出范围 {self.shape}")
+                return np.uint8((self.bits[row, col >> 3] >> (7 - (col & 7))) & 1)
+            if isinstance(row, slice) and isinstance(col, slice) and row.step in (None, 1) and col.step in (None, 1):
+                r0, r1, _ = row.indices(self.bits.shape[0])
+                c0, c1, _ = col.indices(self.width)
+                return self.read_window((r0, max(r1, r0), c0, max(c1, c0)))
+            if isinstance(row, np.ndarray) and isinstance(col, np.ndarray) and row.dtype.kind in "iu" and col.dtype.kind in "iu":
+                col = np.asarray(col, dtype=np.int64)
+                col = np.where(col < 0, col + self.width, col)
+                if col.size and (col.min() < 0 or col.max() >= self.width):
+                    raise IndexError(f"索引超出范围 {self.shape}")
+                return self._take(row, col)
+        # 其他索引方式在解压后的数组上完成
+        return self.to_array()[key]
+
+    # ------------------------------------------------------------------
+    # 按位运算
+    # ------------------------------------------------------------------
+
+    def _check_same_shape(self, other: "PackedGrid"):
+        if self.shape != other.shape:
+            raise ValueError(f"形状不一致: {self.shape} vs {other.shape}")
+
+    def __and__(self, other: "PackedGrid") -> "PackedGrid":
+        """两者都可通行才可通行（即障碍的并集）"""
+        self._check_same_shape(other)
+        return PackedGrid(self.bits & other.bits, self.width)
+
+    def __or__(self, other: "PackedGrid") -> "PackedGrid":
+        """任一可通行即可通行（即障碍的交集）"""
+        self._check_same_shape(other)
+        return PackedGrid(self.bits | other.bits, self.width)
+
+    def __invert__(self) -> "PackedGrid":
+        grid = PackedGrid(~self.bits, self.width)
+        grid._clear_padding()
+        return grid
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PackedGrid):
+            return NotImplemented
+        return self.shape == other.shape and bool(np.array_equal(self.bits, other.bits))
+
+    __hash__ = None
+
+    def free_count(self) -> int:
+        """可通行格子数"""
+        if _HAS_BITWISE_COUNT:
+            return int(np.bitwise_count(self.bits).sum(dtype=np.int64))
+        return int(_POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def obstacle_count(self) -> int:
+        """障碍格子数"""
+        return self.size - self.free_count()
+
+    def inflate(self, expand_cells: int) -> "PackedGrid":
+        """
+        方形膨胀障碍物（与inflate_obstacles一致，越界部分视为可通行），
+        等价于对可通行位做腐蚀：每格在 [i - k, i + k] 方形窗口内全部可通行时才保持可通行
+
+        Args:
+            expand_cells: 膨胀格子数
+
+        Returns:
+            新的PackedGrid
+        """
+        if expand_cells <= 0:
+            return self.copy()
+        bits = self.bits.copy()
+        # 计算期间填充位视为可通行，避免右边界之外被当成障碍
+        if self.width % 8 and bits.shape[1]:
+            bits[:, -1] |= np.uint8(~self._padding_mask() & 0xFF)
+        k = int(expand_cells)
+        bits = _run_and(bits, k + 1, lambda x, n: _shift_cols(x, n)) & _run_and(bits, k + 1, lambda x, n: _shift_cols(x, -n))
+        bits = _run_and(bits, k + 1, lambda x, n: _shift_rows(x, n)) & _run_and(bits, k + 1, lambda x, n: _shift_rows(x, -n))
+        grid = PackedGrid(bits, self.width)
+        grid._clear_padding()
+        return grid
+
+    def __repr__(self) -> str:
+        return f"PackedGrid(shape={self.shape}, nbytes={self.nbytes})"
+
+
+def _shift_cols(bits: np.ndarray, n: int) -> np.ndarray:
+    """按格平移每一行：结果第i格取原第i+n格，越界处补1（可通行）"""
+    if n == 0:
+        return bits.copy()
+    height, nbytes = bits.shape
+    q, r = divmod(abs(n), 8)
+    out = np.full_like(bits, 0xFF)
+    if q >= nbytes:
+        return out
+    if n > 0:
+        src = bits[:, q:]
+        nxt = np.concatenate([bits[:, q + 1:], np.full((height, 1), 0xFF, dtype=np.uint8)], axis=1)
+        if r == 0:
+            out[:, :nbytes - q] = src
+        else:
+            out[:, :nbytes - q] = (src << np.uint8(r)) | (nxt >> np.uint8(8 - r))
+    else:
+        src = bits[:, :nbytes - q]
+        prev = np.concatenate([np.full((height, 1), 0xFF, dtype=np.uint8), bits[:, :nbytes - q - 1]], axis=1)
+        if r == 0:
+            out[:, q:] = src
+        else:
+            out[:, q:] = (src >> np.uint8(r)) | (prev << np.uint8(8 - r))
+    return out
+
+
+def _shift_rows(bits: np.ndarray, n: int) -> np.ndarray:
+    """按行平移：结果第i行取原第i+n行，越界处补1（可通行）"""
+    out = np.full_like(bits, 0xFF)
+    height = bits.shape[0]
+    if abs(n) >= height:
+        return out
+    if n >= 0:
+        out[:height - n] = bits[n:]
+    else:
+        out[-n:] = bits[:height + n]
+    return out
+
+
+def _run_and(bits: np.ndarray, length: int, shift) -> np.ndarray:
+    """
+    连续length格的按位与：结果第i格为原第 i, i+d, ..., i+(length-1)d 格的与，
+    d由shift的方向决定；按倍增方式只需O(log length)次平移
+    """
+    result = None
+    offset = 0
+    span = 1
+    current = bits
+    while length:
+        if length & 1:
+            shifted = current if offset == 0 else shift(current, offset)
+            result = shifted if result is None else result & shifted
+            offset += span
+        length >>= 1
+        if length:
+            current = current & shift(current, span)
+            span *= 2
+    return result
@@ -1,10 +1,21 @@
-from typing import List, Tuple, Dict, Optional, Any
+from typing import List, Tuple, Dict, Optional, Any, Union
 from enum import Enum
+from contextlib import contextmanager
 import numpy as np
 import json
+import copy
 import os
 from utils.config import config
 from utils.grid_map_storage import GridMapStorage
+from utils.kernels import cell_window, to_grid_frame
+from utils.json_io import iter_json_object, write_json
+from utils.persistence import content_digest
+from core.object_table import ObjectDict, LazyObjectDict, ObjectTable, MIN_Z, MAX_Z
+from core.spatial_index import SpatialIndex
+from core.instance_map import InstanceMap
+from core.occupancy import OccupancyGrid
+from core.tiled_grid import TiledGrid
+from core.events import EventBus, MapEvent, MapEventType, DerivedCache, GRID_EVENTS
 
 class SourceType(Enum):
     GAUSSIAN_SPLATTING = "GAUSSIAN_SPLATTING"
@@ -12,6 +23,9 @@ class SourceType(Enum):
     OTHER = "OTHER"
 
 class MapObject:
+    # 使用__slots__减少大量物体时的内存占用；footprint_2d仅轨迹物体使用
+    __slots__ = ("label", "size", "position", "id", "footprint_2d")
+
     def __init__(
         self,
         label: str,
@@ -117,14 +131,522 @@ class MapRepresentation:
         grid_map: Optional[np.ndarray] = None,
         scene_description: Optional[str] = None,
         canvas_size: Optional[Tuple[float, float]] = None,  # 新增画布大小属性
+        instance_map: Optional[InstanceMap] = None,  # 可选的实例标签栅格，与grid_map逐格对齐
+        resolution: Optional[float] = None,  # 地图自身的网格分辨率，None表示使用配置默认值
+        origin: Optional[Tuple[float, float]] = None,  # 画布左下角（grid第(0, 0)格）的世界坐标
     ):
         self.map_id = map_id
         self.source_type = source_type
-        self.objects = objects
+        # 版本号：物体或grid_map每次变化都递增
+        self.version = 0
+        # 自上次栅格化以来发生变化的物体键，以及对应的2D脏区域（变化前后的边界框）
+        self._dirty_keys = set()
+        self._dirty_old_rects: List[Tuple[float, float, float, float]] = []
+        # 引用计数占据栅格，grid_map存在且首次发生编辑时建立
+        self.occupancy: Optional[OccupancyGrid] = None
+        self.grid_resolution: Optional[float] = None  # grid_map的分辨率，None表示使用配置默认值
+        self._grid_store: Optional[TiledGrid] = None  # grid map以分块写时复制方式存储，支持O(1)的fork
+        self._frozen = False
+        # 全量生成时记录的grid生成摘要、当时的版本号和grid内容摘要，版本或内容变化后失效
+        self._grid_digest: Optional[Tuple[str, int, str]] = None
+        # 变化事件总线与依附于本地图的派生数据缓存
+        self.events = EventBus()
+        self._derived_caches: Dict[str, DerivedCache] = {}
+        self._pending_object_events = None
+        self._canvas_size = None
+        self._map_resolution = resolution
+        self._origin = (float(origin[0]), float(origin[1])) if origin is not None else (0.0, 0.0)
+        self.instance_map = instance_map
+        self.objects = objects  # 内部包装为与列式表同步的ObjectDict
         self.grid_map = grid_map
         self.scene_description = scene_description or ""
         self.canvas_size = canvas_size  # 新增
 
+    @property
+    def objects(self) -> ObjectDict:
+        return self._objects
+
+    @objects.setter
+    def objects(self, objects: Dict[str, MapObject]):
+        old_objects = getattr(self, "_objects", None)
+        if old_objects is not None:
+            # 整体替换物体：旧物体和新物体全部视为脏
+            for key in list(old_objects):
+                self._on_object_changing(key)
+            old_objects.listeners.remove(self._on_object_changing)
+            old_objects.change_listeners.remove(self._on_object_changed)
+        if not isinstance(objects, ObjectDict):
+            objects = ObjectDict(objects)
+        objects.listeners.append(self._on_object_changing)
+        objects.change_listeners.append(self._on_object_changed)
+        self._objects = objects
+        for key in list(objects):
+            self._on_object_changing(key)
+        # 没有订阅者时不遍历物体（按需创建物体的字典不会因此全部创建）
+        if not self.events.has_subscribers() and self._pending_object_events is None:
+            return
+        if old_objects is not None:
+            for key, obj in old_objects.items():
+                self._on_object_changed(key, obj, None)
+        for key, obj in objects.items():
+            self._on_object_changed(key, None, obj)
+
+    @property
+    def grid_map(self) -> Optional[Union[np.ndarray, TiledGrid]]:
+        """
+        二值grid map。读取时先把尚未栅格化的物体变化应用到脏区域。
+        稀疏分块存储的大地图直接返回TiledGrid（支持grid[r, c]、窗口切片和整数数组索引），
+        不组装整张稠密数组。fork之后第一次读取时复制出本地图独占的可写数组，
+        原地修改（之后调用notify_grid_changed）不会影响其他副本；只读地图返回只读视图
+        """
+        if self._grid_store is None:
+            return None
+        if self._dirty_keys:
+            self._materialize()
+        if self._grid_store.is_sparse:
+            return self._grid_store
+        if self._grid_store.is_shared and not self._frozen:
+            return self._grid_store.detach()
+        grid_map = self._grid_store.to_array()
+        if self._frozen and grid_map.flags.writeable:
+            # 只读地图不能经由返回的数组原地修改
+            grid_map = grid_map.view()
+            grid_map.flags.writeable = False
+        return grid_map
+
+    @grid_map.setter
+    def grid_map(self, grid_map: Optional[Union[np.ndarray, TiledGrid]]):
+        self._check_writable()
+        if grid_map is None or isinstance(grid_map, TiledGrid):
+            self._grid_store = grid_map
+        else:
+            self._grid_store = TiledGrid(grid_map)
+        self.version += 1
+        # 整体替换后所有增量状态失效
+        self._dirty_keys = set()
+        self._dirty_old_rects = []
+        self.occupancy = None
+        self.emit(MapEventType.GRID_REPLACED)
+
+    @property
+    def grid_digest(self) -> Optional[str]:
+        """
+        当前grid map的生成摘要（见utils.grid_cache），仅在记录之后物体和grid都没有变化时有效。
+        经由grid_map返回的数组原地修改不会改变版本号，因此同时核对记录时的grid内容摘要
+        """
+        if self._grid_digest is None or self._grid_digest[1] != self.version:
+            return None
+        if self._grid_content_digest() != self._grid_digest[2]:
+            return None
+        return self._grid_digest[0]
+
+    @grid_digest.setter
+    def grid_digest(self, digest: Optional[str]):
+        if digest is None or self._grid_store is None:
+            self._grid_digest = None
+        else:
+            self._grid_digest = (digest, self.version, self._grid_content_digest())
+
+    def _grid_content_digest(self) -> str:
+        store = self._grid_store
+        return content_digest(store if store.is_sparse else store.to_array())
+
+    def flush(self):
+        """立即把尚未栅格化的物体变化应用到grid map及附属栅格（不组装整张grid）"""
+        if self._dirty_keys and self._grid_store is not None:
+            self._materialize()
+
+    @property
+    def grid_shape(self) -> Optional[Tuple[int, int]]:
+        """grid map的形状，不触发栅格化或组装；没有grid map时为None"""
+        return self._grid_store.shape if self._grid_store is not None else None
+
+    def read_grid_window(self, window: Tuple[int, int, int, int]) -> np.ndarray:
+        """
+        读取grid map的一个窗口（只读），fork出的地图无需组装整张grid
+        
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+        """
+        self.flush()
+        return self._grid_store.read_window(window)
+
+    def write_grid_window(self, window: Tuple[int, int, int, int], values):
+        """
+        写入grid map的一个窗口并发出GRID_REGION_CHANGED事件
+        
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+            values: 标量或与窗口同形状的数组
+        """
+        self._check_writable()
+        self.flush()
+        self._grid_store.assign(window, values)
+        self.notify_grid_changed(window)
+
+    def _check_writable(self):
+        if self._frozen:
+            raise TypeError("只读快照不可修改")
+
+    def fork(self) -> "MapRepresentation":
+        """
+        创建可独立修改的副本。grid map和引用计数按块写时复制，物体字典的列式表和空间索引
+        在第一次修改时才复制，物体在第一次读取时才复制，因此fork本身的代价与地图大小无关；
+        之后经由物体和write_grid_window的编辑只复制实际被编辑的块，读取整张grid_map时复制出独占的数组。
+        实例标签栅格（如有）会被完整复制。事件订阅和派生缓存不会被继承。
+        
+        Returns:
+            新的MapRepresentation
+        """
+        if self._grid_store is not None:
+            self.flush()
+            # 在共享前建立引用计数，避免每个副本各自重建
+            if not self._frozen:
+                self.ensure_occupancy()
+        child = MapRepresentation(
+            map_id=self.map_id,
+            source_type=self.source_type,
+            objects=self._objects.fork(),
+            scene_description=self.scene_description,
+            canvas_size=self.canvas_size,
+            instance_map=self.instance_map.copy() if self.instance_map is not None else None,
+            resolution=self._map_resolution,
+            origin=self.origin,
+        )
+        if self._grid_store is not None:
+            child._grid_store = self._grid_store.fork()
+        if self.occupancy is not None:
+            child.occupancy = self.occupancy.fork()
+        child.grid_resolution = self.grid_resolution
+        child.version = self.version
+        return child
+
+    def __deepcopy__(self, memo):
+        # 深拷贝得到完全独立的地图；事件订阅和派生缓存不会被复制
+        self.flush()
+        grid_map = self.grid_map
+        child = MapRepresentation(
+            map_id=self.map_id,
+            source_type=self.source_type,
+            objects={key: copy.deepcopy(obj, memo) for key, obj in self._objects.items()},
+            grid_map=grid_map.copy() if grid_map is not None else None,
+            scene_description=self.scene_description,
+            canvas_size=self.canvas_size,
+            instance_map=self.instance_map.copy() if self.instance_map is not None else None,
+            resolution=self._map_resolution,
+            origin=self.origin,
+        )
+        child.grid_resolution = self.grid_resolution
+        child.version = self.version
+        return child
+
+    def __reduce__(self):
+        # 序列化时只保存数据，不保存事件订阅、缓存和增量状态
+        self.flush()
+        grid_map = self.grid_map
+        if grid_map is not None:
+            grid_map = grid_map.copy() if isinstance(grid_map, TiledGrid) else np.array(grid_map)
+        state = {
+            "data": self.to_dict(),
+            "objects": dict(self._objects.items()),
+            "grid_map": grid_map,
+            "instance_map": self.instance_map,
+            "grid_resolution": self.grid_resolution,
+            "version": self.version,
+        }
+        return _rebuild_map_representation, (state,)
+
+    def snapshot(self) -> "MapRepresentation":
+        """
+        创建当前状态的只读快照（与fork共享方式相同），可作为多个副本的公共基础，
+        对快照本身的任何修改都会抛出TypeError
+        
+        Returns:
+            只读的MapRepresentation
+        """
+        snapshot = self.fork()
+        snapshot.freeze()
+        return snapshot
+
+    def freeze(self):
+        """把地图本身设为只读，此后对物体、grid map或画布的修改都会抛出TypeError"""
+        self._frozen = True
+        self._objects.frozen = True
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    @property
+    def canvas_size(self) -> Optional[Tuple[float, float]]:
+        return self._canvas_size
+
+    @canvas_size.setter
+    def canvas_size(self, canvas_size: Optional[Tuple[float, float]]):
+        self._check_writable()
+        changed = canvas_size != self._canvas_size
+        self._canvas_size = canvas_size
+        if changed:
+            self.version += 1
+            self.emit(MapEventType.CANVAS_CHANGED)
+
+    @property
+    def resolution(self) -> float:
+        """
+        地图的网格分辨率（米/格子）：地图自身设置的值，否则为已加载grid map的分辨率，
+        都没有时使用配置默认值。生成grid map、规划和碰撞检测默认都使用该值
+        """
+        return self._map_resolution or self.grid_resolution or config.get_default_resolution()
+
+    @resolution.setter
+    def resolution(self, resolution: Optional[float]):
+        self._check_writable()
+        if resolution is not None and resolution <= 0:
+            raise ValueError(f"分辨率必须为正数: {resolution}")
+        changed = resolution != self._map_resolution
+        self._map_resolution = resolution
+        if changed:
+            self.version += 1
+            self.emit(MapEventType.CANVAS_CHANGED)
+
+    @property
+    def origin(self) -> Tuple[float, float]:
+        """画布左下角（grid第(0, 0)格左下角）的世界坐标，物体、路径和位姿都使用世界坐标"""
+        return self._origin
+
+    @origin.setter
+    def origin(self, origin: Tuple[float, float]):
+        self._check_writable()
+        origin = (float(origin[0]), float(origin[1])) if origin is not None else (0.0, 0.0)
+        changed = origin != self._origin
+        self._origin = origin
+        if changed:
+            self.version += 1
+            self.emit(MapEventType.CANVAS_CHANGED)
+
+    def subscribe(self, callback, event_types=None) -> int:
+        """
+        订阅地图变化事件
+        
+        Args:
+            callback: callback(event: MapEvent)
+            event_types: 只接收这些MapEventType，None表示全部
+            
+        Returns:
+            订阅令牌
+        """
+        return self.events.subscribe(callback, event_types)
+
+    def unsubscribe(self, token: int) -> bool:
+        """取消订阅"""
+        return self.events.unsubscribe(token)
+
+    def emit(self, event_type: MapEventType, **kwargs):
+        """以当前版本号发出事件（没有订阅者时不创建事件对象）"""
+        if self.events.has_subscribers():
+            self.events.emit(MapEvent(event_type, self.version, **kwargs))
+
+    def notify_grid_changed(self, window: Optional[Tuple[int, int, int, int]] = None):
+        """
+        grid_map被直接原地修改后调用，递增版本号并发出事件
+        
+        Args:
+            window: 被修改的窗口 (row_start, row_end, col_start, col_end)，None表示整体
+        """
+        self.version += 1
+        if window is None:
+            self.emit(MapEventType.GRID_REPLACED)
+        else:
+            self.emit(MapEventType.GRID_REGION_CHANGED, window=window)
+
+    def derived_cache(self, name: str, compute, event_types=GRID_EVENTS, should_invalidate=None) -> DerivedCache:
+        """
+        获取（不存在时创建）依附于本地图的派生数据缓存，收到相关事件时自动失效
+        
+        Args:
+            name: 缓存名称
+            compute: compute(map_rep, *args)，计算派生数据
+            event_types: 使缓存失效的事件类型，默认为grid相关事件
+            should_invalidate: 可选的事件过滤函数
+            
+        Returns:
+            DerivedCache
+        """
+        cache = self._derived_caches.get(name)
+        if cache is None:
+            cache = DerivedCache(self, compute, event_types, should_invalidate)
+            self._derived_caches[name] = cache
+        return cache
+
+    @property
+    def dirty_rects(self) -> List[Tuple[float, float, float, float]]:
+        """尚未栅格化的2D脏区域：变化物体变化前的边界框及其当前边界框"""
+        rects = list(self._dirty_old_rects)
+        for key in self._dirty_keys:
+            obj = self._objects.get(key)
+            if obj is not None:
+                rects.append(obj.get_bbox_2d())
+        return rects
+
+    @property
+    def is_dirty(self) -> bool:
+        """是否有尚未应用到grid_map的物体变化"""
+        return bool(self._dirty_keys)
+
+    def _resolution(self) -> float:
+        # 已有grid map时以它的实际分辨率为准
+        return self.grid_resolution or self.resolution
+
+    def _on_object_changing(self, key: str):
+        """objects中某个键即将变化（此时表和索引仍为变化前的状态）"""
+        self.version += 1
+        # 已经是脏的物体，grid中仍是它最早的覆盖区域，无需重复记录
+        if self._grid_store is None or key in self._dirty_keys:
+            return
+        # 在第一次编辑之前建立计数，保证能准确撤销旧物体的覆盖
+        self.ensure_occupancy()
+        self._dirty_keys.add(key)
+        obj = self._objects.get(key)
+        if obj is not None:
+            self._dirty_old_rects.append(obj.get_bbox_2d())
+
+    @contextmanager
+    def coalesce_object_events(self):
+        """
+        在此范围内对同一物体的多次变化合并为一个事件（以最早的旧值和最终的新值为准），
+        例如先删除再以新位置加入会发出一个OBJECT_MOVED。grid事件不受影响。
+        """
+        if self._pending_object_events is not None:
+            yield
+            return
+        self._pending_object_events = {}
+        try:
+            yield
+        finally:
+            pending, self._pending_object_events = self._pending_object_events, None
+            for key, (old_obj, new_obj) in pending.items():
+                if old_obj is not new_obj:
+                    self._on_object_changed(key, old_obj, new_obj)
+
+    def _on_object_changed(self, key: str, old_obj: Optional[MapObject], new_obj: Optional[MapObject]):
+        """objects中某个键变化完成后发出物体事件"""
+        pending = self._pending_object_events
+        if pending is not None:
+            pending[key] = (pending[key][0] if key in pending else old_obj, new_obj)
+            return
+        if old_obj is None:
+            event_type = MapEventType.OBJECT_ADDED
+        elif new_obj is None:
+            event_type = MapEventType.OBJECT_REMOVED
+        else:
+            event_type = MapEventType.OBJECT_MOVED
+        self.emit(event_type, object_id=key, old_object=old_obj, new_object=new_obj)
+
+    def sync_objects(self) -> List[str]:
+        """
+        重新读取所有物体的位置和大小，刷新被原地修改过（未经objects[key] = obj赋值）的物体
+        在列式表和空间索引中的记录，并把它们标记为脏
+        
+        Returns:
+            被刷新的物体键
+        """
+        table = self._objects.table
+        # 尚未创建的物体（见LazyObjectDict）不可能被原地修改，只检查已创建的
+        created = list(self._objects.created_items())
+        if not created:
+            return []
+        keys = [key for key, _ in created]
+        current = np.array([obj.get_bbox_3d() for _, obj in created], dtype=np.float64)
+        recorded = table.bounds[table.rows_of(keys)]
+        stale = [keys[i] for i in np.flatnonzero((current != recorded).any(axis=1))]
+        for key in stale:
+            self._objects.refresh(key)
+        return stale
+
+    def mark_dirty(self, key: str):
+        """标记物体需要重新栅格化（例如原地修改了position/size之后）"""
+        if key in self._objects:
+            self._objects.refresh(key)
+        else:
+            self._on_object_changing(key)
+
+    def ensure_occupancy(self) -> OccupancyGrid:
+        """
+        获取与当前grid_map对齐的引用计数栅格，不存在或形状不一致时由grid_map和物体重建
+        
+        Returns:
+            OccupancyGrid
+        """
+        occupancy = self.occupancy
+        if occupancy is None or occupancy.shape != self._grid_store.shape:
+            table = self._objects.table
+            boxes = to_grid_frame(table.bboxes_2d(), self.origin)
+            occupancy = OccupancyGrid.from_grid(self._grid_store, zip(table.ids, boxes), self._resolution())
+            self.occupancy = occupancy
+        return occupancy
+
+    def _materialize(self):
+        """
+        只在脏区域内重新栅格化：撤销变化物体的旧覆盖，按当前位置重新登记（格子左下角规则，与全量生成一致），
+        再由计数刷新grid_map和实例标签栅格的对应窗口。
+        """
+        resolution = self._resolution()
+        occupancy = self.ensure_occupancy()
+        keys, self._dirty_keys = self._dirty_keys, set()
+        windows = []
+        for key in keys:
+            window = occupancy.remove(key)
+            if window is not None:
+                windows.append(window)
+            obj = self._objects.get(key)
+            if obj is not None:
+                r0, r1, c0, c1 = cell_window(obj.get_bbox_2d(), resolution, occupancy.shape, centered=False,
+                                             origin=self.origin)
+                if r0 < r1 and c0 < c1:
+                    occupancy.add(key, (r0, r1, c0, c1))
+                    windows.append((r0, r1, c0, c1))
+        for window in windows:
+            occupancy.sync_grid(self._grid_store, window)
+            self.repaint_instances(window)
+        if windows:
+            self.version += 1
+            for window in windows:
+                self.emit(MapEventType.GRID_REGION_CHANGED, window=window)
+        self._dirty_old_rects = []
+
+    def repaint_instances(self, window: Tuple[int, int, int, int]):
+        """
+        用当前物体的计数覆盖格重新决定实例标签栅格在窗口内的标签和高度范围
+        
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+        """
+        instance_map, occupancy = self.instance_map, self.occupancy
+        if instance_map is None or occupancy is None or instance_map.shape != occupancy.shape:
+            return
+        resolution = self._resolution()
+        ox, oy = self.origin
+        r0, r1, c0, c1 = window
+        table = self._objects.table
+        footprints = []
+        query = (ox + c0 * resolution, oy + r0 * resolution, ox + c1 * resolution, oy + r1 * resolution)
+        for key in self._objects.spatial_index.query_bbox(query):
+            footprint = occupancy.footprints.get(key)
+            if footprint is not None:
+                bounds = table.bounds[table.index[key]]
+                footprints.append((key, footprint[0], footprint[1], bounds[MIN_Z], bounds[MAX_Z]))
+        instance_map.repaint_window(window, footprints)
+
+    @property
+    def object_table(self) -> ObjectTable:
+        """物体的列式表（边界框、标签编码、id索引），与objects字典同步"""
+        return self._objects.table
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """物体2D边界框的空间索引，与objects字典同步"""
+        return self._objects.spatial_index
+
     def to_dict(self) -> dict:
         """转换为字典，不包含grid_map数据"""
         return {
@@ -133,11 +655,17 @@ class MapRepresentation:
             "objects": {k: v.to_dict() for k, v in self.objects.items()},
             "scene_description": self.scene_description,
             "canvas_size": self.canvas_size,  # 新增
+            "resolution": self._map_resolution,
+            "origin": list(self.origin),
         }
 
     @staticmethod
     def from_dict(data: dict) -> "MapRepresentation":
         objects = {k: MapObject.from_dict(v) for k, v in data["objects"].items()}
+        return MapRepresentation._from_header(data, objects)
+
+    @staticmethod
+    def _from_header(data: dict, objects: Dict[str, MapObject]) -> "MapRepresentation":
         return MapRepresentation(
             map_id=data["map_id"],
             source_type=SourceType(data["source_type"]),
@@ -145,69 +673,127 @@ class MapRepresentation:
             grid_map=None,  # grid_map现在通过PNG文件管理
             scene_description=data.get("scene_description", ""),
             canvas_size=tuple(data["canvas_size"]) if data.get("canvas_size") is not None else None,  # 新增
+            resolution=data.get("resolution"),
+            origin=data.get("origin"),
         )
 
     @staticmethod
-    def load_from_json(path: str) -> "MapRepresentation":
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        map_rep = MapRepresentation.from_dict(data)
+    def load_from_json(path: str, lazy: Optional[bool] = None) -> "MapRepresentation":
+        """
+        从JSON文件加载地图。文件被流式读取，物体逐个解码，不需要先把整个文件解析成完整的对象树；
+        物体字典中与MapObject无关的字段（例如逐像素的mask）解码后立即丢弃
         
-        # 尝试从PNG文件加载grid_map
+        Args:
+            path: JSON文件路径
+            lazy: 为True时只把物体解析进列式表和空间索引，MapObject在第一次按键访问时才创建
+                  （见LazyObjectDict），None表示使用配置值
+            
+        Returns:
+            MapRepresentation
+        """
+        if lazy is None:
+            lazy = config.get_lazy_objects()
+        header = {}
+        objects = {}
+        keys, labels, ids, geometry = [], [], [], []
+        label_pool = {}
+        for key, value in iter_json_object(path, stream_keys=("objects",)):
+            if key != "objects":
+                header[key] = value
+            elif not lazy:
+                objects = {k: MapObject.from_dict(v) for k, v in value}
+            else:
+                for k, v in value:
+                    keys.append(k)
+                    labels.append(label_pool.setdefault(v["label"], v["label"]))
+                    ids.append(v.get("id"))
+                    geometry.append((*v.get("position", (0.0, 0.0, 0.0)), *v["size"]))
+        if lazy:
+            objects = LazyObjectDict(keys, labels, ids, np.array(geometry, dtype=np.float64).reshape(-1, 6),
+                                     factory=MapObject)
+        map_rep = MapRepresentation._from_header(header, objects)
+        
+        # 尝试从PNG文件（或大地图的分块文件）加载grid_map
         if map_rep.canvas_size is not None:
-            resolution = config.get_default_resolution()
-            grid_map = GridMapStorage.load_grid_map_from_png(
-                map_rep.map_id, map_rep.canvas_size, resolution
-            )
-            map_rep.grid_map = grid_map
+            map_rep.load_grid_map_from_png()
         
         return map_rep
     
-    def save_to_json(self, path: str) -> str:
+    def save_to_json(self, path: str, compact: Optional[bool] = None) -> str:
         """
-        保存地图到JSON文件
+        保存地图到JSON文件（安装了orjson时用orjson编码，见utils.json_io）
         
         Args:
             path: 保存路径
+            compact: 是否使用紧凑格式（无缩进），None表示使用配置值
             
         Returns:
             保存文件的绝对路径
         """
-        import os
-        from pathlib import Path
+        return write_json(path, self.to_dict(), compact)
+    
+    def save_grid_map_as_png(self, wait: bool = True) -> Optional[str]:
+        """
+        将grid_map保存为PNG文件（稀疏分块存储的大地图逐块保存为npz）。
+        grid内容与上次保存时相同时不重复写入；配置grid_map.write_behind为true时在后台线程中写入
         
-        # 确保目录存在
-        save_path = Path(path)
-        save_path.parent.mkdir(parents=True, exist_ok=True)
+        Args:
+            wait: 后台写入时是否等待写入完成后再返回（不等待时写入失败不会反映在返回值中）
         
-        # 保存到文件
-        with open(save_path, "w", encoding="utf-8") as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
-            
-        return str(save_path.absolute())
+        Returns:
+            文件路径，如果保存失败则返回None
+        """
+        if self._grid_store is None or self.canvas_size is None:
+            return None
+        
+        try:
+            self.flush()
+            if self._grid_store.is_sparse:
+                # 按块写时复制的副本，之后的编辑不会影响尚未完成的写入
+                grid_map = self._grid_store.copy()
+            else:
+                # 稠密grid交给写入方独立的数组副本，当前地图的grid_map仍可原地修改
+                grid_map = np.array(self._grid_store.to_array())
+            path = GridMapStorage.persist_grid_map(grid_map, self.map_id, self.canvas_size, self._resolution(),
+                                                   digest=self.grid_digest, grid_version=self.version,
+                                                   origin=self.origin)
+            if wait:
+                GridMapStorage.wait_for_pending(self.map_id)
+                error = GridMapStorage.get_write_error(self.map_id)
+                if error is not None:
+                    raise error
+            return path
+        except Exception as e:
+            print(f"保存grid_map PNG文件失败: {e}")
+            return None
     
-    def save_grid_map_as_png(self) -> Optional[str]:
+    def save_grid_pyramid(self, tile_size: Optional[int] = None) -> Optional[str]:
         """
-        将grid_map保存为PNG文件
+        将grid_map保存为多级分块档案，之后可以用GridMapStorage.load_grid_window只读取局部窗口
+        
+        Args:
+            tile_size: 块边长（格），None表示使用配置值
         
         Returns:
-            PNG文件路径，如果保存失败则返回None
+            档案路径，如果没有grid_map或保存失败则返回None
         """
-        if self.grid_map is None or self.canvas_size is None:
+        if self._grid_store is None:
             return None
         
         try:
-            resolution = config.get_default_resolution()
-            return GridMapStorage.save_grid_map_as_png(
-                self.grid_map, self.map_id, self.canvas_size, resolution
-            )
+            self.flush()
+            return GridMapStorage.save_grid_pyramid(self._grid_store, self.map_id, self._resolution(), self.origin,
+                                                    self.canvas_size, tile_size, digest=self.grid_digest,
+                                                    grid_version=self.version)
         except Exception as e:
-            print(f"保存grid_map PNG文件失败: {e}")
+            print(f"保存grid_map分块档案失败: {e}")
             return None
     
     def load_grid_map_from_png(self) -> bool:
         """
-        从PNG文件加载grid_map
+        从PNG文件（或大地图的分块文件）加载grid_map，
+        按地图的分辨率和画布大小检查，不一致的文件（例如以其他分辨率生成的）会被忽略；
+        加载成功时一并加载与之对齐的实例标签栅格
         
         Returns:
             是否成功加载
@@ -216,18 +802,63 @@ class MapRepresentation:
             return False
         
         try:
-            resolution = config.get_default_resolution()
+            resolution = self.resolution
             grid_map = GridMapStorage.load_grid_map_from_png(
-                self.map_id, self.canvas_size, resolution
+                self.map_id, self.canvas_size, resolution, origin=self.origin
             )
+            if grid_map is None:
+                grid_map = GridMapStorage.load_grid_map_tiles(self.map_id)
+                if grid_map is not None and grid_map.shape != GridMapStorage.grid_shape(self.canvas_size, resolution):
+                    grid_map = None
             if grid_map is not None:
                 self.grid_map = grid_map
+                self.grid_resolution = resolution
+                # 实例标签栅格是可选的，存在且与grid_map对齐时一并加载
+                self.load_instance_map()
                 return True
             return False
         except Exception as e:
             print(f"加载grid_map PNG文件失败: {e}")
             return False
     
+    def save_instance_map(self) -> Optional[str]:
+        """
+        保存实例标签栅格（与grid_map PNG位于同一目录）
+        
+        Returns:
+            文件路径，如果没有实例栅格或保存失败则返回None
+        """
+        if self.instance_map is None:
+            return None
+        
+        try:
+            self.flush()
+            im = self.instance_map.copy()
+            return GridMapStorage.persist_instance_map(self.map_id, im.labels, im.object_ids, im.z_min, im.z_max)
+        except Exception as e:
+            print(f"保存实例标签栅格失败: {e}")
+            return None
+    
+    def load_instance_map(self) -> bool:
+        """
+        加载实例标签栅格，与当前grid_map形状不一致时忽略
+        
+        Returns:
+            是否成功加载
+        """
+        try:
+            data = GridMapStorage.load_instance_map(self.map_id)
+        except Exception as e:
+            print(f"加载实例标签栅格失败: {e}")
+            return False
+        if data is None:
+            return False
+        labels, object_ids, z_min, z_max = data
+        if self.grid_map is not None and labels.shape != self.grid_map.shape:
+            return False
+        self.instance_map = InstanceMap(labels, object_ids, z_min, z_max)
+        return True
+    
     def get_grid_map_path(self) -> str:
         """
         获取grid_map PNG文件路径
@@ -255,6 +886,24 @@ class MapRepresentation:
         """
         return GridMapStorage.delete_grid_map(self.map_id)
 
+def _rebuild_map_representation(state: dict) -> MapRepresentation:
+    """反序列化MapRepresentation"""
+    data = state["data"]
+    map_rep = MapRepresentation(
+        map_id=data["map_id"],
+        source_type=SourceType(data["source_type"]),
+        objects=state["objects"],
+        grid_map=state["grid_map"],
+        scene_description=data.get("scene_description", ""),
+        canvas_size=tuple(data["canvas_size"]) if data.get("canvas_size") is not None else None,
+        instance_map=state["instance_map"],
+        resolution=data.get("resolution"),
+        origin=data.get("origin"),
+    )
+    map_rep.grid_resolution = state["grid_resolution"]
+    map_rep.version = state["version"]
+    return map_rep
+
 class Path:
     def __init__(self, points: List[Tuple[float, float]]):
         self.points = points
@@ -0,0 +1,135 @@
+"""
+地图变化事件
+MapRepresentation在物体、grid map、画布变化时发出带类型的事件，
+派生数据（膨胀地图、距离场、路径缓存、渲染结果等）的缓存订阅事件以精确失效。
+"""
+
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+class MapEventType(Enum):
+    OBJECT_ADDED = "OBJECT_ADDED"
+    OBJECT_REMOVED = "OBJECT_REMOVED"
+    OBJECT_MOVED = "OBJECT_MOVED"  # 同一个键被替换为位置或尺寸不同的物体
+    GRID_REGION_CHANGED = "GRID_REGION_CHANGED"  # grid map的局部窗口被重新栅格化
+    GRID_REPLACED = "GRID_REPLACED"  # grid map被整体替换
+    CANVAS_CHANGED = "CANVAS_CHANGED"
+
+
+# 会改变grid map内容的事件
+GRID_EVENTS = frozenset({MapEventType.GRID_REGION_CHANGED, MapEventType.GRID_REPLACED, MapEventType.CANVAS_CHANGED})
+# 会改变物体集合的事件
+OBJECT_EVENTS = frozenset({MapEventType.OBJECT_ADDED, MapEventType.OBJECT_REMOVED, MapEventType.OBJECT_MOVED})
+
+
+class MapEvent:
+    """
+    一次地图变化。
+    object_id/old_object/new_object用于物体事件；window为grid map中
+    左闭右开的 (row_start, row_end, col_start, col_end)，用于GRID_REGION_CHANGED。
+    """
+
+    __slots__ = ("type", "version", "object_id", "old_object", "new_object", "window")
+
+    def __init__(self, type: MapEventType, version: int, object_id: Optional[str] = None,
+                 old_object: Any = None, new_object: Any = None,
+                 window: Optional[Tuple[int, int, int, int]] = None):
+        self.type = type
+        self.version = version
+        self.object_id = object_id
+        self.old_object = old_object
+        self.new_object = new_object
+        self.window = window
+
+    def bboxes_2d(self) -> list:
+        """物体事件涉及的2D边界框（变化前、变化后）"""
+        return [obj.get_bbox_2d() for obj in (self.old_object, self.new_object) if obj is not None]
+
+    def __repr__(self) -> str:
+        return f"MapEvent({self.type.value}, version={self.version}, object_id={self.object_id}, window={self.window})"
+
+
+class EventBus:
+    """同步事件分发，回调按订阅顺序在发出事件的线程中执行"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Tuple[Callable[[MapEvent], None], Optional[frozenset]]] = {}
+        self._next_token = 0
+
+    def subscribe(self, callback: Callable[[MapEvent], None], event_types: Optional[Iterable[MapEventType]] = None) -> int:
+        """
+        订阅事件
+
+        Args:
+            callback: callback(event)
+            event_types: 只接收这些类型的事件，None表示全部
+
+        Returns:
+            订阅令牌，用于取消订阅
+        """
+        token = self._next_token
+        self._next_token += 1
+        self._subscribers[token] = (callback, frozenset(event_types) if event_types is not None else None)
+        return token
+
+    def unsubscribe(self, token: int) -> bool:
+        """取消订阅，令牌不存在时返回False"""
+        return self._subscribers.pop(token, None) is not None
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def emit(self, event: MapEvent):
+        for callback, event_types in list(self._subscribers.values()):
+            if event_types is None or event.type in event_types:
+                callback(event)
+
+
+class DerivedCache:
+    """
+    依附于MapRepresentation的派生数据缓存。
+    按参数缓存compute(map_rep, *args)的结果，收到相关事件时清空；
+    可选的should_invalidate(event)用于进一步判断事件是否真的影响缓存（例如只关心某个区域）。
+    """
+
+    def __init__(self, map_rep, compute: Callable[..., Any],
+                 event_types: Iterable[MapEventType] = GRID_EVENTS,
+                 should_invalidate: Optional[Callable[[MapEvent], bool]] = None):
+        self.map_rep = map_rep
+        self.compute = compute
+        self.event_types = frozenset(event_types)
+        self.should_invalidate = should_invalidate
+        self._values: Dict[tuple, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self._token = map_rep.subscribe(self._on_event, self.event_types)
+
+    def _on_event(self, event: MapEvent):
+        if self._values and (self.should_invalidate is None or self.should_invalidate(event)):
+            self._values.clear()
+
+    def get(self, *args) -> Any:
+        """获取缓存值，缺失时计算"""
+        # 依赖grid的缓存先让尚未栅格化的编辑生效，使对应事件在查表之前发出
+        if self.event_types & GRID_EVENTS:
+            self.map_rep.flush()
+        if args in self._values:
+            self.hits += 1
+            return self._values[args]
+        self.misses += 1
+        value = self.compute(self.map_rep, *args)
+        self._values[args] = value
+        return value
+
+    def put(self, value: Any, *args):
+        """直接写入缓存值（例如从共享内存中获得的预计算结果）"""
+        self._values[args] = value
+
+    def invalidate(self):
+        self._values.clear()
+
+    def close(self):
+        """取消订阅并清空缓存"""
+        self.map_rep.unsubscribe(self._token)
+        self._values.clear()
@@ -0,0 +1,83 @@
+"""
+2.5D高度占据栅格
+逐格记录覆盖该格的物体的最低底面高度和最高顶面高度，
+任意高度区间 [z_low, z_high) 对应的二值grid map只需一次向量化比较即可得到，无需重新栅格化物体。
+同一格内上下叠放且中间有空隙的多个物体（例如桌面下方的空间之上还有吊柜）按整体高度范围处理，结果偏保守。
+"""
+
+from typing import Tuple
+import numpy as np
+from utils.kernels import cell_window
+
+
+class HeightOccupancy:
+    """逐格的障碍高度范围，z_min为最低底面（无物体为+inf），z_max为最高顶面（无物体为-inf）"""
+
+    def __init__(self, z_min: np.ndarray, z_max: np.ndarray):
+        self.z_min = z_min
+        self.z_max = z_max
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.z_min.shape
+
+    @staticmethod
+    def empty(shape: Tuple[int, int]) -> "HeightOccupancy":
+        return HeightOccupancy(np.full(shape, np.inf, dtype=np.float32), np.full(shape, -np.inf, dtype=np.float32))
+
+    def copy(self) -> "HeightOccupancy":
+        return HeightOccupancy(self.z_min.copy(), self.z_max.copy())
+
+    def paint(self, bbox_3d: Tuple[float, float, float, float, float, float], resolution: float, centered: bool = False):
+        """
+        把一个物体的高度范围合并到其覆盖的格子
+
+        Args:
+            bbox_3d: (min_x, min_y, min_z, max_x, max_y, max_z)
+            resolution: 网格分辨率
+            centered: 覆盖规则，含义同rasterize_boxes
+        """
+        min_x, min_y, min_z, max_x, max_y, max_z = bbox_3d
+        r0, r1, c0, c1 = cell_window((min_x, min_y, max_x, max_y), resolution, self.shape, centered)
+        if r0 >= r1 or c0 >= c1:
+            return
+        np.minimum(self.z_min[r0:r1, c0:c1], min_z, out=self.z_min[r0:r1, c0:c1])
+        np.maximum(self.z_max[r0:r1, c0:c1], max_z, out=self.z_max[r0:r1, c0:c1])
+
+    def band_grid(self, z_low: float, z_high: float) -> np.ndarray:
+        """
+        高度区间 [z_low, z_high) 内的二值grid map：格子内有物体与该区间相交即为障碍
+
+        Args:
+            z_low: 区间下界（例如机器人底盘离地间隙）
+            z_high: 区间上界（例如机器人高度）
+
+        Returns:
+            uint8数组，0为障碍，1为可通行
+        """
+        if z_high <= z_low:
+            raise ValueError(f"高度区间无效: [{z_low}, {z_high})")
+        blocked = (self.z_min < z_high) & (self.z_max > z_low)
+        return (~blocked).astype(np.uint8)
+
+    def floor_grid(self) -> np.ndarray:
+        """所有物体投影到地面的二值grid map（与generate_grid_map_from_objects的障碍一致）"""
+        return (self.z_max == -np.inf).astype(np.uint8)
+
+
+def build_height_occupancy(bounds: np.ndarray, shape: Tuple[int, int], resolution: float) -> HeightOccupancy:
+    """
+    由物体3D边界框生成高度占据栅格，覆盖规则与generate_grid_map_from_objects一致（格子左下角落在bbox内）
+
+    Args:
+        bounds: (N, 6) 的3D边界框
+        shape: (height, width)
+        resolution: 网格分辨率
+
+    Returns:
+        HeightOccupancy
+    """
+    heights = HeightOccupancy.empty(shape)
+    for bbox_3d in bounds:
+        heights.paint(tuple(bbox_3d), resolution)
+    return heights
@@ -0,0 +1,144 @@
+"""
+实例标签栅格
+与二值grid_map逐格对齐，记录每个障碍格属于哪个物体（多个物体重叠时取最高的物体），
+以及覆盖该格的所有物体的高度范围，用于 O(1) 的格子到物体查询。
+"""
+
+from typing import List, Optional, Tuple
+import numpy as np
+from core.object_table import MAX_Z
+from utils.kernels import cell_window
+
+# 标签0表示没有物体覆盖
+NO_INSTANCE = 0
+
+
+class InstanceMap:
+    """实例标签栅格，labels[row, col] = k 表示该格属于 object_ids[k - 1]"""
+
+    def __init__(self, labels: np.ndarray, object_ids: List[str], z_min: np.ndarray, z_max: np.ndarray):
+        self.labels = labels
+        self.object_ids = list(object_ids)
+        self.z_min = z_min  # 无物体覆盖的格子为 +inf
+        self.z_max = z_max  # 无物体覆盖的格子为 -inf
+        self._code_of = {object_id: k + 1 for k, object_id in enumerate(self.object_ids)}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.labels.shape
+
+    def copy(self) -> "InstanceMap":
+        return InstanceMap(self.labels.copy(), self.object_ids, self.z_min.copy(), self.z_max.copy())
+
+    @staticmethod
+    def empty(shape: Tuple[int, int], capacity: int = 0) -> "InstanceMap":
+        """
+        创建没有任何物体的实例栅格
+
+        Args:
+            shape: (height, width)
+            capacity: 预计物体数量，用于选择标签数据类型
+        """
+        dtype = np.uint16 if capacity < np.iinfo(np.uint16).max else np.uint32
+        return InstanceMap(
+            np.zeros(shape, dtype=dtype), [],
+            np.full(shape, np.inf, dtype=np.float32),
+            np.full(shape, -np.inf, dtype=np.float32),
+        )
+
+    def code_of(self, object_id: str) -> int:
+        """获取物体的标签编码，新物体自动分配编码（必要时把标签升级为uint32）"""
+        code = self._code_of.get(object_id)
+        if code is None:
+            self.object_ids.append(object_id)
+            code = len(self.object_ids)
+            self._code_of[object_id] = code
+            if code > np.iinfo(self.labels.dtype).max:
+                self.labels = self.labels.astype(np.uint32)
+        return code
+
+    def paint(self, object_id: str, bbox_3d: Tuple[float, float, float, float, float, float],
+              resolution: float, centered: bool = False):
+        """
+        把一个物体写入栅格：覆盖范围内若该物体不低于当前最高物体，则标签改为该物体；
+        同时扩展每格的高度范围。
+
+        Args:
+            object_id: 物体键
+            bbox_3d: (min_x, min_y, min_z, max_x, max_y, max_z)
+            resolution: 网格分辨率
+            centered: 覆盖判断规则，与rasterize_boxes相同
+        """
+        min_x, min_y, z_lo, max_x, max_y, z_hi = bbox_3d
+        r0, r1, c0, c1 = cell_window((min_x, min_y, max_x, max_y), resolution, self.shape, centered)
+        if r0 >= r1 or c0 >= c1:
+            return
+        code = self.code_of(object_id)
+        window = (slice(r0, r1), slice(c0, c1))
+        top = self.z_max[window]
+        self.labels[window][top <= z_hi] = code
+        np.maximum(top, z_hi, out=top)
+        np.minimum(self.z_min[window], z_lo, out=self.z_min[window])
+
+    def repaint_window(self, window: Tuple[int, int, int, int], footprints: List[tuple]):
+        """
+        清空窗口后按给定物体覆盖格重新写入，用于删除或移动物体后的局部刷新
+
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+            footprints: [(物体键, 覆盖窗口, 掩码或None, z_min, z_max), ...]
+        """
+        r0, r1, c0, c1 = window
+        sl = (slice(r0, r1), slice(c0, c1))
+        self.labels[sl] = NO_INSTANCE
+        self.z_min[sl] = np.inf
+        self.z_max[sl] = -np.inf
+        for object_id, (fr0, fr1, fc0, fc1), mask, z_lo, z_hi in sorted(footprints, key=lambda f: f[4]):
+            # 物体覆盖窗口与刷新窗口的交集
+            ir0, ir1, ic0, ic1 = max(r0, fr0), min(r1, fr1), max(c0, fc0), min(c1, fc1)
+            if ir0 >= ir1 or ic0 >= ic1:
+                continue
+            cover = np.ones((ir1 - ir0, ic1 - ic0), dtype=bool) if mask is None \
+                else mask[ir0 - fr0:ir1 - fr0, ic0 - fc0:ic1 - fc0]
+            code = self.code_of(object_id)
+            isl = (slice(ir0, ir1), slice(ic0, ic1))
+            top = self.z_max[isl]
+            self.labels[isl][cover & (top <= z_hi)] = code
+            top[cover] = np.maximum(top[cover], z_hi)
+            bottom = self.z_min[isl]
+            bottom[cover] = np.minimum(bottom[cover], z_lo)
+
+    def object_id_at(self, row: int, col: int) -> Optional[str]:
+        """返回格子所属物体的键，越界或无物体时返回None"""
+        height, width = self.shape
+        if not (0 <= row < height and 0 <= col < width):
+            return None
+        code = int(self.labels[row, col])
+        return self.object_ids[code - 1] if code != NO_INSTANCE else None
+
+    def height_range_at(self, row: int, col: int) -> Optional[Tuple[float, float]]:
+        """返回覆盖该格的物体的 (z_min, z_max)，无物体时返回None"""
+        if self.object_id_at(row, col) is None:
+            return None
+        return float(self.z_min[row, col]), float(self.z_max[row, col])
+
+
+def build_instance_map(object_ids: List[str], bounds: np.ndarray, shape: Tuple[int, int],
+                       resolution: float) -> InstanceMap:
+    """
+    由物体3D边界框生成实例栅格，覆盖规则与generate_grid_map_from_objects一致（格子左下角落在bbox内）
+
+    Args:
+        object_ids: 物体键列表
+        bounds: (N, 6) 的3D边界框
+        shape: (height, width)
+        resolution: 网格分辨率
+
+    Returns:
+        InstanceMap
+    """
+    instance_map = InstanceMap.empty(shape, len(object_ids))
+    # 按顶部高度升序写入，重叠处由更高的物体覆盖
+    for k in np.argsort(bounds[:, MAX_Z], kind="stable"):
+        instance_map.paint(object_ids[k], tuple(bounds[k]), resolution)
+    return instance_map
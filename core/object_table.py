@@ -0,0 +1,571 @@
+"""
+列式物体表
+MapRepresentation.objects 的底层存储：物体的3D边界框、标签编码、id索引以numpy数组按列保存，
+与字典接口保持同步，使重叠检测、高度筛选、栅格化、导出等批量操作可以向量化执行。
+"""
+
+import copy
+import threading
+from collections.abc import KeysView
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from core.spatial_index import SpatialIndex
+from utils.config import config
+
+# bounds 各列含义
+MIN_X, MIN_Y, MIN_Z, MAX_X, MAX_Y, MAX_Z = range(6)
+
+
+class ObjectTable:
+    """列式物体表，每行对应一个物体，删除时用最后一行填补空位"""
+
+    def __init__(self, capacity: int = 16):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.labels: List[str] = []  # 标签词表，label_codes中的编码为其下标
+        self.label_index: Dict[str, int] = {}
+        self._bounds = np.zeros((capacity, 6), dtype=np.float64)
+        self._label_codes = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """(N, 6) 的 (min_x, min_y, min_z, max_x, max_y, max_z)"""
+        return self._bounds[:len(self.ids)]
+
+    @property
+    def label_codes(self) -> np.ndarray:
+        return self._label_codes[:len(self.ids)]
+
+    def bboxes_2d(self) -> np.ndarray:
+        """(N, 4) 的 (min_x, min_y, max_x, max_y)"""
+        return self.bounds[:, [MIN_X, MIN_Y, MAX_X, MAX_Y]]
+
+    def label_code(self, label: str) -> int:
+        """获取标签编码，新标签自动加入词表"""
+        code = self.label_index.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.labels.append(label)
+            self.label_index[label] = code
+        return code
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self._bounds))
+        bounds = np.zeros((capacity, 6), dtype=np.float64)
+        codes = np.zeros(capacity, dtype=np.int32)
+        n = len(self.ids)
+        bounds[:n] = self._bounds[:n]
+        codes[:n] = self._label_codes[:n]
+        self._bounds, self._label_codes = bounds, codes
+
+    def upsert(self, object_id: str, obj) -> int:
+        """
+        插入或更新一个物体的行
+
+        Args:
+            object_id: 字典中的键
+            obj: MapObject
+
+        Returns:
+            行号
+        """
+        row = self.index.get(object_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self._bounds):
+                self._grow()
+            self.ids.append(object_id)
+            self.index[object_id] = row
+        self._bounds[row] = obj.get_bbox_3d()
+        self._label_codes[row] = self.label_code(obj.label)
+        return row
+
+    def extend(self, object_ids: List[str], bounds: np.ndarray, labels: List[str]):
+        """
+        批量追加物体行（键不能已存在）
+
+        Args:
+            object_ids: 字典中的键
+            bounds: (N, 6) 的3D边界框
+            labels: 各物体的标签
+        """
+        start, count = len(self.ids), len(object_ids)
+        while start + count > len(self._bounds):
+            self._grow()
+        self._bounds[start:start + count] = bounds
+        self._label_codes[start:start + count] = [self.label_code(label) for label in labels]
+        self.ids.extend(object_ids)
+        self.index.update(zip(object_ids, range(start, start + count)))
+
+    def remove(self, object_id: str) -> Optional[int]:
+        """
+        删除一个物体的行
+
+        Returns:
+            被删除的行号，不存在时返回None
+        """
+        row = self.index.pop(object_id, None)
+        if row is None:
+            return None
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self.index[moved_id] = row
+            self._bounds[row] = self._bounds[last]
+            self._label_codes[row] = self._label_codes[last]
+        self.ids.pop()
+        return row
+
+    def clear(self):
+        self.ids.clear()
+        self.index.clear()
+
+    def rows_of(self, object_ids) -> np.ndarray:
+        return np.array([self.index[i] for i in object_ids], dtype=np.int64)
+
+    def ids_of(self, rows) -> List[str]:
+        return [self.ids[r] for r in rows]
+
+    def overlapping_bbox(self, bbox_2d: Tuple[float, float, float, float], strict: bool = False) -> np.ndarray:
+        """
+        与给定2D边界框相交的行
+
+        Args:
+            bbox_2d: (min_x, min_y, max_x, max_y)
+            strict: True时只接触边界不算相交
+
+        Returns:
+            行号数组
+        """
+        min_x, min_y, max_x, max_y = bbox_2d
+        b = self.bounds
+        if strict:
+            mask = (b[:, MIN_X] < max_x) & (b[:, MAX_X] > min_x) & (b[:, MIN_Y] < max_y) & (b[:, MAX_Y] > min_y)
+        else:
+            mask = (b[:, MIN_X] <= max_x) & (b[:, MAX_X] >= min_x) & (b[:, MIN_Y] <= max_y) & (b[:, MAX_Y] >= min_y)
+        return np.flatnonzero(mask)
+
+    def in_height_band(self, z_min: float, z_max: float) -> np.ndarray:
+        """高度范围与 (z_min, z_max) 有重叠（不含仅接触）的行"""
+        b = self.bounds
+        return np.flatnonzero((b[:, MAX_Z] > z_min) & (b[:, MIN_Z] < z_max))
+
+    def with_label(self, label: str, exclude: bool = False) -> np.ndarray:
+        """标签等于（或exclude=True时不等于）label的行"""
+        code = self.label_index.get(label, -1)
+        mask = self.label_codes == code
+        return np.flatnonzero(~mask if exclude else mask)
+
+    def to_columns(self) -> dict:
+        """
+        导出为列式字典
+
+        Returns:
+            {"ids": [...], "labels": [...], "label_codes": ndarray, "bounds": ndarray}
+        """
+        return {
+            "ids": list(self.ids),
+            "labels": list(self.labels),
+            "label_codes": self.label_codes.copy(),
+            "bounds": self.bounds.copy(),
+        }
+
+    def copy(self) -> "ObjectTable":
+        table = ObjectTable(capacity=len(self._bounds))
+        table.ids = list(self.ids)
+        table.index = dict(self.index)
+        table.labels = list(self.labels)
+        table.label_index = dict(self.label_index)
+        table._bounds = self._bounds.copy()
+        table._label_codes = self._label_codes.copy()
+        return table
+
+
+class ObjectDict(dict):
+    """
+    与ObjectTable、SpatialIndex保持同步的物体字典。
+    通过字典接口增删物体时自动更新列式表和空间索引；物体加入后若原地修改了position/size，
+    需要重新赋值 objects[key] = obj 或调用 refresh(key) 以刷新。
+    listeners中的回调 callback(key) 在每次修改某个键之前被调用，此时表和索引仍是修改前的状态；
+    change_listeners中的回调 callback(key, old_obj, new_obj) 在修改完成后被调用，新增时old_obj为None，删除时new_obj为None。
+    fork()得到的副本与原字典写时复制地共享列式表、空间索引和物体：fork之后任一方第一次读取某个物体时
+    才复制该物体，因此原地修改读取到的物体（再调用refresh）不会影响其他副本和快照；frozen为True时拒绝任何修改。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.table = ObjectTable()
+        self.spatial_index = SpatialIndex(config.get_spatial_index_cell_size())
+        self.listeners = []
+        self.change_listeners = []
+        self.frozen = False
+        self._shares_index = False
+        # 本字典独占的物体的键，None表示从未fork过（全部独占）
+        self._private: Optional[Set[str]] = None
+        objects = dict(*args, **kwargs)
+        if objects:
+            # 构造时还没有监听者，直接批量建立列式表和空间索引
+            dict.update(self, objects)
+            keys = list(objects)
+            bounds = np.array([obj.get_bbox_3d() for obj in objects.values()], dtype=np.float64).reshape(-1, 6)
+            self.table.extend(keys, bounds, [obj.label for obj in objects.values()])
+            self.spatial_index.insert_many(keys, bounds[:, [MIN_X, MIN_Y, MAX_X, MAX_Y]])
+
+    def fork(self) -> "ObjectDict":
+        """
+        创建副本：物体按引用共享，任一方第一次读取某个物体时才复制它；
+        列式表和空间索引在任一方第一次修改时才复制
+        """
+        child = ObjectDict.__new__(ObjectDict)
+        # 只复制已创建的物体（LazyObjectDict中待创建的物体由其自身的fork处理）
+        dict.update(child, dict.items(self))
+        child.table = self.table
+        child.spatial_index = self.spatial_index
+        child.listeners = []
+        child.change_listeners = []
+        child.frozen = False
+        child._shares_index = True
+        self._shares_index = True
+        # 此后双方的物体都是共享的
+        child._private = set()
+        self._private = set()
+        return child
+
+    def _is_shared(self, key) -> bool:
+        return self._private is not None and key not in self._private
+
+    def _own(self, key, obj):
+        """把共享的物体替换为本字典独占的副本（列式表和空间索引的记录不变）"""
+        obj = copy.copy(obj)
+        dict.__setitem__(self, key, obj)
+        self._private.add(key)
+        return obj
+
+    def _own_all(self):
+        if self._private is not None and len(self._private) < dict.__len__(self):
+            for key, obj in list(dict.items(self)):
+                if key not in self._private:
+                    self._own(key, obj)
+
+    def __getitem__(self, key):
+        obj = dict.__getitem__(self, key)
+        if self._is_shared(key):
+            obj = self._own(key, obj)
+        return obj
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    def __reduce__(self):
+        # 拷贝和序列化时只保留物体本身，监听者属于原地图
+        return ObjectDict, (dict(self),)
+
+    def __deepcopy__(self, memo):
+        return ObjectDict({key: copy.deepcopy(obj, memo) for key, obj in dict.items(self)})
+
+    def _own_index(self):
+        if self._shares_index:
+            self.table = self.table.copy()
+            self.spatial_index = self.spatial_index.copy()
+            self._shares_index = False
+
+    def _notify(self, key):
+        if self.frozen:
+            raise TypeError("只读快照中的物体不可修改")
+        for callback in self.listeners:
+            callback(key)
+
+    def _notify_changed(self, key, old_obj, new_obj):
+        for callback in self.change_listeners:
+            callback(key, old_obj, new_obj)
+
+    def _sync_set(self, key, obj):
+        self._own_index()
+        self.table.upsert(key, obj)
+        self.spatial_index.insert(key, obj.get_bbox_2d())
+
+    def _sync_remove(self, key):
+        self._own_index()
+        self.table.remove(key)
+        self.spatial_index.remove(key)
+
+    def _take(self, key):
+        """从存储中移除键，返回本字典独占的物体"""
+        shared = self._is_shared(key)
+        obj = dict.pop(self, key)
+        if self._private is not None:
+            self._private.discard(key)
+        return copy.copy(obj) if shared else obj
+
+    def __setitem__(self, key, obj):
+        self._notify(key)
+        old_obj = dict.get(self, key)
+        dict.__setitem__(self, key, obj)
+        if self._private is not None:
+            self._private.add(key)
+        self._sync_set(key, obj)
+        self._notify_changed(key, old_obj, obj)
+
+    def __delitem__(self, key):
+        if key in self:
+            self._notify(key)
+        else:
+            raise KeyError(key)
+        old_obj = self._take(key)
+        self._sync_remove(key)
+        self._notify_changed(key, old_obj, None)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._notify(key)
+            obj = self._take(key)
+            self._sync_remove(key)
+            self._notify_changed(key, obj, None)
+            return obj
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(self))
+        self._notify(key)
+        obj = self._take(key)
+        self._sync_remove(key)
+        self._notify_changed(key, obj, None)
+        return key, obj
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, obj in dict(*args, **kwargs).items():
+            self[key] = obj
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        removed = list(dict.items(self))
+        for key, _ in removed:
+            self._notify(key)
+        super().clear()
+        if self._private is not None:
+            self._private.clear()
+        self._own_index()
+        self.table.clear()
+        self.spatial_index.clear()
+        for key, obj in removed:
+            self._notify_changed(key, obj, None)
+
+    def refresh(self, key):
+        """物体原地修改后刷新其在列式表和空间索引中的记录"""
+        self._notify(key)
+        obj = self[key]
+        self._sync_set(key, obj)
+        self._notify_changed(key, obj, obj)
+
+    def created_items(self):
+        """已创建的 (键, 物体)；LazyObjectDict中尚未创建的物体不包括在内，也不会因此被创建"""
+        return dict.items(self)
+
+
+class _PendingObjects:
+    """LazyObjectDict中尚未创建的物体的列式数据（只读，fork出的副本共享）"""
+
+    def __init__(self, rows: Dict[str, int], labels: List[str], ids: List[Optional[str]],
+                 geometry: np.ndarray, factory: Callable):
+        self.rows = rows
+        self.labels = labels
+        self.ids = ids
+        self.geometry = geometry
+        self.factory = factory
+        self.lock = threading.Lock()
+
+    def make(self, key: str):
+        row = self.rows[key]
+        x, y, z, w, d, h = self.geometry[row].tolist()
+        return self.factory(label=self.labels[row], size=(w, d, h), position=(x, y, z), id=self.ids[row])
+
+
+class LazyObjectDict(ObjectDict):
+    """
+    按需创建物体的ObjectDict。
+    列式表和空间索引在构造时就按列数据建立，因此依赖它们的批量操作（栅格化、重叠检测、空间查询等）
+    不会创建物体；按键访问物体时才创建对应的MapObject，遍历values()/items()、拷贝或序列化时全部创建。
+    尚未创建的键记录在_pending中，字典本身的存储只保存已创建的物体，
+    因此dict(objects)、{**objects}等直接读取存储的操作也只会得到真正的物体。
+    遍历顺序与普通字典一致（文件中的顺序，删除后重新加入的键排在最后）。
+    所有物体都创建后，实例的类型变回ObjectDict，不再有额外开销。
+    """
+
+    def __init__(self, keys: List[str], labels: List[str], ids: List[Optional[str]],
+                 geometry: np.ndarray, factory: Callable):
+        """
+        Args:
+            keys: 字典中的键
+            labels: 各物体的标签
+            ids: 各物体的id字段（None表示使用默认值）
+            geometry: (N, 6) 的 (x, y, z, 长, 宽, 高)，即position和size
+            factory: 创建物体的函数 factory(label=, size=, position=, id=)
+        """
+        super().__init__()
+        geometry = np.asarray(geometry, dtype=np.float64).reshape(-1, 6)
+        rows = {key: row for row, key in enumerate(keys)}
+        if len(rows) != len(keys):
+            # 重复的键以最后一次出现为准，位置保留第一次出现的位置（与json.load一致）
+            keys = list(rows)
+        bounds = np.hstack([geometry[:, :3], geometry[:, :3] + geometry[:, 3:]])[list(rows.values())]
+        self.table.extend(keys, bounds, [labels[row] for row in rows.values()])
+        self.spatial_index.insert_many(keys, bounds[:, [MIN_X, MIN_Y, MAX_X, MAX_Y]])
+        self._source = _PendingObjects(rows, labels, ids, geometry, factory)
+        # 尚未创建的键（按文件中的顺序），以及删除过、不再按文件顺序遍历的键
+        self._pending: Dict[str, None] = dict.fromkeys(keys)
+        self._moved = set()
+        if not self._pending:
+            self.__class__ = ObjectDict
+
+    @property
+    def pending_count(self) -> int:
+        """尚未创建的物体数"""
+        return len(self._pending)
+
+    def _resolve(self, key):
+        with self._source.lock:
+            if key not in self._pending:
+                return dict.__getitem__(self, key)
+            value = self._source.make(key)
+            dict.__setitem__(self, key, value)
+            if self._private is not None:
+                self._private.add(key)
+            del self._pending[key]
+            if not self._pending:
+                self._finish()
+        return value
+
+    def _finish(self):
+        # 按遍历顺序重排存储，之后直接作为ObjectDict使用
+        items = [(key, dict.__getitem__(self, key)) for key in self]
+        dict.clear(self)
+        dict.update(self, items)
+        self.__class__ = ObjectDict
+        del self._moved, self._source
+
+    def materialize(self):
+        """创建所有尚未创建的物体"""
+        for key in list(self._pending):
+            if self.__class__ is not LazyObjectDict:
+                break
+            self._resolve(key)
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            return self._resolve(key)
+        return ObjectDict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __contains__(self, key):
+        return key in self._pending or dict.__contains__(self, key)
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._pending)
+
+    def __iter__(self):
+        rows, pending, moved = self._source.rows, self._pending, self._moved
+        for key in rows:
+            if key in pending or (key not in moved and dict.__contains__(self, key)):
+                yield key
+        for key in dict.__iter__(self):
+            if key in moved or key not in rows:
+                yield key
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def keys(self):
+        return KeysView(self)
+
+    def values(self):
+        self.materialize()
+        return ObjectDict.values(self)
+
+    def items(self):
+        self.materialize()
+        return ObjectDict.items(self)
+
+    def copy(self) -> dict:
+        self.materialize()
+        return dict.copy(self)
+
+    def __or__(self, other):
+        return self.copy() | other
+
+    def __ror__(self, other):
+        return other | self.copy()
+
+    def __eq__(self, other):
+        self.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.materialize()
+        return dict.__ne__(self, other)
+
+    def __repr__(self):
+        self.materialize()
+        return dict.__repr__(self)
+
+    def fork(self) -> "ObjectDict":
+        child = ObjectDict.fork(self)
+        child.__class__ = LazyObjectDict
+        child._source = self._source
+        child._pending = dict(self._pending)
+        child._moved = set(self._moved)
+        return child
+
+    def __reduce__(self):
+        return ObjectDict, (self.copy(),)
+
+    # 删除或覆盖时先创建物体，使监听者收到的旧物体保持正确
+    def __setitem__(self, key, obj):
+        if key in self:
+            self[key]
+        ObjectDict.__setitem__(self, key, obj)
+
+    def __delitem__(self, key):
+        if key in self:
+            self._moved.add(key)
+            self[key]
+        ObjectDict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._moved.add(key)
+            self[key]
+        return ObjectDict.pop(self, key, *default)
+
+    def popitem(self):
+        self.materialize()
+        return ObjectDict.popitem(self)
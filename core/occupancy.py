@@ -0,0 +1,151 @@
+"""
+引用计数占据栅格
+记录每个格子被多少个物体覆盖，删除或移动物体时只需更新其旧/新覆盖区域，
+二值grid_map由计数是否为0得到。
+"""
+
+from typing import Dict, Iterable, Optional, Tuple, Union
+import numpy as np
+from core.tiled_grid import TiledGrid, Window
+from utils.kernels import cell_window
+
+
+def window_slices(window: Window) -> Tuple[slice, slice]:
+    r0, r1, c0, c1 = window
+    return slice(r0, r1), slice(c0, c1)
+
+
+def intersect_windows(a: Window, b: Window) -> Optional[Window]:
+    """两个窗口的交集，为空时返回None"""
+    r0, r1 = max(a[0], b[0]), min(a[1], b[1])
+    c0, c1 = max(a[2], b[2]), min(a[3], b[3])
+    if r0 >= r1 or c0 >= c1:
+        return None
+    return r0, r1, c0, c1
+
+
+class OccupancyGrid:
+    """
+    每格覆盖物体计数。每个物体记录其计数的窗口和可选掩码（None表示整个窗口），
+    删除时按同样的格子扣减，保证增删可逆。
+    """
+
+    def __init__(self, shape: Tuple[int, int], sparse_tile_size: Optional[int] = None):
+        # 计数以分块写时复制的方式存储，fork时共享未修改的块；
+        # 给定sparse_tile_size时使用稀疏分块（与稀疏grid map配合，全0的块不分配数组）
+        if sparse_tile_size is None:
+            self._counts = TiledGrid(np.zeros(shape, dtype=np.uint16))
+        else:
+            self._counts = TiledGrid.filled(shape, 0, np.uint16, sparse_tile_size)
+        self.footprints: Dict[str, Tuple[Window, Optional[np.ndarray]]] = {}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._counts.shape
+
+    @property
+    def counts(self) -> np.ndarray:
+        """完整计数数组（fork之后为只读）"""
+        return self._counts.to_array()
+
+    def fork(self) -> "OccupancyGrid":
+        """创建写时复制副本，计数按块共享，掩码按引用共享（掩码创建后不再修改）"""
+        child = OccupancyGrid.__new__(OccupancyGrid)
+        child._counts = self._counts.fork()
+        child.footprints = dict(self.footprints)
+        return child
+
+    def add(self, object_id: str, window: Window, mask: Optional[np.ndarray] = None):
+        """
+        登记一个物体覆盖的格子
+
+        Args:
+            object_id: 物体键，已存在时先删除旧记录
+            window: 覆盖窗口
+            mask: 与窗口同形状的布尔掩码，None表示整个窗口
+        """
+        if object_id in self.footprints:
+            self.remove(object_id)
+        self.footprints[object_id] = (window, mask)
+        if mask is None:
+            self._counts.apply(window, lambda view, rel: view.__iadd__(1))
+        else:
+            self._counts.apply(window, lambda view, rel: view.__iadd__(mask[rel]))
+
+    def remove(self, object_id: str) -> Optional[Window]:
+        """
+        撤销一个物体的计数
+
+        Returns:
+            该物体的覆盖窗口，未登记时返回None
+        """
+        footprint = self.footprints.pop(object_id, None)
+        if footprint is None:
+            return None
+        window, mask = footprint
+        if mask is None:
+            self._counts.apply(window, lambda view, rel: view.__isub__(1))
+        else:
+            self._counts.apply(window, lambda view, rel: view.__isub__(mask[rel]))
+        return window
+
+    def sync_grid(self, grid: TiledGrid, window: Window):
+        """按计数刷新grid map在窗口内的取值（计数为0即可通行）"""
+        grid.assign(window, self._counts.read_window(window) == 0)
+
+    @staticmethod
+    def from_grid(grid_map: Union[np.ndarray, TiledGrid], objects: Iterable[Tuple[str, Tuple[float, float, float, float]]],
+                  resolution: float) -> "OccupancyGrid":
+        """
+        由现有grid_map和物体重建计数。
+        全量生成和增量更新使用相同的格子左下角规则，每个物体只计入其覆盖窗口内当前为障碍的格子；
+        不属于任何物体的障碍格（例如直接写入的障碍）计为静态障碍，永远不会被清除。
+
+        Args:
+            grid_map: 当前二值grid map（稀疏TiledGrid时逐块重建，计数同样为稀疏分块）
+            objects: (物体键, 2D边界框) 序列
+            resolution: 网格分辨率
+
+        Returns:
+            OccupancyGrid
+        """
+        if isinstance(grid_map, TiledGrid):
+            if grid_map.is_sparse:
+                return OccupancyGrid._from_tiled_grid(grid_map, objects, resolution)
+            grid_map = grid_map.to_array()
+        occupancy = OccupancyGrid(grid_map.shape)
+        blocked = grid_map == 0
+        for object_id, bbox_2d in objects:
+            window = cell_window(bbox_2d, resolution, grid_map.shape, centered=False)
+            if window[0] >= window[1] or window[2] >= window[3]:
+                continue
+            mask = blocked[window_slices(window)]
+            occupancy.add(object_id, window, None if mask.all() else mask.copy())
+        counts = occupancy._counts.to_array()
+        counts[blocked & (counts == 0)] = 1
+        return occupancy
+
+    @staticmethod
+    def _from_tiled_grid(grid: TiledGrid, objects: Iterable[Tuple[str, Tuple[float, float, float, float]]],
+                         resolution: float) -> "OccupancyGrid":
+        """from_grid的稀疏版本：物体掩码按窗口读取，静态障碍逐块补计数"""
+        occupancy = OccupancyGrid(grid.shape, sparse_tile_size=grid.tile_size)
+        for object_id, bbox_2d in objects:
+            window = cell_window(bbox_2d, resolution, grid.shape, centered=False)
+            if window[0] >= window[1] or window[2] >= window[3]:
+                continue
+            mask = grid.read_window(window) == 0
+            occupancy.add(object_id, window, None if mask.all() else mask)
+        for _, _, window, tile in grid.iter_tiles():
+            if np.isscalar(tile) or isinstance(tile, np.generic):
+                if tile != 0:
+                    continue
+                blocked = np.ones((window[1] - window[0], window[3] - window[2]), dtype=bool)
+            else:
+                blocked = tile == 0
+                if not blocked.any():
+                    continue
+            static = blocked & (occupancy._counts.read_window(window) == 0)
+            if static.any():
+                occupancy._counts.apply(window, lambda view, rel: view.__iadd__(static[rel]))
+        return occupancy
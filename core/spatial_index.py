@@ -0,0 +1,230 @@
+"""
+物体空间索引
+均匀分桶网格：每个物体按2D边界框登记到其覆盖的所有桶中，
+查询时只检查相关桶内的物体，单次查询代价与查询区域内的物体数相关，而与物体总数无关。
+"""
+
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+
+class SpatialIndex:
+    """基于均匀分桶网格的2D边界框索引，支持增量插入/删除"""
+
+    def __init__(self, cell_size: float = 1.0):
+        if cell_size <= 0:
+            raise ValueError("cell_size必须为正数")
+        self.cell_size = cell_size
+        self.buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self.bboxes: Dict[str, Tuple[float, float, float, float]] = {}
+        # 已占用桶的范围（只增不减，用作最近邻搜索的终止条件）
+        self._extent: Optional[Tuple[int, int, int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    def __contains__(self, object_id: str) -> bool:
+        return object_id in self.bboxes
+
+    def _bucket_range(self, bbox_2d: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+        min_x, min_y, max_x, max_y = bbox_2d
+        cs = self.cell_size
+        return (math.floor(min_x / cs), math.floor(min_y / cs),
+                math.floor(max_x / cs), math.floor(max_y / cs))
+
+    def insert(self, object_id: str, bbox_2d: Tuple[float, float, float, float]):
+        """
+        插入或更新一个物体
+
+        Args:
+            object_id: 物体键
+            bbox_2d: (min_x, min_y, max_x, max_y)
+        """
+        if object_id in self.bboxes:
+            self.remove(object_id)
+        bbox_2d = tuple(float(v) for v in bbox_2d)
+        self.bboxes[object_id] = bbox_2d
+        bx0, by0, bx1, by1 = self._bucket_range(bbox_2d)
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                self.buckets.setdefault((bx, by), set()).add(object_id)
+        if self._extent is None:
+            self._extent = (bx0, by0, bx1, by1)
+        else:
+            ex0, ey0, ex1, ey1 = self._extent
+            self._extent = (min(ex0, bx0), min(ey0, by0), max(ex1, bx1), max(ey1, by1))
+
+    def insert_many(self, object_ids: Sequence[str], bboxes_2d: np.ndarray):
+        """
+        批量插入物体（已存在的键按insert逐个更新）
+
+        Args:
+            object_ids: 物体键
+            bboxes_2d: (N, 4) 的 (min_x, min_y, max_x, max_y)
+        """
+        bboxes_2d = np.asarray(bboxes_2d, dtype=np.float64).reshape(-1, 4)
+        if any(object_id in self.bboxes for object_id in object_ids):
+            for object_id, bbox in zip(object_ids, bboxes_2d.tolist()):
+                self.insert(object_id, bbox)
+            return
+        if not len(object_ids):
+            return
+        ranges = np.floor(bboxes_2d / self.cell_size).astype(np.int64)
+        self.bboxes.update(zip(object_ids, map(tuple, bboxes_2d.tolist())))
+        # 只占一个桶的物体（通常是绝大多数）按桶分组后整组加入
+        single = (ranges[:, 0] == ranges[:, 2]) & (ranges[:, 1] == ranges[:, 3])
+        rows = np.flatnonzero(single)
+        if len(rows):
+            order = rows[np.lexsort((ranges[rows, 1], ranges[rows, 0]))]
+            keys = ranges[order][:, :2]
+            starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+            ends = np.r_[starts[1:], len(order)]
+            for start, end, (bx, by) in zip(starts.tolist(), ends.tolist(), keys[starts].tolist()):
+                self.buckets.setdefault((bx, by), set()).update(object_ids[k] for k in order[start:end].tolist())
+        for k in np.flatnonzero(~single).tolist():
+            bx0, by0, bx1, by1 = ranges[k].tolist()
+            for bx in range(bx0, bx1 + 1):
+                for by in range(by0, by1 + 1):
+                    self.buckets.setdefault((bx, by), set()).add(object_ids[k])
+        lo, hi = ranges[:, :2].min(axis=0).tolist(), ranges[:, 2:].max(axis=0).tolist()
+        if self._extent is not None:
+            ex0, ey0, ex1, ey1 = self._extent
+            lo, hi = [min(lo[0], ex0), min(lo[1], ey0)], [max(hi[0], ex1), max(hi[1], ey1)]
+        self._extent = (lo[0], lo[1], hi[0], hi[1])
+
+    def remove(self, object_id: str) -> bool:
+        """
+        删除一个物体
+
+        Returns:
+            物体存在并被删除时返回True
+        """
+        bbox_2d = self.bboxes.pop(object_id, None)
+        if bbox_2d is None:
+            return False
+        bx0, by0, bx1, by1 = self._bucket_range(bbox_2d)
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                bucket = self.buckets.get((bx, by))
+                if bucket is not None:
+                    bucket.discard(object_id)
+                    if not bucket:
+                        del self.buckets[(bx, by)]
+        return True
+
+    def copy(self) -> "SpatialIndex":
+        index = SpatialIndex(self.cell_size)
+        index.buckets = {key: set(bucket) for key, bucket in self.buckets.items()}
+        index.bboxes = dict(self.bboxes)
+        index._extent = self._extent
+        return index
+
+    def clear(self):
+        self.buckets.clear()
+        self.bboxes.clear()
+        self._extent = None
+
+    def _candidates(self, bbox_2d: Tuple[float, float, float, float]) -> Set[str]:
+        bx0, by0, bx1, by1 = self._bucket_range(bbox_2d)
+        found: Set[str] = set()
+        # 查询区域很大时直接遍历已占用的桶
+        if (bx1 - bx0 + 1) * (by1 - by0 + 1) > len(self.buckets):
+            for (bx, by), bucket in self.buckets.items():
+                if bx0 <= bx <= bx1 and by0 <= by <= by1:
+                    found |= bucket
+            return found
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                bucket = self.buckets.get((bx, by))
+                if bucket:
+                    found |= bucket
+        return found
+
+    def query_bbox(self, bbox_2d: Tuple[float, float, float, float], strict: bool = False) -> List[str]:
+        """
+        查询与给定2D边界框相交的物体
+
+        Args:
+            bbox_2d: (min_x, min_y, max_x, max_y)
+            strict: True时只接触边界不算相交
+
+        Returns:
+            物体键列表（按键排序）
+        """
+        min_x, min_y, max_x, max_y = bbox_2d
+        result = []
+        for object_id in self._candidates(bbox_2d):
+            omin_x, omin_y, omax_x, omax_y = self.bboxes[object_id]
+            if strict:
+                hit = omin_x < max_x and omax_x > min_x and omin_y < max_y and omax_y > min_y
+            else:
+                hit = omin_x <= max_x and omax_x >= min_x and omin_y <= max_y and omax_y >= min_y
+            if hit:
+                result.append(object_id)
+        result.sort()
+        return result
+
+    def query_point(self, x: float, y: float) -> List[str]:
+        """
+        查询边界框包含点 (x, y) 的物体（含边界）
+
+        Returns:
+            物体键列表（按键排序）
+        """
+        return self.query_bbox((x, y, x, y))
+
+    def _ring_cells(self, cx: int, cy: int, ring: int):
+        """以 (cx, cy) 为中心、切比雪夫距离为ring的环上且位于已占用范围内的桶（只遍历环的四条边）"""
+        if ring == 0:
+            yield cx, cy
+            return
+        ex0, ey0, ex1, ey1 = self._extent
+        bx0, bx1 = max(cx - ring, ex0), min(cx + ring, ex1)
+        for by in (cy - ring, cy + ring):
+            if ey0 <= by <= ey1:
+                for bx in range(bx0, bx1 + 1):
+                    yield bx, by
+        by0, by1 = max(cy - ring + 1, ey0), min(cy + ring - 1, ey1)
+        for bx in (cx - ring, cx + ring):
+            if ex0 <= bx <= ex1:
+                for by in range(by0, by1 + 1):
+                    yield bx, by
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[Tuple[float, str]]:
+        """
+        查询距离点 (x, y) 最近的k个物体，距离为点到边界框的欧氏距离（点在框内时为0）
+
+        Returns:
+            [(距离, 物体键), ...]，按距离升序
+        """
+        if k <= 0 or not self.bboxes:
+            return []
+        cs = self.cell_size
+        cx, cy = math.floor(x / cs), math.floor(y / cs)
+        ex0, ey0, ex1, ey1 = self._extent
+        max_ring = max(abs(cx - ex0), abs(cx - ex1), abs(cy - ey0), abs(cy - ey1))
+        # 所有桶都在已占用范围内，查询点在范围之外时，比范围更近的环上没有桶
+        ring = max(ex0 - cx, cx - ex1, ey0 - cy, cy - ey1, 0)
+        seen: Set[str] = set()
+        best: List[Tuple[float, str]] = []  # 以负距离组成的大顶堆
+        while ring <= max_ring:
+            for bucket_key in self._ring_cells(cx, cy, ring):
+                for object_id in self.buckets.get(bucket_key, ()):
+                    if object_id in seen:
+                        continue
+                    seen.add(object_id)
+                    min_x, min_y, max_x, max_y = self.bboxes[object_id]
+                    dx = max(min_x - x, 0.0, x - max_x)
+                    dy = max(min_y - y, 0.0, y - max_y)
+                    item = (-math.hypot(dx, dy), object_id)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+            # 未访问的桶到查询点的距离至少为 ring * cell_size
+            if len(best) == k and -best[0][0] <= ring * cs:
+                break
+            ring += 1
+        return sorted((-d, object_id) for d, object_id in best)
@@ -0,0 +1,484 @@
+"""
+分块栅格
+把一个二维数组按固定大小分块，支持两种用法：
+- 写时复制：fork()只复制被修改过的块的引用，之后任何一方写入某块时才复制该块，
+  未修改的块在所有副本之间共享；
+- 稀疏存储：由filled()创建时没有底层稠密数组，取值全部相同的块只记录一个值，
+  只有内容不均匀的块才分配数组，适合大部分区域为空地的超大画布。
+"""
+
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple, Union
+import numpy as np
+
+# 窗口为左闭右开的 (row_start, row_end, col_start, col_end)
+Window = Tuple[int, int, int, int]
+
+
+class TiledGrid:
+    """
+    分块写时复制的二维数组。
+    未被fork过时直接读写底层数组，没有额外开销；fork之后底层数组变为只读共享（此前取得的数组引用也不再可写），
+    写入按块复制，读取整个数组时组装出一份私有副本并随后续写入同步更新；detach()可结束共享。
+    稀疏模式（见filled）下没有底层数组，未分配的块取其均匀值。
+
+    支持grid map常用的索引方式：grid[r, c]、grid[r0:r1, c0:c1]、grid[rows, cols]（整数数组），
+    以及np.asarray(grid)得到完整数组。
+    """
+
+    ndim = 2
+
+    def __init__(self, array: np.ndarray, tile_size: int = 64):
+        self._base: Optional[np.ndarray] = array
+        self._shape: Tuple[int, int] = array.shape
+        self._dtype = array.dtype
+        self.tile_size = tile_size
+        self._base_shared = False
+        self._tiles: Dict[Tuple[int, int], np.ndarray] = {}  # 被修改过的块（稀疏模式下为非均匀块）
+        self._owned: Set[Tuple[int, int]] = set()  # 本对象独占、可直接写入的块
+        self._assembled: Optional[np.ndarray] = None  # 组装出的完整数组（私有）
+        # 稀疏模式：未分配的块取 _uniform.get(块, _fill)
+        self._fill = None
+        self._uniform: Dict[Tuple[int, int], object] = {}
+
+    @staticmethod
+    def filled(shape: Tuple[int, int], fill_value, dtype=np.uint8, tile_size: int = 256) -> "TiledGrid":
+        """
+        创建稀疏的分块栅格，所有格子初始为fill_value，不分配稠密数组
+
+        Args:
+            shape: (height, width)
+            fill_value: 初始值
+            dtype: 数据类型
+            tile_size: 块边长（格）
+
+        Returns:
+            TiledGrid
+        """
+        grid = TiledGrid.__new__(TiledGrid)
+        grid._base = None
+        grid._shape = (int(shape[0]), int(shape[1]))
+        grid._dtype = np.dtype(dtype)
+        grid.tile_size = tile_size
+        grid._base_shared = False
+        grid._tiles = {}
+        grid._owned = set()
+        grid._assembled = None
+        grid._fill = grid._dtype.type(fill_value)
+        grid._uniform = {}
+        return grid
+
+    @staticmethod
+    def from_tiles(shape: Tuple[int, int], dtype, tile_size: int, fill_value,
+                   uniform: Dict[Tuple[int, int], object],
+                   tiles: Dict[Tuple[int, int], np.ndarray]) -> "TiledGrid":
+        """
+        由逐块数据构建稀疏分块栅格（用于加载）
+
+        Args:
+            shape: (height, width)
+            dtype: 数据类型
+            tile_size: 块边长
+            fill_value: 未列出的块的取值
+            uniform: {块: 均匀值}
+            tiles: {块: 块数组}，形状须与块一致（边缘块可能较小）
+
+        Returns:
+            TiledGrid
+        """
+        grid = TiledGrid.filled(shape, fill_value, dtype, tile_size)
+        for key, value in uniform.items():
+            grid._uniform[key] = grid._dtype.type(value)
+        for key, tile in tiles.items():
+            grid._tiles[key] = np.asarray(tile, dtype=grid._dtype)
+            grid._owned.add(key)
+        return grid
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def size(self) -> int:
+        return self._shape[0] * self._shape[1]
+
+    def __len__(self) -> int:
+        return self._shape[0]
+
+    @property
+    def fill_value(self):
+        """稀疏模式下未分配块的默认值（稠密模式为None）"""
+        return self._fill
+
+    @property
+    def is_sparse(self) -> bool:
+        """是否为稀疏模式（没有底层稠密数组）"""
+        return self._base is None
+
+    @property
+    def is_shared(self) -> bool:
+        """底层数据是否与其他副本共享"""
+        return self._base_shared
+
+    @property
+    def num_private_tiles(self) -> int:
+        """本对象独占的块数（即fork之后实际复制的块数）"""
+        return len(self._owned)
+
+    @property
+    def tile_grid_shape(self) -> Tuple[int, int]:
+        """块的行数和列数"""
+        ts = self.tile_size
+        return -(-self._shape[0] // ts), -(-self._shape[1] // ts)
+
+    @property
+    def num_dense_tiles(self) -> int:
+        """已分配数组的块数"""
+        return len(self._tiles)
+
+    @property
+    def nbytes(self) -> int:
+        """实际占用的数组字节数（不含组装出的完整数组）"""
+        total = sum(tile.nbytes for tile in self._tiles.values())
+        if self._base is not None:
+            total += self._base.nbytes
+        return total
+
+    def fork(self) -> "TiledGrid":
+        """
+        创建写时复制副本，代价与已修改的块数成正比，与数组大小无关
+
+        Returns:
+            新的TiledGrid，与当前对象共享所有未修改的数据
+        """
+        self._base_shared = True
+        if self._base is not None:
+            # 之前取得的底层数组引用不能再写入共享数据
+            self._base.flags.writeable = False
+        child = TiledGrid.__new__(TiledGrid)
+        child._base = self._base
+        child._shape = self._shape
+        child._dtype = self._dtype
+        child.tile_size = self.tile_size
+        child._base_shared = True
+        child._tiles = dict(self._tiles)
+        child._owned = set()
+        child._assembled = None
+        child._fill = self._fill
+        child._uniform = dict(self._uniform)
+        # 已修改的块此后由双方共享，任何一方再写入都需要先复制
+        self._owned = set()
+        return child
+
+    def copy(self) -> "TiledGrid":
+        """独立副本（写时复制）"""
+        return self.fork()
+
+    def detach(self) -> np.ndarray:
+        """
+        结束与其他副本的共享：把当前内容组装为本对象独占的底层数组，之后直接读写它，不再按块复制
+
+        Returns:
+            可写的底层数组
+
+        Raises:
+            ValueError: 稀疏模式（没有底层数组）
+        """
+        if self._base is None:
+            raise ValueError("稀疏分块栅格没有底层数组")
+        if self._base_shared:
+            array = self._assembled if self._assembled is not None else self.to_array().copy()
+            array.flags.writeable = True
+            self._base = array
+            self._tiles = {}
+            self._owned = set()
+            self._assembled = None
+            self._base_shared = False
+        return self._base
+
+    def _tile_slices(self, tr: int, tc: int) -> Tuple[slice, slice]:
+        ts = self.tile_size
+        return slice(tr * ts, min((tr + 1) * ts, self._shape[0])), slice(tc * ts, min((tc + 1) * ts, self._shape[1]))
+
+    def _tile_window(self, tr: int, tc: int) -> Window:
+        rows, cols = self._tile_slices(tr, tc)
+        return rows.start, rows.stop, cols.start, cols.stop
+
+    def _uniform_value(self, key: Tuple[int, int]):
+        return self._uniform.get(key, self._fill)
+
+    def _writable_tile(self, tr: int, tc: int) -> np.ndarray:
+        key = (tr, tc)
+        if key not in self._owned:
+            source = self._tiles.get(key)
+            if source is not None:
+                tile = source.copy()
+            elif self._base is not None:
+                tile = self._base[self._tile_slices(tr, tc)].copy()
+            else:
+                rows, cols = self._tile_slices(tr, tc)
+                tile = np.full((rows.stop - rows.start, cols.stop - cols.start), self._uniform.pop(key, self._fill), dtype=self._dtype)
+            self._tiles[key] = tile
+            self._owned.add(key)
+        return self._tiles[key]
+
+    def _iter_tiles(self, window: Window):
+        """遍历与窗口相交的块，产出 (tr, tc, 块内切片, 窗口内切片)"""
+        r0, r1, c0, c1 = window
+        ts = self.tile_size
+        for tr in range(r0 // ts, (r1 - 1) // ts + 1):
+            tr0 = tr * ts
+            rs0, rs1 = max(r0, tr0), min(r1, tr0 + ts)
+            for tc in range(c0 // ts, (c1 - 1) // ts + 1):
+                tc0 = tc * ts
+                cs0, cs1 = max(c0, tc0), min(c1, tc0 + ts)
+                yield (tr, tc,
+                       (slice(rs0 - tr0, rs1 - tr0), slice(cs0 - tc0, cs1 - tc0)),
+                       (slice(rs0 - r0, rs1 - r0), slice(cs0 - c0, cs1 - c0)))
+
+    def iter_tiles(self) -> Iterator[Tuple[int, int, Window, Union[np.ndarray, object]]]:
+        """
+        逐块遍历全部数据
+
+        Returns:
+            (tr, tc, 块窗口, 块数组或均匀值) 的迭代器；块数组为只读
+        """
+        rows, cols = self.tile_grid_shape
+        for tr in range(rows):
+            for tc in range(cols):
+                window = self._tile_window(tr, tc)
+                tile = self._tiles.get((tr, tc))
+                if tile is None:
+                    if self._base is None:
+                        yield tr, tc, window, self._uniform_value((tr, tc))
+                        continue
+                    tile = self._base[self._tile_slices(tr, tc)]
+                tile = tile.view()
+                tile.flags.writeable = False
+                yield tr, tc, window, tile
+
+    def _clip(self, window: Window) -> Window:
+        r0, r1, c0, c1 = window
+        h, w = self._shape
+        return max(r0, 0), min(r1, h), max(c0, 0), min(c1, w)
+
+    def apply(self, window: Window, fn: Callable[[np.ndarray, Tuple[slice, slice]], None]):
+        """
+        原地修改窗口内的数据
+
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+            fn: fn(view, rel)，view为可写的子数组，rel为view在窗口内对应的切片
+        """
+        r0, r1, c0, c1 = window
+        if r0 >= r1 or c0 >= c1:
+            return
+        if self._base is not None and not self._base_shared:
+            fn(self._base[r0:r1, c0:c1], (slice(0, r1 - r0), slice(0, c1 - c0)))
+            return
+        for tr, tc, local, rel in self._iter_tiles(window):
+            fn(self._writable_tile(tr, tc)[local], rel)
+        if self._assembled is not None:
+            fn(self._assembled[r0:r1, c0:c1], (slice(0, r1 - r0), slice(0, c1 - c0)))
+
+    def fill(self, window: Window, value):
+        """
+        把窗口内的格子设为同一个值。稀疏模式下被窗口完全覆盖的块只记录均匀值，不分配数组
+
+        Args:
+            window: (row_start, row_end, col_start, col_end)
+            value: 标量
+        """
+        r0, r1, c0, c1 = window
+        if r0 >= r1 or c0 >= c1:
+            return
+        if self._base is not None:
+            self.apply(window, lambda view, rel: view.__setitem__(Ellipsis, value))
+            return
+        value = self._dtype.type(value)
+        for tr, tc, local, rel in self._iter_tiles(window):
+            key = (tr, tc)
+            tr0, tr1, tc0, tc1 = self._tile_window(tr, tc)
+            if r0 <= tr0 and r1 >= tr1 and c0 <= tc0 and c1 >= tc1:
+                self._tiles.pop(key, None)
+                self._owned.discard(key)
+                if value == self._fill:
+                    self._uniform.pop(key, None)
+                else:
+                    self._uniform[key] = value
+            elif key in self._tiles or self._uniform_value(key) != value:
+                self._writable_tile(tr, tc)[local] = value
+        if self._assembled is not None:
+            self._assembled[r0:r1, c0:c1] = value
+
+    def assign(self, window: Window, values):
+        """把窗口内的数据设为values（标量或与窗口同形状的数组）"""
+        if np.isscalar(values):
+            self.fill(window, values)
+        else:
+            values = np.asarray(values)
+            self.apply(window, lambda view, rel: view.__setitem__(Ellipsis, values[rel]))
+
+    def compact(self) -> int:
+        """
+        稀疏模式下把内容均匀的块收回为单个值，释放其数组
+
+        Returns:
+            被收回的块数
+        """
+        if self._base is not None:
+            return 0
+        collapsed = 0
+        for key, tile in list(self._tiles.items()):
+            first = tile.flat[0]
+            if (tile == first).all():
+                del self._tiles[key]
+                self._owned.discard(key)
+                if first == self._fill:
+                    self._uniform.pop(key, None)
+                else:
+                    self._uniform[key] = first
+                collapsed += 1
+        return collapsed
+
+    def read_window(self, window: Window) -> np.ndarray:
+        """
+        读取窗口内的数据
+
+        Returns:
+            只读数组（可能是共享数据的视图）
+        """
+        r0, r1, c0, c1 = window
+        if self._assembled is not None:
+            out = self._assembled[r0:r1, c0:c1]
+        elif self._base is None:
+            r0, r1, c0, c1 = self._clip(window)
+            out = np.empty((max(r1 - r0, 0), max(c1 - c0, 0)), dtype=self._dtype)
+            if out.size:
+                for tr, tc, local, rel in self._iter_tiles((r0, r1, c0, c1)):
+                    tile = self._tiles.get((tr, tc))
+                    out[rel] = tile[local] if tile is not None else self._uniform_value((tr, tc))
+        elif r0 >= r1 or c0 >= c1 or not self._tiles or not self._base_shared:
+            out = self._base[r0:r1, c0:c1]
+        else:
+            out = self._base[r0:r1, c0:c1].copy()
+            for tr, tc, local, rel in self._iter_tiles(window):
+                tile = self._tiles.get((tr, tc))
+                if tile is not None:
+                    out[rel] = tile[local]
+        out = out.view()
+        out.flags.writeable = False
+        return out
+
+    def to_array(self) -> np.ndarray:
+        """
+        获取完整数组。未fork过（或已detach）时返回底层数组本身（可写）；
+        否则没有修改时返回共享底层数组的只读视图，有修改时返回组装出的私有副本（只读）。
+        稀疏模式下组装出完整的稠密数组（会占用整张图的内存），并随后续写入同步更新。
+        """
+        if self._base is not None and not self._base_shared:
+            return self._base
+        if self._base is not None and not self._tiles:
+            view = self._base.view()
+            view.flags.writeable = False
+            return view
+        if self._assembled is None:
+            if self._base is not None:
+                assembled = self._base.copy()
+            else:
+                assembled = np.full(self._shape, self._fill, dtype=self._dtype)
+                for key, value in self._uniform.items():
+                    assembled[self._tile_slices(*key)] = value
+            for (tr, tc), tile in self._tiles.items():
+                assembled[self._tile_slices(tr, tc)] = tile
+            self._assembled = assembled
+        view = self._assembled.view()
+        view.flags.writeable = False
+        return view
+
+    def release_array(self):
+        """丢弃组装出的完整数组（稀疏模式下用于在整图读取后释放内存）"""
+        self._assembled = None
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.to_array()
+        if dtype is not None and np.dtype(dtype) != array.dtype:
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    def _take(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """按整数坐标数组逐点取值（坐标须在范围内）"""
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))
+        out = np.empty(rows.shape, dtype=self._dtype)
+        if rows.size == 0:
+            return out
+        ts = self.tile_size
+        tile_rows, tile_cols = rows // ts, cols // ts
+        tile_ids = tile_rows * self.tile_grid_shape[1] + tile_cols
+        order = np.argsort(tile_ids, kind="stable").ravel()
+        flat_ids = tile_ids.ravel()[order]
+        starts = np.flatnonzero(np.r_[True, flat_ids[1:] != flat_ids[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        flat_rows, flat_cols, flat_out = rows.ravel(), cols.ravel(), out.reshape(-1)
+        for start, end in zip(starts, ends):
+            idx = order[start:end]
+            tr, tc = int(flat_rows[idx[0]]) // ts, int(flat_cols[idx[0]]) // ts
+            tile = self._tiles.get((tr, tc))
+            if tile is not None:
+                flat_out[idx] = tile[flat_rows[idx] - tr * ts, flat_cols[idx] - tc * ts]
+            elif self._base is not None:
+                flat_out[idx] = self._base[flat_rows[idx], flat_cols[idx]]
+            else:
+                flat_out[idx] = self._uniform_value((tr, tc))
+        return out
+
+    def __getitem__(self, key):
+        if self._base is not None and not self._base_shared:
+            return self._base[key]
+        if self._assembled is not None:
+            return self._assembled[key]
+        if isinstance(key, tuple) and len(key) == 2:
+            row, col = key
+            if isinstance(row, (int, np.integer)) and isinstance(col, (int, np.integer)):
+                h, w = self._shape
+                row, col = int(row) + (h if row < 0 else 0), int(col) + (w if col < 0 else 0)
+                if not (0 <= row < h and 0 <= col < w):
+                    raise IndexError(f"索引 ({key[0]}, {key[1]}) 超出范围 {self._shape}")
+                return self._take(np.array(row), np.array(col))[()]
+            if isinstance(row, slice) and isinstance(col, slice) and row.step in (None, 1) and col.step in (None, 1):
+                r0, r1, _ = row.indices(self._shape[0])
+                c0, c1, _ = col.indices(self._shape[1])
+                return self.read_window((r0, max(r1, r0), c0, max(c1, c0)))
+            if isinstance(row, np.ndarray) and isinstance(col, np.ndarray) and row.dtype.kind in "iu" and col.dtype.kind in "iu":
+                h, w = self._shape
+                row = np.where(row < 0, row + h, row)
+                col = np.where(col < 0, col + w, col)
+                if row.size and (row.min() < 0 or row.max() >= h or col.min() < 0 or col.max() >= w):
+                    raise IndexError(f"索引超出范围 {self._shape}")
+                return self._take(row, col)
+        # 其他索引方式（布尔掩码、带步长的切片等）在完整数组上完成
+        return self.to_array()[key]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple) and len(key) == 2 and all(isinstance(k, slice) and k.step in (None, 1) for k in key):
+            r0, r1, _ = key[0].indices(self._shape[0])
+            c0, c1, _ = key[1].indices(self._shape[1])
+            window = (r0, max(r1, r0), c0, max(c1, c0))
+            if np.isscalar(value):
+                self.fill(window, value)
+            else:
+                self.assign(window, np.broadcast_to(value, (window[1] - window[0], window[3] - window[2])))
+            return
+        if isinstance(key, tuple) and len(key) == 2 and all(isinstance(k, (int, np.integer)) for k in key):
+            row, col = int(key[0]), int(key[1])
+            self.fill((row, row + 1, col, col + 1), value)
+            return
+        raise TypeError("TiledGrid只支持按单个格子或连续窗口赋值")
+
+    def __repr__(self) -> str:
+        mode = "sparse" if self._base is None else "dense"
+        return (f"TiledGrid(shape={self._shape}, dtype={self._dtype}, tile_size={self.tile_size}, {mode}, "
+                f"dense_tiles={len(self._tiles)}, uniform_tiles={len(self._uniform)})")
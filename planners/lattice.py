@@ -0,0 +1,372 @@
+import heapq
+from functools import lru_cache
+from typing import List, Tuple, Optional, Dict
+import numpy as np
+from core.data_structures import Path, AgentState
+from processors.geometry_processor import compute_swept_cells
+from utils.config import config
+
+class MotionPrimitive:
+    """
+    单个运动基元：从某个离散朝向出发，沿圆弧/直线运动或原地旋转到相邻朝向。
+    扫过的格子以相对起点格子的偏移数组缓存，碰撞检测只需一次gather。
+    """
+    def __init__(self, start_heading: int, end_heading: int, d_row: int, d_col: int, cost: float,
+                 cell_rows: np.ndarray, cell_cols: np.ndarray, waypoints: np.ndarray):
+        self.start_heading = start_heading
+        self.end_heading = end_heading
+        self.d_row = d_row
+        self.d_col = d_col
+        self.cost = cost
+        self.cell_rows = cell_rows
+        self.cell_cols = cell_cols
+        self.waypoints = waypoints  # (K, 3) 相对起点的 (dx, dy, theta)
+        self.min_row = int(cell_rows.min())
+        self.max_row = int(cell_rows.max())
+        self.min_col = int(cell_cols.min())
+        self.max_col = int(cell_cols.max())
+
+def _arc_poses(theta: float, curvature: float, length: float, num: int) -> np.ndarray:
+    """沿给定曲率的圆弧采样位姿，返回 (num, 3) 的 (dx, dy, theta)"""
+    s = np.linspace(0.0, length, num)
+    if abs(curvature) < 1e-12:
+        dx = s * np.cos(theta)
+        dy = s * np.sin(theta)
+        th = np.full_like(s, theta)
+    else:
+        th = theta + curvature * s
+        dx = (np.sin(th) - np.sin(theta)) / curvature
+        dy = (np.cos(theta) - np.cos(th)) / curvature
+    return np.stack([dx, dy, th], axis=1)
+
+class MotionPrimitiveLibrary:
+    """
+    运动基元库，对给定机器人尺寸预计算：
+    - 每个离散朝向的运动基元及其扫过格子的偏移数组
+    - 无障碍条件下的非完整约束启发式代价表
+    """
+    def __init__(self, robot_size: Tuple[float, float], resolution: float, num_headings: int = 16,
+                 step_length: float = 0.5, turning_radius: float = 1.0, collision_margin: float = 0.0,
+                 allow_turn_in_place: bool = True, heuristic_window: float = 3.0):
+        self.robot_size = robot_size
+        self.resolution = resolution
+        self.num_headings = num_headings
+        self.step_length = step_length
+        self.turning_radius = turning_radius
+        self.collision_margin = collision_margin
+        self.allow_turn_in_place = allow_turn_in_place
+        self.heading_step = 2 * np.pi / num_headings
+        # 碰撞边缘直接加到机器人轮廓上，避免对整张地图做膨胀
+        self.footprint_size = (robot_size[0] + 2 * collision_margin, robot_size[1] + 2 * collision_margin)
+        self.primitives: List[List[MotionPrimitive]] = [self._build_primitives(h) for h in range(num_headings)]
+        self._flat_offsets: Dict[int, List[np.ndarray]] = {}
+        self._build_heuristic_table(heuristic_window)
+
+    def heading_angle(self, heading: int) -> float:
+        return heading * self.heading_step
+
+    def heading_index(self, theta: float) -> int:
+        return int(np.round(theta / self.heading_step)) % self.num_headings
+
+    def _motions(self, heading: int):
+        """枚举某朝向下的运动 (转向步数, 曲率, 弧长, 代价)"""
+        delta = self.heading_step
+        radius = 0.5 * float(np.hypot(*self.robot_size))
+        yield 0, 0.0, self.step_length, self.step_length
+        for turn in (1, -1):
+            length = self.turning_radius * delta
+            yield turn, turn / self.turning_radius, length, length
+        if self.allow_turn_in_place:
+            for turn in (1, -1):
+                # 原地旋转按轮廓外缘走过的弧长计代价，并加一倍惩罚
+                yield turn, None, 0.0, 2.0 * radius * delta
+
+    def _build_primitives(self, heading: int) -> List[MotionPrimitive]:
+        res = self.resolution
+        theta = self.heading_angle(heading)
+        primitives = []
+        for turn, curvature, length, cost in self._motions(heading):
+            end_heading = (heading + turn) % self.num_headings
+            if curvature is None:
+                num = 8
+                th = np.linspace(theta, theta + turn * self.heading_step, num)
+                waypoints = np.stack([np.zeros(num), np.zeros(num), th], axis=1)
+            else:
+                num = max(2, int(np.ceil(length / res)) + 1)
+                waypoints = _arc_poses(theta, curvature, length, num)
+            d_col = int(np.round(waypoints[-1, 0] / res))
+            d_row = int(np.round(waypoints[-1, 1] / res))
+            # 终点吸附到格子中心，朝向吸附到离散朝向
+            waypoints[-1] = (d_col * res, d_row * res, theta + turn * self.heading_step)
+
+            # 以起点格子(0, 0)的中心为原点计算扫过的格子偏移
+            w, d = self.footprint_size
+            states = [
+                AgentState("primitive", self.footprint_size,
+                           (0.5 * res + px - w / 2.0, 0.5 * res + py - d / 2.0), pt)
+                for px, py, pt in waypoints
+            ]
+            rows, cols = compute_swept_cells(states, res)
+            primitives.append(MotionPrimitive(heading, end_heading, d_row, d_col, cost, rows, cols, waypoints))
+        return primitives
+
+    def flat_offsets(self, grid_w: int) -> List[List[np.ndarray]]:
+        """获取针对某个地图宽度的一维扫过格子偏移（按朝向、基元组织），结果按宽度缓存"""
+        if grid_w not in self._flat_offsets:
+            self._flat_offsets[grid_w] = [
+                [p.cell_rows * grid_w + p.cell_cols for p in prims] for prims in self.primitives
+            ]
+        return self._flat_offsets[grid_w]
+
+    def footprint_offsets(self, heading: int) -> Tuple[np.ndarray, np.ndarray]:
+        """获取某朝向静止时机器人轮廓覆盖的格子偏移"""
+        res = self.resolution
+        w, d = self.footprint_size
+        theta = self.heading_angle(heading)
+        state = AgentState("footprint", self.footprint_size, (0.5 * res - w / 2.0, 0.5 * res - d / 2.0), theta)
+        return compute_swept_cells([state], res)
+
+    def _build_heuristic_table(self, window: float):
+        """
+        在无障碍的粗粒度栅格上对各起始朝向做Dijkstra，得到到达相对位置/朝向的最小代价。
+        利用90度旋转对称性，只需计算 num_headings/4 个起始朝向。
+        """
+        n = self.num_headings
+        self.h_cell = max(self.resolution, self.step_length / 4.0)
+        self.h_radius = int(np.ceil(window / self.h_cell))
+        size = 2 * self.h_radius + 1
+        self.symmetric = n % 4 == 0
+        num_start = n // 4 if self.symmetric else n
+
+        coarse = []
+        for h in range(n):
+            moves = []
+            for p in self.primitives[h]:
+                di = int(np.round(p.d_row * self.resolution / self.h_cell))
+                dj = int(np.round(p.d_col * self.resolution / self.h_cell))
+                moves.append((di, dj, p.end_heading, p.cost))
+            coarse.append(moves)
+
+        table = np.full((num_start, size, size, n), np.inf, dtype=np.float32)
+        for h0 in range(num_start):
+            dist = table[h0]
+            c = self.h_radius
+            dist[c, c, h0] = 0.0
+            open_set = [(0.0, c, c, h0)]
+            while open_set:
+                g, i, j, h = heapq.heappop(open_set)
+                if g > dist[i, j, h]:
+                    continue
+                for di, dj, nh, cost in coarse[h]:
+                    ni, nj = i + di, j + dj
+                    if not (0 <= ni < size and 0 <= nj < size):
+                        continue
+                    ng = g + cost
+                    if ng < dist[ni, nj, nh]:
+                        dist[ni, nj, nh] = ng
+                        heapq.heappush(open_set, (ng, ni, nj, nh))
+        self.heuristic_table = table
+        self.heuristic_table_any = table.min(axis=3)
+
+    def heuristic(self, dx: float, dy: float, heading: int, goal_heading: Optional[int]) -> float:
+        """
+        启发式代价：欧氏距离与非完整约束代价表的较大者。
+        :param dx, dy: 目标相对当前位置的偏移（米）
+        :param heading: 当前离散朝向
+        :param goal_heading: 目标离散朝向，None表示不约束
+        """
+        euclid = float(np.hypot(dx, dy))
+        n = self.num_headings
+        if self.symmetric:
+            quarter, h0 = divmod(heading, n // 4)
+            for _ in range(quarter):
+                dx, dy = dy, -dx
+            if goal_heading is not None:
+                goal_heading = (goal_heading - quarter * (n // 4)) % n
+        else:
+            h0 = heading
+        i = int(np.round(dy / self.h_cell)) + self.h_radius
+        j = int(np.round(dx / self.h_cell)) + self.h_radius
+        size = 2 * self.h_radius + 1
+        if not (0 <= i < size and 0 <= j < size):
+            return euclid
+        if goal_heading is None:
+            value = self.heuristic_table_any[h0, i, j]
+        else:
+            value = self.heuristic_table[h0, i, j, goal_heading]
+        if not np.isfinite(value):
+            return euclid
+        return max(euclid, float(value))
+
+@lru_cache(maxsize=16)
+def get_motion_primitive_library(robot_size: Tuple[float, float], resolution: float, num_headings: int = 16,
+                                 step_length: float = 0.5, turning_radius: float = 1.0,
+                                 collision_margin: float = 0.0, allow_turn_in_place: bool = True) -> MotionPrimitiveLibrary:
+    """获取（并缓存）某机器人尺寸对应的运动基元库，同一尺寸只预计算一次"""
+    return MotionPrimitiveLibrary(tuple(robot_size), resolution, num_headings, step_length,
+                                  turning_radius, collision_margin, allow_turn_in_place)
+
+def lattice_search(grid_map: np.ndarray, start: Tuple[float, float, float], goal: Tuple[float, float, Optional[float]],
+                   robot_size: Tuple[float, float], resolution: float = None, collision_margin: float = None,
+                   num_headings: int = 16, step_length: float = 0.5, turning_radius: float = 1.0,
+                   allow_turn_in_place: bool = True, goal_tolerance: float = None,
+                   max_expansions: int = 200000,
+                   origin: Tuple[float, float] = (0.0, 0.0)) -> Optional[List[Tuple[float, float, float]]]:
+    """
+    状态栅格（x, y, heading）规划，返回运动学可行的位姿序列。
+    :param grid_map: numpy数组，0为障碍，1为可通行
+    :param start: (x, y, theta) 起点中心坐标（米）与朝向（弧度）
+    :param goal: (x, y, theta) 终点，theta为None表示不约束终点朝向
+    :param robot_size: 机器人长宽 (沿朝向的长度, 宽度)
+    :param resolution: 每个格子的实际长度，如果为None则使用配置值
+    :param collision_margin: 碰撞边缘距离（米），加到机器人轮廓上，如果为None则使用配置值
+    :param goal_tolerance: 终点位置容差（米），默认为半个基元步长
+    :param max_expansions: 最大扩展节点数
+    :param origin: grid第(0, 0)格左下角的世界坐标（MapRepresentation.origin），起终点和结果均为世界坐标
+    :return: [(x, y, theta), ...] 位姿序列，若无路则返回None
+    """
+    if resolution is None:
+        resolution = config.get_default_resolution()
+    if collision_margin is None:
+        collision_margin = config.get_collision_margin()
+    if goal_tolerance is None:
+        goal_tolerance = step_length / 2.0
+
+    library = get_motion_primitive_library(tuple(robot_size), resolution, num_headings, step_length,
+                                           turning_radius, collision_margin, allow_turn_in_place)
+    grid_h, grid_w = grid_map.shape
+    flat_grid = np.ascontiguousarray(grid_map).ravel()
+    flat_offsets = library.flat_offsets(grid_w)
+
+    def to_grid(x, y):
+        return int((y - origin[1]) // resolution), int((x - origin[0]) // resolution)
+
+    start_rc = to_grid(start[0], start[1])
+    goal_rc = to_grid(goal[0], goal[1])
+    start_h = library.heading_index(start[2])
+    goal_h = library.heading_index(goal[2]) if goal[2] is not None else None
+    tol_cells = goal_tolerance / resolution
+
+    rows, cols = library.footprint_offsets(start_h)
+    rows, cols = rows + start_rc[0], cols + start_rc[1]
+    if (rows.min() < 0 or cols.min() < 0 or rows.max() >= grid_h or cols.max() >= grid_w
+            or np.any(grid_map[rows, cols] == 0)):
+        print(f"警告: 起点位姿 {start} 与障碍物碰撞")
+        return None
+
+    # 粗粒度格子：用于考虑障碍的二维启发式，以及按(粗格子, 朝向)去重的closed集合
+    factor = max(1, int(round(library.h_cell / resolution)))
+    distance_field = holonomic_distance_field(grid_map, goal_rc, factor, resolution)
+
+    def h_cost(r, c, h):
+        value = library.heuristic((goal_rc[1] - c) * resolution, (goal_rc[0] - r) * resolution, h, goal_h)
+        return max(value, float(distance_field[r // factor, c // factor]))
+
+    start_state = (start_rc[0], start_rc[1], start_h)
+    open_set = [(h_cost(*start_state), 0.0, start_state)]
+    came_from = {}
+    g_score = {start_state: 0.0}
+    closed = set()
+    expansions = 0
+
+    while open_set and expansions < max_expansions:
+        _, g, current = heapq.heappop(open_set)
+        r, c, h = current
+        key = (r // factor, c // factor, h)
+        if key in closed:
+            continue
+        closed.add(key)
+        expansions += 1
+        if (abs(r - goal_rc[0]) <= tol_cells and abs(c - goal_rc[1]) <= tol_cells
+                and (goal_h is None or h == goal_h)):
+            return _reconstruct_poses(library, came_from, current, resolution, origin)
+
+        base = r * grid_w + c
+        for p, offsets in zip(library.primitives[h], flat_offsets[h]):
+            if (r + p.min_row < 0 or r + p.max_row >= grid_h or
+                    c + p.min_col < 0 or c + p.max_col >= grid_w):
+                continue
+            neighbor = (r + p.d_row, c + p.d_col, p.end_heading)
+            if (neighbor[0] // factor, neighbor[1] // factor, neighbor[2]) in closed:
+                continue
+            tentative_g = g + p.cost
+            if tentative_g >= g_score.get(neighbor, np.inf):
+                continue
+            # 整个基元扫过区域的碰撞检测：一次gather
+            if not flat_grid[base + offsets].all():
+                continue
+            h_value = h_cost(*neighbor)
+            if not np.isfinite(h_value):
+                continue
+            g_score[neighbor] = tentative_g
+            came_from[neighbor] = (current, p)
+            heapq.heappush(open_set, (tentative_g + h_value, tentative_g, neighbor))
+    return None
+
+def holonomic_distance_field(grid_map: np.ndarray, goal_rc: Tuple[int, int], factor: int, resolution: float) -> np.ndarray:
+    """
+    在粗粒度栅格上从终点做8邻域Dijkstra，得到考虑障碍的二维距离（米）。
+    粗格子内只要有一个可通行格子即视为可通行，保证距离不高估。
+    :param grid_map: 网格地图，0为障碍，1为可通行
+    :param goal_rc: 终点格子 (row, col)
+    :param factor: 每个粗格子包含的格子数（边长）
+    :param resolution: 网格分辨率（米/格子）
+    :return: 粗粒度距离场，不可达处为inf
+    """
+    grid_h, grid_w = grid_map.shape
+    coarse_h = -(-grid_h // factor)
+    coarse_w = -(-grid_w // factor)
+    padded = np.zeros((coarse_h * factor, coarse_w * factor), dtype=np.uint8)
+    padded[:grid_h, :grid_w] = grid_map
+    free = padded.reshape(coarse_h, factor, coarse_w, factor).max(axis=(1, 3)) > 0
+
+    step = factor * resolution
+    dist = np.full((coarse_h, coarse_w), np.inf)
+    goal = (min(goal_rc[0] // factor, coarse_h - 1), min(goal_rc[1] // factor, coarse_w - 1))
+    dist[goal] = 0.0
+    open_set = [(0.0, goal)]
+    dirs = [(-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+            (-1, -1, np.sqrt(2)), (-1, 1, np.sqrt(2)), (1, -1, np.sqrt(2)), (1, 1, np.sqrt(2))]
+    while open_set:
+        d, (r, c) = heapq.heappop(open_set)
+        if d > dist[r, c]:
+            continue
+        for dr, dc, w in dirs:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < coarse_h and 0 <= nc < coarse_w and free[nr, nc]:
+                nd = d + w * step
+                if nd < dist[nr, nc]:
+                    dist[nr, nc] = nd
+                    heapq.heappush(open_set, (nd, (nr, nc)))
+    # 粗格子离散误差可能略微高估，减去一个粗格子对角线长度保持乐观
+    return np.maximum(dist - np.sqrt(2) * step, 0.0)
+
+def _reconstruct_poses(library: MotionPrimitiveLibrary, came_from: dict, state: tuple, resolution: float,
+                       origin: Tuple[float, float] = (0.0, 0.0)) -> List[Tuple[float, float, float]]:
+    """沿基元链回溯，拼接每个基元的中间位姿（加上地图原点得到世界坐标）"""
+    ox, oy = origin
+    segments = []
+    while state in came_from:
+        prev, p = came_from[state]
+        segments.append((prev, p))
+        state = prev
+    segments.reverse()
+    r, c, h = state
+    poses = [(round(ox + (c + 0.5) * resolution, 3), round(oy + (r + 0.5) * resolution, 3), library.heading_angle(h))]
+    for (pr, pc, _), p in segments:
+        x0 = ox + (pc + 0.5) * resolution
+        y0 = oy + (pr + 0.5) * resolution
+        for dx, dy, th in p.waypoints[1:]:
+            poses.append((round(float(x0 + dx), 3), round(float(y0 + dy), 3), float(np.mod(th, 2 * np.pi))))
+    return poses
+
+def lattice_path(grid_map: np.ndarray, start: Tuple[float, float, float], goal: Tuple[float, float, Optional[float]],
+                 robot_size: Tuple[float, float], **kwargs) -> Optional[Path]:
+    """
+    lattice_search的便捷封装，返回只包含 (x, y) 点的Path对象，与astar_search的返回类型一致。
+    """
+    poses = lattice_search(grid_map, start, goal, robot_size, **kwargs)
+    if poses is None:
+        return None
+    points = [(x, y) for x, y, _ in poses]
+    return Path(points=[pt for i, pt in enumerate(points) if i == 0 or pt != points[i - 1]])
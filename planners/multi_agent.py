@@ -0,0 +1,325 @@
+import heapq
+from collections import deque
+from typing import List, Tuple, Optional, Dict
+import numpy as np
+from core.data_structures import Path, AgentState
+from planners.astar import expand_obstacles, find_nearest_free_position
+from utils.config import config
+
+class ReservationTable:
+    """
+    时空预约表。
+    - 每个(时间, 格子)编码为一个整数 t * num_cells + cell 存入集合，避免稠密三维数组
+    - 已到达终点的智能体从到达时刻起永久占用其终点周围格子
+    - 记录每个格子最后被预约的时刻，用于判断智能体能否在终点停留
+    """
+    def __init__(self, num_cells: int):
+        self.num_cells = num_cells
+        self.cells = set()
+        self.edges = set()
+        self.parked: Dict[int, int] = {}  # cell -> 开始永久占用的时刻
+        self.last_reserved: Dict[int, int] = {}
+        self.max_time = -1  # 最晚的预约时刻，此后预约表不再随时间变化
+
+    def reserve(self, t: int, cells: np.ndarray):
+        base = t * self.num_cells
+        self.cells.update((base + cells).tolist())
+        self.max_time = max(self.max_time, t)
+        for cell in cells.tolist():
+            if self.last_reserved.get(cell, -1) < t:
+                self.last_reserved[cell] = t
+
+    def reserve_edge(self, t: int, from_cell: int, to_cell: int):
+        """预约 t -> t+1 从from_cell到to_cell的移动，用于检测对穿冲突"""
+        self.edges.add((t, from_cell, to_cell))
+
+    def park(self, t: int, cells: np.ndarray):
+        for cell in cells.tolist():
+            if cell not in self.parked or self.parked[cell] > t:
+                self.parked[cell] = t
+        self.max_time = max(self.max_time, t)
+
+    def is_free(self, t: int, cell: int) -> bool:
+        parked_from = self.parked.get(cell)
+        if parked_from is not None and t >= parked_from:
+            return False
+        return t * self.num_cells + cell not in self.cells
+
+    def is_move_free(self, t: int, from_cell: int, to_cell: int) -> bool:
+        return (t, to_cell, from_cell) not in self.edges
+
+    def is_free_after(self, t: int, cell: int) -> bool:
+        """判断格子在t及之后是否不再被任何智能体占用"""
+        return cell not in self.parked and self.last_reserved.get(cell, -1) < t
+
+class MultiAgentPlanner:
+    """
+    基于优先级的多智能体时空A*规划器。
+    所有智能体共享同一张降采样并膨胀后的规划栅格，以及按终点缓存的启发式距离场。
+    起终点和结果路径使用世界坐标，origin为grid第(0, 0)格左下角的世界坐标。
+    """
+    def __init__(self, grid_map: np.ndarray, resolution: float = None, collision_margin: float = None,
+                 planning_resolution: float = None, origin: Tuple[float, float] = (0.0, 0.0)):
+        if resolution is None:
+            resolution = config.get_default_resolution()
+        if collision_margin is None:
+            collision_margin = config.get_collision_margin()
+        if planning_resolution is None:
+            planning_resolution = config.get_multi_agent_resolution()
+
+        self.resolution = resolution
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.collision_margin = collision_margin
+        self.factor = max(1, int(round(planning_resolution / resolution)))
+        self.planning_resolution = self.factor * resolution
+
+        # 降采样：粗格子内有任意障碍即视为障碍
+        grid_h, grid_w = grid_map.shape
+        coarse_h = -(-grid_h // self.factor)
+        coarse_w = -(-grid_w // self.factor)
+        padded = np.zeros((coarse_h * self.factor, coarse_w * self.factor), dtype=np.uint8)
+        padded[:grid_h, :grid_w] = grid_map
+        self.coarse_map = padded.reshape(coarse_h, self.factor, coarse_w, self.factor).min(axis=(1, 3))
+        self.shape = (coarse_h, coarse_w)
+        self.num_cells = coarse_h * coarse_w
+
+        self._inflated: Dict[int, np.ndarray] = {}
+        self._distance_fields: Dict[Tuple[int, int], np.ndarray] = {}
+        self._footprints: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def agent_radius_cells(self, agent: AgentState) -> int:
+        """智能体轮廓外接正方形的半边长（规划格子数）"""
+        return int(np.ceil(max(agent.size) / 2.0 / self.planning_resolution))
+
+    def inflated_map(self, radius_cells: int) -> np.ndarray:
+        """按智能体半径膨胀后的规划栅格，同一半径的智能体共享"""
+        if radius_cells not in self._inflated:
+            margin = self.collision_margin + radius_cells * self.planning_resolution
+            self._inflated[radius_cells] = expand_obstacles(self.coarse_map, self.planning_resolution, margin)
+        return self._inflated[radius_cells]
+
+    def distance_field(self, goal: int, radius_cells: int) -> np.ndarray:
+        """
+        从终点出发在膨胀栅格上做8邻域BFS，得到每个格子到终点的最少步数，
+        作为时空A*的启发式；同一终点、同一半径的智能体共享。
+        """
+        key = (goal, radius_cells)
+        if key not in self._distance_fields:
+            free = self.inflated_map(radius_cells).ravel() > 0
+            coarse_h, coarse_w = self.shape
+            dist = np.full(self.num_cells, np.iinfo(np.int32).max, dtype=np.int32)
+            dist[goal] = 0
+            queue = deque([goal])
+            while queue:
+                cell = queue.popleft()
+                r, c = divmod(cell, coarse_w)
+                nd = dist[cell] + 1
+                for nr in (r - 1, r, r + 1):
+                    if not 0 <= nr < coarse_h:
+                        continue
+                    for nc in (c - 1, c, c + 1):
+                        if not 0 <= nc < coarse_w:
+                            continue
+                        ncell = nr * coarse_w + nc
+                        if free[ncell] and dist[ncell] > nd:
+                            dist[ncell] = nd
+                            queue.append(ncell)
+            self._distance_fields[key] = dist
+        return self._distance_fields[key]
+
+    def footprint(self, radius_cells: int) -> Tuple[np.ndarray, np.ndarray]:
+        """半边长为radius_cells的正方形的行列偏移"""
+        if radius_cells not in self._footprints:
+            offsets = np.arange(-radius_cells, radius_cells + 1)
+            rr, cc = np.meshgrid(offsets, offsets, indexing="ij")
+            self._footprints[radius_cells] = (rr.ravel(), cc.ravel())
+        return self._footprints[radius_cells]
+
+    def footprint_cells(self, cell: int, radius_cells: int) -> np.ndarray:
+        coarse_h, coarse_w = self.shape
+        r, c = divmod(cell, coarse_w)
+        dr, dc = self.footprint(radius_cells)
+        rows, cols = r + dr, c + dc
+        valid = (rows >= 0) & (rows < coarse_h) & (cols >= 0) & (cols < coarse_w)
+        return rows[valid] * coarse_w + cols[valid]
+
+    def to_cell(self, pos: Tuple[float, float], free_map: np.ndarray) -> Optional[int]:
+        """世界坐标转为规划格子，位置不可行时就近调整"""
+        feasible = find_nearest_free_position(free_map, pos, self.planning_resolution, origin=self.origin)
+        if feasible is None:
+            return None
+        coarse_h, coarse_w = self.shape
+        ox, oy = self.origin
+        row = min(int((feasible[1] - oy) // self.planning_resolution), coarse_h - 1)
+        col = min(int((feasible[0] - ox) // self.planning_resolution), coarse_w - 1)
+        return row * coarse_w + col
+
+    def to_world(self, cell: int) -> Tuple[float, float]:
+        r, c = divmod(cell, self.shape[1])
+        ox, oy = self.origin
+        return (round(ox + (c + 0.5) * self.planning_resolution, 3), round(oy + (r + 0.5) * self.planning_resolution, 3))
+
+    def plan(self, agents: List[AgentState], goals: Dict[str, Tuple[float, float]],
+             max_time_steps: int = None, max_restarts: int = 2, max_expansions: int = None) -> Dict[str, Optional[Path]]:
+        """
+        按优先级依次为每个智能体做时空A*，规划结果写入预约表供后续智能体避让。
+        某个智能体失败时将其提到最高优先级重新规划，最多重试max_restarts次。
+        :param agents: 智能体起始状态列表，起点取边界框中心
+        :param goals: agent_id -> 终点 (x, y)
+        :param max_time_steps: 时间上限（步），默认为规划栅格长宽之和的两倍
+        :param max_restarts: 失败后调整优先级重试的次数
+        :param max_expansions: 单个智能体时空搜索的最大扩展节点数，默认为规划栅格格子数的4倍
+        :return: agent_id -> Path，Path第k个点为第k个时间步的位置；无解的智能体为None
+        """
+        if max_time_steps is None:
+            max_time_steps = 2 * (self.shape[0] + self.shape[1])
+        if max_expansions is None:
+            max_expansions = 4 * self.num_cells
+
+        radii = {a.agent_id: self.agent_radius_cells(a) for a in agents}
+        max_radius = max(radii.values(), default=0)
+        starts, goal_cells = {}, {}
+        for agent in agents:
+            free_map = self.inflated_map(radii[agent.agent_id])
+            x, y = agent.position
+            w, d = agent.size
+            starts[agent.agent_id] = self.to_cell((x + w / 2.0, y + d / 2.0), free_map)
+            goal = goals.get(agent.agent_id)
+            goal_cells[agent.agent_id] = self.to_cell(goal, free_map) if goal is not None else None
+
+        # 默认优先级：启发式距离远的先规划
+        def initial_distance(agent):
+            aid = agent.agent_id
+            if starts[aid] is None or goal_cells[aid] is None:
+                return -1
+            return int(self.distance_field(goal_cells[aid], radii[aid])[starts[aid]])
+        order = [a.agent_id for a in sorted(agents, key=initial_distance, reverse=True)]
+
+        # 静态地图上就不可达的智能体无论优先级如何都无解，不参与重试
+        hopeless = {a.agent_id for a in agents if initial_distance(a) in (-1, np.iinfo(np.int32).max)}
+        # 起点互相重叠的智能体同理：先规划者占据起点，后规划者在t=0即冲突
+        for i, a in enumerate(agents):
+            for b in agents[:i]:
+                sa, sb = starts[a.agent_id], starts[b.agent_id]
+                if sa is None or sb is None:
+                    continue
+                ra, ca = divmod(sa, self.shape[1])
+                rb, cb = divmod(sb, self.shape[1])
+                if max(abs(ra - rb), abs(ca - cb)) <= radii[a.agent_id] + radii[b.agent_id]:
+                    hopeless.add(a.agent_id)
+
+        results: Dict[str, Optional[Path]] = {}
+        for _ in range(max_restarts + 1):
+            table = ReservationTable(self.num_cells)
+            results = {}
+            failed = []
+            for aid in order:
+                radius = radii[aid]
+                cells = None
+                if aid not in hopeless:
+                    cells = self._space_time_astar(starts[aid], goal_cells[aid], radius, table,
+                                                   max_time_steps, max_expansions)
+                if cells is None:
+                    results[aid] = None
+                    if aid not in hopeless:
+                        failed.append(aid)
+                    continue
+                # 预约时按 自身半径 + 最大半径 膨胀，后续智能体只需检查中心格子
+                reserve_radius = radius + max_radius
+                for t, cell in enumerate(cells):
+                    table.reserve(t, self.footprint_cells(cell, reserve_radius))
+                    if t + 1 < len(cells):
+                        table.reserve_edge(t, cell, cells[t + 1])
+                table.park(len(cells) - 1, self.footprint_cells(cells[-1], reserve_radius))
+                results[aid] = Path(points=[self.to_world(cell) for cell in cells])
+            if not failed:
+                break
+            order = failed + [aid for aid in order if aid not in failed]
+        return results
+
+    def _space_time_astar(self, start: int, goal: int, radius: int, table: ReservationTable,
+                          max_time_steps: int, max_expansions: int) -> Optional[List[int]]:
+        """在(格子, 时间)空间上搜索，允许原地等待"""
+        free = (self.inflated_map(radius).ravel() > 0).tolist()
+        dist = self.distance_field(goal, radius).tolist()
+        unreachable = np.iinfo(np.int32).max
+        if dist[start] == unreachable or not table.is_free(0, start):
+            return None
+        # 终点已被其他智能体永久占用时不可能停在终点
+        if goal in table.parked:
+            return None
+
+        coarse_h, coarse_w = self.shape
+        n = self.num_cells
+        moves = [(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+        # 超过预约表最晚时刻后环境不再变化，所有时刻折叠为同一层，避免无效的时间维展开
+        horizon = table.max_time + 1
+        reserved, parked, edges = table.cells, table.parked, table.edges
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        # f相同时优先扩展时间更晚（更接近终点）的状态，减少等价节点的展开
+        open_set = [(dist[start], 0, start)]
+        came_from = {}
+        closed = set()
+
+        while open_set and len(closed) < max_expansions:
+            _, t, cell = heappop(open_set)
+            t = -t
+            key = (t if t < horizon else horizon) * n + cell
+            if key in closed:
+                continue
+            closed.add(key)
+            if cell == goal and table.is_free_after(t, goal):
+                path = [cell]
+                while (t, cell) in came_from:
+                    t, cell = came_from[(t, cell)]
+                    path.append(cell)
+                path.reverse()
+                return path
+            if t >= max_time_steps:
+                continue
+            r, c = divmod(cell, coarse_w)
+            nt = t + 1
+            layer = (nt if nt < horizon else horizon) * n
+            for dr, dc in moves:
+                nr, nc = r + dr, c + dc
+                if not (0 <= nr < coarse_h and 0 <= nc < coarse_w):
+                    continue
+                ncell = nr * coarse_w + nc
+                if not free[ncell] or layer + ncell in closed:
+                    continue
+                h = dist[ncell]
+                if h == unreachable:
+                    continue
+                # 预约表检查：永久占用、顶点冲突、对穿冲突
+                parked_from = parked.get(ncell)
+                if parked_from is not None and nt >= parked_from:
+                    continue
+                if nt * n + ncell in reserved or (t, ncell, cell) in edges:
+                    continue
+                if (nt, ncell) not in came_from:
+                    came_from[(nt, ncell)] = (t, cell)
+                heappush(open_set, (nt + h, -nt, ncell))
+        return None
+
+def plan_multi_agent_paths(grid_map: np.ndarray, agents: List[AgentState], goals: Dict[str, Tuple[float, float]],
+                           resolution: float = None, collision_margin: float = None,
+                           planning_resolution: float = None, max_time_steps: int = None,
+                           max_restarts: int = 2, max_expansions: int = None,
+                           origin: Tuple[float, float] = (0.0, 0.0)) -> Dict[str, Optional[Path]]:
+    """
+    多智能体路径规划（优先级规划 + 时空A* + 预约表）。
+    :param grid_map: numpy数组，0为障碍，1为可通行
+    :param agents: 智能体起始状态列表
+    :param goals: agent_id -> 终点 (x, y)（米）
+    :param resolution: grid_map分辨率，如果为None则使用配置值
+    :param collision_margin: 碰撞体积扩展距离（米），如果为None则使用配置值
+    :param planning_resolution: 规划栅格分辨率（米），如果为None则使用配置值
+    :param max_time_steps: 时间上限（步）
+    :param max_restarts: 失败后调整优先级重试的次数
+    :param max_expansions: 单个智能体时空搜索的最大扩展节点数
+    :param origin: grid第(0, 0)格左下角的世界坐标（MapRepresentation.origin）
+    :return: agent_id -> Path（按时间步对齐），无解的智能体为None
+    """
+    planner = MultiAgentPlanner(grid_map, resolution, collision_margin, planning_resolution, origin)
+    return planner.plan(agents, goals, max_time_steps, max_restarts, max_expansions)
@@ -1,42 +1,234 @@
 import numpy as np
-from core.data_structures import MapRepresentation
+from core.data_structures import MapRepresentation, AgentState
+from core.instance_map import build_instance_map
+from core.tiled_grid import TiledGrid
 from utils.config import config
-from typing import Tuple
+from utils.grid_cache import get_grid_cache, map_grid_cache_key
+from utils.grid_map_storage import GridMapStorage
+from utils.kernels import cell_window, rasterize_boxes, to_grid_frame
+from typing import Tuple, List, Optional, Union
 
-def generate_grid_map_from_objects(map_rep: MapRepresentation, resolution: float = None) -> np.ndarray:
+def generate_grid_map_from_objects(map_rep: MapRepresentation, resolution: float = None,
+                                   with_instances: bool = False, use_cache: bool = True) -> Union[np.ndarray, TiledGrid]:
     """
     根据地图物体自动生成可通行grid map。
     障碍物区域为0，可通行区域为1。
+    格子数不少于配置的sparse_grid_min_cells时生成稀疏分块栅格（TiledGrid）：
+    空地块和被物体完全覆盖的块只记录一个值，不分配整张稠密数组。
+    物体、画布和分辨率与之前某次生成完全相同时，直接从内容缓存（utils.grid_cache）返回结果；
+    已保存的PNG记录的内容摘要相同时也不再重复保存。
     :param map_rep: MapRepresentation对象
-    :param resolution: 每个grid的实际长度，如果为None则使用配置值
-    :return: grid map (numpy array)
+    :param resolution: 每个grid的实际长度，如果为None则使用地图的分辨率（map_rep.resolution）
+    :param with_instances: 为True时同时生成实例标签栅格（重叠处取最高物体，并记录每格高度范围），
+                           写入map_rep.instance_map并与PNG一起保存
+    :param use_cache: 是否使用grid map内容缓存（还受配置grid_map.cache_enabled控制）
+    :return: grid map（numpy数组，或大画布时的TiledGrid）
     """
     if resolution is None:
-        resolution = config.get_default_resolution()  # 现在默认是0.01
+        resolution = map_rep.resolution
     
     if map_rep.canvas_size is None:
         raise ValueError("Map canvas_size未设置，无法生成grid map")
-    width, height = map_rep.canvas_size
-    grid_w = int(round(width / resolution))
-    grid_h = int(round(height / resolution))
-    grid_map = np.ones((grid_h, grid_w), dtype=np.uint8)  # shape=(行,列)=(y,x)
-    # 用2D bbox判断障碍
-    for obj in map_rep.objects.values():
-        min_x, min_y, max_x, max_y = obj.get_bbox_2d()
-        for row in range(grid_h):  # y方向
-            for col in range(grid_w):  # x方向
-                x = col * resolution  # 左下角
-                y = row * resolution
-                if (min_x <= x < max_x) and (min_y <= y < max_y):
-                    grid_map[row, col] = 0  # row是y，col是x
+    cache = get_grid_cache() if use_cache else None
+    digest = map_grid_cache_key(map_rep, resolution)
+    grid_map = cache.get_grid(digest) if cache is not None else None
+    if grid_map is None:
+        grid_map = _rasterize_objects(map_rep, resolution)
+        if cache is not None:
+            cache.put_grid(digest, grid_map)
+    if with_instances:
+        instance_map = cache.get_instance_map(digest) if cache is not None else None
+        if instance_map is None:
+            table = map_rep.object_table
+            instance_map = build_instance_map(table.ids, to_grid_frame(table.bounds, map_rep.origin), grid_map.shape, resolution)
+            if cache is not None:
+                cache.put_instance_map(digest, instance_map)
+        map_rep.instance_map = instance_map
     
-    # 自动保存为PNG文件
+    # 自动保存为PNG文件（配置grid_map.write_behind为true时在后台线程中写入，不阻塞生成）
     if config.get_png_storage_enabled():
         try:
-            png_path = map_rep.save_grid_map_as_png()
-            if png_path:
-                print(f"Grid map已保存为PNG文件: {png_path}")
+            _save_generated_grid(map_rep, grid_map, resolution, digest)
+            if with_instances:
+                map_rep.save_instance_map()
         except Exception as e:
             print(f"保存grid_map PNG文件失败: {e}")
     
     return grid_map
+
+
+def _rasterize_objects(map_rep: MapRepresentation, resolution: float) -> Union[np.ndarray, TiledGrid]:
+    """把所有物体的2D边界框栅格化为新的grid map（格子左下角规则，坐标相对于画布原点）"""
+    grid_h, grid_w = GridMapStorage.grid_shape(map_rep.canvas_size, resolution)
+    boxes = to_grid_frame(map_rep.object_table.bboxes_2d(), map_rep.origin)
+    if grid_h * grid_w >= config.get_sparse_grid_min_cells():
+        grid_map = TiledGrid.filled((grid_h, grid_w), 1, np.uint8, config.get_sparse_grid_tile_size())
+        for bbox_2d in boxes:
+            grid_map.fill(cell_window(bbox_2d, resolution, grid_map.shape, centered=False), 0)
+    else:
+        grid_map = np.ones((grid_h, grid_w), dtype=np.uint8)  # shape=(行,列)=(y,x)
+        # 用2D bbox判断障碍：格子左下角 (col*resolution, row*resolution) 落在bbox内即为障碍
+        rasterize_boxes(grid_map, boxes, resolution)
+    return grid_map
+
+
+def _save_generated_grid(map_rep: MapRepresentation, grid_map, resolution: float, digest: str) -> str:
+    """
+    保存新生成的grid map（此时尚未赋给map_rep），已保存的文件内容摘要相同时不会重新写入
+    :return: 保存完成后的文件路径
+    """
+    # 调用方之后可能原地修改返回的数组，提交的是副本（稀疏栅格按块写时复制）
+    snapshot = grid_map.copy()
+    return GridMapStorage.persist_grid_map(snapshot, map_rep.map_id, map_rep.canvas_size, resolution, digest=digest,
+                                           origin=map_rep.origin)
+
+
+def sample_footprint_points(size: Tuple[float, float], resolution: float, boundary_only: bool = False) -> np.ndarray:
+    """
+    在机器人本体坐标系下采样矩形轮廓上的点（以矩形中心为原点）。
+    采样间距不超过半个格子，保证轮廓经过的每个格子至少有一个采样点。
+    :param size: 机器人长宽 (w, d)
+    :param resolution: 网格分辨率（米/格子）
+    :param boundary_only: True时只采样边界，False时采样整个矩形区域
+    :return: (P, 2) 的点坐标数组
+    """
+    w, d = size
+    step = resolution / 2.0
+    xs = np.linspace(-w / 2.0, w / 2.0, max(2, int(np.ceil(w / step)) + 1))
+    ys = np.linspace(-d / 2.0, d / 2.0, max(2, int(np.ceil(d / step)) + 1))
+    if not boundary_only:
+        gx, gy = np.meshgrid(xs, ys)
+        return np.stack([gx.ravel(), gy.ravel()], axis=1)
+    bottom = np.stack([xs, np.full_like(xs, ys[0])], axis=1)
+    top = np.stack([xs, np.full_like(xs, ys[-1])], axis=1)
+    left = np.stack([np.full_like(ys, xs[0]), ys], axis=1)
+    right = np.stack([np.full_like(ys, xs[-1]), ys], axis=1)
+    return np.concatenate([bottom, top, left, right], axis=0)
+
+def interpolate_agent_poses(states: List[AgentState], resolution: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    在相邻位姿之间插值，使机器人轮廓上任意一点每步移动不超过半个格子。
+    位姿中心取AgentState的2D边界框中心，朝向按最短角度插值。
+    :param states: 按时间排序的AgentState序列
+    :param resolution: 网格分辨率（米/格子）
+    :return: (poses, time_index)，poses形状为(M, 3)即(cx, cy, theta)，
+             time_index[k]为第k个插值位姿所在线段的终点下标（起始位姿为0）
+    """
+    centers = np.array([[s.position[0] + s.size[0] / 2.0, s.position[1] + s.size[1] / 2.0] for s in states], dtype=np.float64)
+    thetas = np.array([s.orientation for s in states], dtype=np.float64)
+    if len(states) < 2:
+        poses = np.concatenate([centers, thetas[:, None]], axis=1)
+        return poses, np.zeros(len(states), dtype=np.int64)
+
+    w, d = states[0].size
+    radius = 0.5 * float(np.hypot(w, d))
+    deltas = np.diff(centers, axis=0)
+    dthetas = np.diff(thetas)
+    dthetas = (dthetas + np.pi) % (2 * np.pi) - np.pi
+    travel = np.hypot(deltas[:, 0], deltas[:, 1]) + np.abs(dthetas) * radius
+    steps = np.maximum(1, np.ceil(travel / (resolution / 2.0)).astype(np.int64))
+
+    seg = np.repeat(np.arange(len(steps)), steps)
+    offsets = np.concatenate([[0], np.cumsum(steps)[:-1]])
+    t = (np.arange(len(seg)) - offsets[seg] + 1) / steps[seg]
+
+    xy = centers[seg] + t[:, None] * deltas[seg]
+    th = thetas[seg] + t * dthetas[seg]
+    poses = np.concatenate([
+        np.array([[centers[0, 0], centers[0, 1], thetas[0]]]),
+        np.concatenate([xy, th[:, None]], axis=1),
+    ], axis=0)
+    time_index = np.concatenate([[0], seg + 1])
+    return poses, time_index
+
+def transform_footprint_points(points: np.ndarray, poses: np.ndarray, resolution: float,
+                               origin: Tuple[float, float] = (0.0, 0.0)) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将本体坐标系下的采样点批量变换到各个位姿，并转换为格子下标。
+    :param points: (P, 2) 本体坐标系采样点
+    :param poses: (M, 3) 位姿数组 (cx, cy, theta)，世界坐标
+    :param resolution: 网格分辨率（米/格子）
+    :param origin: grid第(0, 0)格左下角的世界坐标
+    :return: (rows, cols)，形状均为(M, P)
+    """
+    cos_t = np.cos(poses[:, 2])[:, None]
+    sin_t = np.sin(poses[:, 2])[:, None]
+    x = poses[:, 0:1] + cos_t * points[None, :, 0] - sin_t * points[None, :, 1]
+    y = poses[:, 1:2] + sin_t * points[None, :, 0] + cos_t * points[None, :, 1]
+    if origin[0] or origin[1]:
+        x -= origin[0]
+        y -= origin[1]
+    cols = np.floor(x / resolution).astype(np.int64)
+    rows = np.floor(y / resolution).astype(np.int64)
+    return rows, cols
+
+def compute_swept_cells(states: List[AgentState], resolution: float = None,
+                        origin: Tuple[float, float] = (0.0, 0.0)) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算机器人沿位姿序列运动时轮廓扫过的所有格子（并集）。
+    刚体连续运动时新进入轮廓的点必然穿过边界，因此只需检查起始位姿的整个轮廓
+    加上每个插值位姿的边界。
+    :param states: 按时间排序的AgentState序列
+    :param resolution: 网格分辨率，如果为None则使用配置值
+    :param origin: grid第(0, 0)格左下角的世界坐标
+    :return: (rows, cols) 去重后的格子下标
+    """
+    if resolution is None:
+        resolution = config.get_default_resolution()
+    if not states:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    size = states[0].size
+    poses, _ = interpolate_agent_poses(states, resolution)
+    area_rows, area_cols = transform_footprint_points(sample_footprint_points(size, resolution), poses[:1], resolution, origin)
+    edge_rows, edge_cols = transform_footprint_points(sample_footprint_points(size, resolution, boundary_only=True), poses,
+                                                      resolution, origin)
+    rows = np.concatenate([area_rows.ravel(), edge_rows.ravel()])
+    cols = np.concatenate([area_cols.ravel(), edge_cols.ravel()])
+    # 编码为一维下标后去重，比按行去重快得多
+    row0, col0 = rows.min(), cols.min()
+    span = int(cols.max() - col0) + 1
+    keys = np.unique((rows - row0) * span + (cols - col0))
+    return keys // span + row0, keys % span + col0
+
+def find_first_swept_collision(grid_map: np.ndarray, states: List[AgentState], resolution: float = None,
+                               chunk_size: int = 4096, origin: Tuple[float, float] = (0.0, 0.0)) -> Optional[int]:
+    """
+    按时间顺序检查位姿序列扫过的区域，返回第一个发生碰撞的时间下标。
+    超出grid范围的采样点视为不碰撞（与check_path_collision_with_grid一致）。
+    :param grid_map: 网格地图，0为障碍，1为可通行
+    :param states: 按时间排序的AgentState序列
+    :param resolution: 网格分辨率，如果为None则使用配置值
+    :param chunk_size: 每批检查的插值位姿数，找到碰撞后即提前返回
+    :param origin: grid第(0, 0)格左下角的世界坐标
+    :return: 碰撞时间下标k（0表示起始位姿本身碰撞，k>0表示在states[k-1]到states[k]之间碰撞），无碰撞返回None
+    """
+    if resolution is None:
+        resolution = config.get_default_resolution()
+    if not states:
+        return None
+
+    grid_h, grid_w = grid_map.shape
+    size = states[0].size
+
+    def first_hit(rows, cols):
+        valid = (rows >= 0) & (rows < grid_h) & (cols >= 0) & (cols < grid_w)
+        hit = np.zeros(rows.shape, dtype=bool)
+        hit[valid] = grid_map[rows[valid], cols[valid]] == 0
+        hit_any = hit.reshape(rows.shape[0], -1).any(axis=1)
+        idx = np.flatnonzero(hit_any)
+        return int(idx[0]) if idx.size else None
+
+    poses, time_index = interpolate_agent_poses(states, resolution)
+    area_rows, area_cols = transform_footprint_points(sample_footprint_points(size, resolution), poses[:1], resolution, origin)
+    if first_hit(area_rows, area_cols) is not None:
+        return 0
+
+    edge_points = sample_footprint_points(size, resolution, boundary_only=True)
+    for start in range(1, len(poses), chunk_size):
+        chunk = poses[start:start + chunk_size]
+        rows, cols = transform_footprint_points(edge_points, chunk, resolution, origin)
+        hit = first_hit(rows, cols)
+        if hit is not None:
+            return int(time_index[start + hit])
+    return None
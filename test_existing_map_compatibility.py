@@ -48,7 +48,7 @@ def test_existing_map_compatibility():
     
     # 3. 保存为PNG
     print("\n3. 保存为PNG...")
-    png_path = map_rep.save_grid_map_as_png()
+    png_path = map_rep.save_grid_map_as_png(wait=True)
     if png_path:
         print(f"PNG文件已保存: {png_path}")
         print(f"文件大小: {os.path.getsize(png_path)} 字节")
@@ -0,0 +1,26 @@
+"""
+测试公共夹具：把仓库根目录加入导入路径，每个测试使用独立的配置副本和临时的grid map目录
+"""
+
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import config
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(tmp_path):
+    """测试期间的配置修改不影响其他测试，保存的文件都写到临时目录"""
+    saved = copy.deepcopy(config._config)
+    config._config["grid_map"]["png_directory"] = str(tmp_path / "grid_maps")
+    config._config["grid_map"]["cache_directory"] = str(tmp_path / "grid_cache")
+    config._config["grid_map"]["cache_enabled"] = False
+    config._config["grid_map"]["write_behind"] = False
+    config._config["performance"]["map_cache_enabled"] = False
+    yield config
+    config._config = saved
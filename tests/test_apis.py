@@ -0,0 +1,319 @@
+"""
+apis.interaction_api的行为测试
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from apis import interaction_api as api
+from core.data_structures import AgentState, MapObject
+from core.events import MapEventType
+from planners.astar import expand_obstacles
+from processors.geometry_processor import generate_grid_map_from_objects
+
+
+def box(obj_id, position, size=(0.4, 0.4, 0.5), label="box"):
+    return MapObject(label, size, position, obj_id)
+
+
+def make_map(objects=(), canvas_size=(4.0, 3.0), resolution=0.1, map_id="api_map", **kwargs):
+    """创建带grid map的测试地图"""
+    map_rep = api.create_map(map_id, canvas_size, resolution=resolution, **kwargs)
+    for obj in objects:
+        map_rep.objects[obj.id] = obj
+    api.update_grid_map_full(map_rep)
+    return map_rep
+
+
+def agent(x, y, theta=0.0, size=(0.3, 0.3)):
+    return AgentState("robot", size, (x, y), theta)
+
+
+# ---- user-026: 扫掠轨迹碰撞检测 ----
+
+def test_trajectory_collision_uses_swept_area():
+    map_rep = make_map([box("wall", (2.0, 0.0, 0.0), size=(0.2, 3.0, 2.0))])
+    assert api.check_trajectory_collision_with_grid(map_rep, [agent(0.5, 1.0), agent(3.0, 1.0)]) == 1
+    assert api.check_trajectory_collision_with_grid(map_rep, [agent(0.5, 0.5), agent(0.5, 2.0)]) is None
+    assert api.check_trajectories_collision_with_grid(
+        map_rep, [[agent(0.5, 0.5), agent(0.5, 2.0)], [agent(0.5, 1.0), agent(3.0, 1.0)]]) == [None, 1]
+
+
+# ---- user-032: 实例标签栅格 ----
+
+def make_instance_map():
+    map_rep = api.create_map("instances", (4.0, 3.0), resolution=0.1)
+    for obj in [box("table", (0.5, 0.5, 0.0), size=(1.0, 1.0, 0.7)),
+                box("vase", (1.0, 1.0, 0.7), size=(0.3, 0.3, 0.4)),
+                box("shelf", (3.0, 2.0, 0.0), size=(0.5, 0.5, 2.0))]:
+        map_rep.objects[obj.id] = obj
+    map_rep.grid_map = generate_grid_map_from_objects(map_rep, 0.1, with_instances=True)
+    map_rep.grid_resolution = 0.1
+    return map_rep
+
+
+def test_instance_map_labels_every_obstacle_cell():
+    map_rep = make_instance_map()
+    labels = map_rep.instance_map.labels
+    assert np.array_equal(labels != 0, map_rep.grid_map == 0)
+    # 重叠处取最高的物体，并记录所有覆盖物体的高度范围
+    assert api.get_object_at(map_rep, 1.15, 1.15).id == "vase"
+    assert api.get_object_at(map_rep, 0.6, 0.6).id == "table"
+    assert api.get_object_at(map_rep, 2.5, 2.5) is None
+    assert map_rep.instance_map.height_range_at(11, 11) == pytest.approx((0.0, 1.1))
+
+
+def test_instance_map_follows_moves_and_removals():
+    map_rep = make_instance_map()
+    api.move_object(map_rep, "shelf", (2.0, 0.2, 0.0), check_collision=False)
+    assert api.get_object_at(map_rep, 3.2, 2.2) is None
+    assert api.get_object_at(map_rep, 2.2, 0.4).id == "shelf"
+    api.remove_object(map_rep, "vase")
+    assert api.get_object_at(map_rep, 1.15, 1.15).id == "table"
+
+
+def test_instance_map_save_and_load_roundtrip():
+    map_rep = make_instance_map()
+    assert map_rep.save_instance_map() is not None
+    expected = map_rep.instance_map
+    map_rep.instance_map = None
+    assert map_rep.load_instance_map()
+    loaded = map_rep.instance_map
+    assert np.array_equal(loaded.labels, expected.labels) and loaded.object_ids == expected.object_ids
+    assert np.array_equal(loaded.z_min, expected.z_min) and np.array_equal(loaded.z_max, expected.z_max)
+
+
+# ---- user-033: 引用计数栅格，删除与移动物体 ----
+
+def full_grid(map_rep):
+    return np.asarray(generate_grid_map_from_objects(map_rep, map_rep.resolution, use_cache=False))
+
+
+@pytest.mark.parametrize("origin", [None, (-1.25, 0.73)])
+def test_incremental_edits_match_full_regeneration(origin):
+    rng = np.random.default_rng(0)
+    ox, oy = origin or (0.0, 0.0)
+    objects = [box(f"obj_{i}", (ox + rng.random() * 3.5, oy + rng.random() * 2.5, 0.0),
+                   size=(0.2 + rng.random() * 0.6, 0.2 + rng.random() * 0.6, 1.0)) for i in range(12)]
+    map_rep = make_map(objects[:8], origin=origin)
+    for obj in objects[8:]:
+        map_rep.objects[obj.id] = obj
+    api.remove_object(map_rep, "obj_2")
+    api.move_object(map_rep, "obj_3", (ox + 1.03, oy + 1.57, 0.0), check_collision=False)
+    api.move_object(map_rep, "obj_9", (ox + 0.11, oy + 0.29, 0.0), check_collision=False)
+    api.remove_object(map_rep, "obj_5")
+    assert np.array_equal(map_rep.grid_map, full_grid(map_rep))
+
+
+def test_remove_keeps_cells_covered_by_other_objects():
+    map_rep = make_map([box("a", (1.0, 1.0, 0.0), size=(1.0, 1.0, 1.0)),
+                        box("b", (1.5, 1.5, 0.0), size=(1.0, 1.0, 1.0))])
+    api.remove_object(map_rep, "a")
+    grid = map_rep.grid_map
+    assert grid[17, 17] == 0 and grid[12, 12] == 1
+    assert np.array_equal(grid, full_grid(map_rep))
+    with pytest.raises(KeyError):
+        api.remove_object(map_rep, "a")
+
+
+def test_move_into_collision_is_rejected_and_restores_object():
+    map_rep = make_map([box("a", (0.5, 0.5, 0.0)), box("b", (2.5, 1.5, 0.0))])
+    before = map_rep.grid_map.copy()
+    with pytest.raises(ValueError):
+        api.move_object(map_rep, "a", (2.6, 1.6, 0.0))
+    assert map_rep.objects["a"].position == (0.5, 0.5, 0.0)
+    assert np.array_equal(map_rep.grid_map, before)
+
+
+def test_remove_keeps_static_obstacles_from_loaded_grid():
+    map_rep = make_map([box("a", (1.0, 1.0, 0.0), size=(1.0, 1.0, 1.0))])
+    grid = map_rep.grid_map.copy()
+    grid[5:25, 25] = 0  # 不属于任何物体的障碍（例如从PNG加载的墙）
+    map_rep.grid_map = grid
+    api.remove_object(map_rep, "a")
+    result = map_rep.grid_map
+    assert (result[5:25, 25] == 0).all()
+    assert result[12, 12] == 1
+
+
+# ---- user-034: 批量添加物体 ----
+
+@pytest.fixture
+def object_dir(tmp_path):
+    directory = tmp_path / "objects"
+    directory.mkdir()
+    (directory / "crate.json").write_text(json.dumps({"label": "crate", "size": [0.4, 0.4, 0.6]}), encoding="utf-8")
+    return str(directory)
+
+
+def test_batch_add_matches_sequential_add(object_dir):
+    positions = [(0.2, 0.2, 0.0), (1.0, 0.3, 0.0), (2.0, 1.5, 0.0), (3.1, 2.2, 0.0)]
+    existing = [box("wall", (0.0, 2.8, 0.0), size=(4.0, 0.2, 2.0), label="wall")]
+    batch = make_map(existing)
+    added = api.add_objects_batch(batch, [("crate", p) for p in positions], object_dir=object_dir)
+    sequential = make_map(existing)
+    for p in positions:
+        api.add_object_with_collision_check(sequential, "crate", p, object_dir=object_dir)
+    assert [obj.id for obj in added] == ["crate_0", "crate_0_2", "crate_0_3", "crate_0_4"]
+    assert list(batch.objects) == list(sequential.objects)
+    assert np.array_equal(batch.grid_map, sequential.grid_map)
+    assert np.array_equal(batch.grid_map, full_grid(batch))
+
+
+def test_batch_add_reports_all_conflicts_and_adds_nothing(object_dir):
+    map_rep = make_map([box("table", (2.0, 1.0, 0.0), size=(1.0, 1.0, 0.8))])
+    before = map_rep.grid_map.copy()
+    items = [("crate", (0.2, 0.2, 0.0)), ("crate", (0.4, 0.4, 0.0)), ("crate", (2.3, 1.3, 0.0)),
+             ("crate", (3.5, 0.2, 0.0))]
+    with pytest.raises(api.BatchCollisionError) as excinfo:
+        api.add_objects_batch(map_rep, items, object_dir=object_dir)
+    assert excinfo.value.conflicts == [(1, 0), (2, "table")]
+    assert list(map_rep.objects) == ["table"]
+    assert np.array_equal(map_rep.grid_map, before)
+
+
+def test_batch_add_missing_template(object_dir):
+    with pytest.raises(FileNotFoundError):
+        api.add_objects_batch(make_map(), [("missing", (0.0, 0.0, 0.0))], object_dir=object_dir)
+
+
+# ---- user-035: 脏区域跟踪与延迟栅格化 ----
+
+def test_edits_are_deferred_until_grid_is_read():
+    map_rep = make_map([box("a", (0.5, 0.5, 0.0))])
+    version = map_rep.version
+    map_rep.objects["b"] = box("b", (2.0, 2.0, 0.0))
+    api.move_object(map_rep, "a", (1.0, 0.2, 0.0), check_collision=False)
+    assert map_rep.is_dirty and map_rep.version > version
+    expected = [(0.5, 0.5, 0.9, 0.9), (1.0, 0.2, 1.4, 0.6), (2.0, 2.0, 2.4, 2.4)]
+    assert np.allclose(sorted(map_rep.dirty_rects), expected)
+    grid = map_rep.grid_map
+    assert not map_rep.is_dirty and map_rep.dirty_rects == []
+    assert np.array_equal(grid, full_grid(map_rep))
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_update_full_picks_up_in_place_edits(incremental):
+    map_rep = make_map([box("a", (0.5, 0.5, 0.0)), box("b", (2.0, 1.0, 0.0))])
+    map_rep.objects["a"].position = (3.0, 2.0, 0.0)  # 未经objects[key] = obj的原地修改
+    api.update_grid_map_full(map_rep, incremental=incremental)
+    grid = map_rep.grid_map
+    assert grid[6, 6] == 1 and grid[21, 31] == 0
+    assert np.array_equal(grid, full_grid(map_rep))
+
+
+# ---- user-036: 地图变化事件与派生缓存失效 ----
+
+def test_object_and_grid_events():
+    map_rep = make_map([box("a", (0.5, 0.5, 0.0))])
+    events = []
+    map_rep.subscribe(events.append)
+    map_rep.objects["b"] = box("b", (2.0, 2.0, 0.0))
+    api.move_object(map_rep, "a", (1.0, 0.2, 0.0), check_collision=False)
+    api.remove_object(map_rep, "b")
+    object_events = [(e.type, e.object_id) for e in events]
+    assert object_events == [(MapEventType.OBJECT_ADDED, "b"), (MapEventType.OBJECT_MOVED, "a"),
+                             (MapEventType.OBJECT_REMOVED, "b")]
+    moved = events[1]
+    assert moved.old_object.position == (0.5, 0.5, 0.0) and moved.new_object.position == (1.0, 0.2, 0.0)
+    del events[:]
+    map_rep.flush()
+    assert events and all(e.type == MapEventType.GRID_REGION_CHANGED for e in events)
+
+
+def test_inflated_grid_cache_invalidated_by_edits():
+    map_rep = make_map([box("a", (0.5, 0.5, 0.0))])
+    cache = api.inflated_grid_cache(map_rep)
+    first = api.get_inflated_grid_map(map_rep, 0.2)
+    assert api.get_inflated_grid_map(map_rep, 0.2) is first and cache.hits == 1
+    map_rep.objects["b"] = box("b", (2.5, 1.5, 0.0))
+    second = api.get_inflated_grid_map(map_rep, 0.2)
+    assert second is not first
+    assert np.array_equal(second, expand_obstacles(full_grid(map_rep), 0.1, 0.2))
+
+
+# ---- user-039: 位压缩grid map ----
+
+def test_packed_grid_map_and_packed_inflation():
+    map_rep = make_map([box("a", (0.5, 0.5, 0.0)), box("b", (2.5, 1.5, 0.0))])
+    assert np.array_equal(api.get_packed_grid_map(map_rep).to_array(), map_rep.grid_map)
+    packed = api.get_inflated_grid_map(map_rep, 0.2, packed=True)
+    assert np.array_equal(packed.to_array(), api.get_inflated_grid_map(map_rep, 0.2))
+    map_rep.objects["c"] = box("c", (1.5, 2.2, 0.0))
+    assert np.array_equal(api.get_packed_grid_map(map_rep).to_array(), full_grid(map_rep))
+
+
+# ---- user-040: 2.5D高度占据 ----
+
+def band_reference(map_rep, z_low, z_high):
+    """只用高度与 [z_low, z_high) 重叠的物体全量生成的grid map"""
+    subset = api.create_map("band_ref", map_rep.canvas_size, resolution=map_rep.resolution, origin=map_rep.origin)
+    for key, obj in map_rep.objects.items():
+        bbox = obj.get_bbox_3d()
+        if bbox[5] > z_low and bbox[2] < z_high:
+            subset.objects[key] = obj
+    return full_grid(subset)
+
+
+def test_height_band_grid_matches_filtered_rasterization():
+    map_rep = make_map([box("table", (0.5, 0.5, 0.0), size=(1.0, 0.8, 0.75)),
+                        box("cabinet", (2.0, 1.0, 1.5), size=(1.2, 0.5, 0.6)),
+                        box("rug", (2.5, 2.0, 0.0), size=(1.0, 0.8, 0.02))])
+    for z_low, z_high in [(0.0, 1.0), (0.05, 1.0), (0.0, 2.5), (1.0, 1.8)]:
+        assert np.array_equal(api.get_height_band_grid_map(map_rep, z_high, z_low),
+                              band_reference(map_rep, z_low, z_high))
+    assert np.array_equal(api.get_height_band_grid_map(map_rep, 10.0), map_rep.grid_map)
+    api.move_object(map_rep, "cabinet", (0.2, 2.0, 0.3), check_collision=False)
+    assert np.array_equal(api.get_height_band_grid_map(map_rep, 1.0), band_reference(map_rep, 0.0, 1.0))
+
+
+# ---- user-047: 每个地图自己的分辨率和原点 ----
+
+def test_offset_origin_rasterizes_like_shifted_map():
+    # 坐标取二进制可精确表示的值，平移前后格子边界上的比较结果相同
+    objects = [box("a", (0.375, 0.5, 0.0), size=(0.625, 0.5, 0.8)), box("b", (2.125, 1.75, 0.0), size=(1.0, 0.375, 0.8))]
+    shifted = [box(o.id, (o.position[0] + 8.0, o.position[1] - 4.0, 0.0), o.size) for o in objects]
+    at_zero = make_map(objects, map_id="origin_zero", resolution=0.125)
+    offset = make_map(shifted, map_id="origin_offset", resolution=0.125, origin=(8.0, -4.0))
+    assert not at_zero.grid_map.all()
+    assert np.array_equal(offset.grid_map, at_zero.grid_map)
+    assert api.get_object_at(offset, 8.5, -3.4).id == "a"
+    assert api.get_object_at(offset, 0.5, 0.6) is None
+
+
+def test_resolution_and_origin_persist_per_map(tmp_path):
+    from core.data_structures import MapRepresentation
+    from utils.grid_map_storage import GridMapStorage
+    objects = [box("a", (0.5, 0.5, 0.0), size=(0.6, 0.5, 0.8))]
+    coarse = make_map(objects, map_id="coarse", resolution=0.25, origin=(-1.0, 2.0))
+    fine = make_map([box("a", (-0.5, 2.5, 0.0), size=(0.6, 0.5, 0.8))], map_id="fine", resolution=0.05)
+    assert coarse.grid_shape == (12, 16) and fine.grid_shape == (60, 80)
+    meta = GridMapStorage.read_png_metadata("coarse")
+    assert meta["resolution"] == 0.25 and meta["origin"] == (-1.0, 2.0)
+
+    path = coarse.save_to_json(str(tmp_path / "coarse.json"))
+    coarse.save_grid_map_as_png()
+    loaded = MapRepresentation.load_from_json(path)
+    assert loaded.resolution == 0.25 and loaded.origin == (-1.0, 2.0)
+    assert np.array_equal(loaded.grid_map, coarse.grid_map)
+
+    # 同一map_id下按其他分辨率保存的PNG不会被加载到粗地图上
+    GridMapStorage.save_grid_map_as_png(np.ones((60, 80), dtype=np.uint8), "coarse", (4.0, 3.0), 0.05)
+    reloaded = MapRepresentation.load_from_json(path)
+    assert reloaded.grid_shape is None
+
+
+def test_auto_crop_canvas_keeps_grid_window():
+    objects = [box("a", (1.05, 0.85, 0.0), size=(0.6, 0.5, 0.8)), box("b", (2.3, 1.6, 0.0), size=(0.4, 0.4, 0.8))]
+    map_rep = make_map(objects)
+    map_rep.write_grid_window((5, 6, 30, 31), 0)  # 物体范围之外的静态障碍会被裁掉
+    before = np.array(map_rep.grid_map)
+    origin, canvas_size = api.auto_crop_canvas(map_rep, margin=0.1)
+    assert origin == pytest.approx((0.9, 0.7))
+    assert canvas_size == pytest.approx((1.9, 1.4))
+    r0, c0 = 7, 9
+    h, w = map_rep.grid_shape
+    assert np.array_equal(map_rep.grid_map, before[r0:r0 + h, c0:c0 + w])
+    assert np.array_equal(map_rep.grid_map, full_grid(map_rep))
@@ -0,0 +1,350 @@
+"""
+core模块的行为测试
+"""
+
+import copy
+
+import numpy as np
+import pytest
+
+from core.bitgrid import PackedGrid
+from core.data_structures import MapObject, MapRepresentation, SourceType
+from core.object_table import LazyObjectDict, ObjectDict
+from core.spatial_index import SpatialIndex
+from core.tiled_grid import TiledGrid
+from processors.geometry_processor import generate_grid_map_from_objects
+from utils.kernels import inflate_obstacles
+
+
+def make_map(objects=None, canvas_size=(4.0, 3.0), resolution=0.1, map_id="test_map", **kwargs):
+    """创建测试用的小地图"""
+    return MapRepresentation(map_id=map_id, source_type=SourceType.OTHER, objects=objects or {},
+                             canvas_size=canvas_size, resolution=resolution, **kwargs)
+
+
+def make_objects(n=6):
+    return {f"box_{i}": MapObject("box", (0.4, 0.3, 0.5), (0.5 * i, 0.2 * i, 0.0), f"box_{i}") for i in range(n)}
+
+
+@pytest.fixture
+def lazy_map(tmp_path):
+    path = str(tmp_path / "lazy.json")
+    make_map(make_objects()).save_to_json(path)
+    map_rep = MapRepresentation.load_from_json(path, lazy=True)
+    assert isinstance(map_rep.objects, LazyObjectDict)
+    return map_rep
+
+
+# ---- user-050: 流式加载与按需创建物体 ----
+
+def test_dict_of_lazy_objects_has_no_placeholders(lazy_map):
+    plain = dict(lazy_map.objects)
+    assert list(plain) == [f"box_{i}" for i in range(6)]
+    assert all(isinstance(obj, MapObject) for obj in plain.values())
+
+
+def test_lazy_objects_spread_and_copy_have_no_placeholders(lazy_map):
+    assert all(isinstance(obj, MapObject) for obj in {**lazy_map.objects}.values())
+    assert all(isinstance(obj, MapObject) for obj in copy.copy(lazy_map.objects).values())
+
+
+def test_lazy_objects_keep_order_and_create_on_access(lazy_map):
+    objects = lazy_map.objects
+    keys = [f"box_{i}" for i in range(6)]
+    assert objects["box_3"].position == pytest.approx((1.5, 0.6, 0.0))
+    assert objects.pending_count == 5
+    assert list(objects) == keys and len(objects) == 6 and "box_3" in objects
+    obj = objects.pop("box_1")
+    objects["box_1"] = obj
+    assert list(objects) == keys[:1] + keys[2:] + ["box_1"]
+    objects.materialize()
+    assert type(objects) is ObjectDict
+    assert list(objects) == keys[:1] + keys[2:] + ["box_1"]
+
+
+def test_lazy_roundtrip_matches_eager_load(tmp_path):
+    path = str(tmp_path / "map.json")
+    make_map(make_objects()).save_to_json(path)
+    eager = MapRepresentation.load_from_json(path, lazy=False)
+    lazy = MapRepresentation.load_from_json(path, lazy=True)
+    assert lazy.to_dict() == eager.to_dict()
+    assert np.array_equal(lazy.object_table.bounds, eager.object_table.bounds)
+
+
+def test_sync_objects_does_not_create_pending_objects(lazy_map):
+    assert lazy_map.sync_objects() == []
+    assert lazy_map.objects.pending_count == 6
+
+
+# ---- user-030: 列式物体表 ----
+
+def assert_table_matches(objects):
+    table = objects.table
+    assert sorted(table.ids) == sorted(objects)
+    for key in objects:
+        assert tuple(table.bounds[table.index[key]]) == pytest.approx(objects[key].get_bbox_3d())
+        assert table.labels[table.label_codes[table.index[key]]] == objects[key].label
+
+
+def test_object_dict_keeps_table_in_sync():
+    objects = ObjectDict(make_objects())
+    objects["chair"] = MapObject("chair", (0.5, 0.5, 1.0), (3.0, 2.0, 0.0), "chair")
+    del objects["box_0"]
+    objects.pop("box_2")
+    objects["box_3"] = MapObject("box", (1.0, 1.0, 1.0), (0.0, 0.0, 0.0), "box_3")
+    assert_table_matches(objects)
+    objects["box_4"].position = (2.5, 2.5, 0.0)
+    objects.refresh("box_4")
+    assert_table_matches(objects)
+    objects.clear()
+    assert len(objects.table) == 0
+
+
+def test_object_table_queries_match_brute_force():
+    objects = ObjectDict(make_objects(10))
+    objects["tall"] = MapObject("shelf", (0.3, 0.3, 2.0), (1.0, 1.0, 0.5), "tall")
+    table = objects.table
+    bbox = (0.6, 0.3, 2.1, 1.2)
+    brute = {key for key, obj in objects.items()
+             if obj.get_bbox_2d()[0] <= bbox[2] and obj.get_bbox_2d()[2] >= bbox[0]
+             and obj.get_bbox_2d()[1] <= bbox[3] and obj.get_bbox_2d()[3] >= bbox[1]}
+    assert set(table.ids_of(table.overlapping_bbox(bbox))) == brute
+    assert table.ids_of(table.with_label("shelf")) == ["tall"]
+    assert set(table.ids_of(table.in_height_band(0.6, 3.0))) == {"tall"}
+
+
+def test_object_dict_fork_and_freeze():
+    objects = ObjectDict(make_objects())
+    child = objects.fork()
+    del child["box_1"]
+    child["new"] = MapObject("box", (0.1, 0.1, 0.1), (0.0, 0.0, 0.0), "new")
+    assert "box_1" in objects.table.index and "new" not in objects.table.index
+    assert_table_matches(objects)
+    assert_table_matches(child)
+    objects.frozen = True
+    with pytest.raises(TypeError):
+        objects["x"] = MapObject("box", (0.1, 0.1, 0.1))
+
+
+# ---- user-031: 物体空间索引 ----
+
+def random_boxes(seed, n=60, extent=20.0):
+    rng = np.random.default_rng(seed)
+    lo = rng.random((n, 2)) * extent - extent / 4
+    return np.hstack([lo, lo + rng.random((n, 2)) * 2.0])
+
+
+def box_distance(box, x, y):
+    dx = max(box[0] - x, 0.0, x - box[2])
+    dy = max(box[1] - y, 0.0, y - box[3])
+    return float(np.hypot(dx, dy))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_spatial_index_nearest_matches_brute_force(seed):
+    boxes = random_boxes(seed)
+    ids = [f"obj_{i}" for i in range(len(boxes))]
+    index = SpatialIndex(1.5)
+    index.insert_many(ids, boxes)
+    rng = np.random.default_rng(100 + seed)
+    # 包括远在已占用范围之外的查询点
+    for x, y in np.vstack([rng.random((15, 2)) * 30 - 8, [(-50.0, 3.0), (80.0, 90.0)]]):
+        for k in (1, 4, len(ids) + 3):
+            result = index.nearest(x, y, k)
+            expected = sorted(box_distance(box, x, y) for box in boxes)[:k]
+            assert [d for d, _ in result] == pytest.approx(expected)
+            assert all(d == pytest.approx(box_distance(boxes[ids.index(key)], x, y)) for d, key in result)
+
+
+def test_spatial_index_queries_match_brute_force():
+    boxes = random_boxes(4)
+    ids = [f"obj_{i}" for i in range(len(boxes))]
+    bulk = SpatialIndex(1.0)
+    bulk.insert_many(ids, boxes)
+    single = SpatialIndex(1.0)
+    for key, box in zip(ids, boxes):
+        single.insert(key, tuple(box))
+    for key in ids[::3]:
+        assert bulk.remove(key) and single.remove(key)
+    assert not bulk.remove("missing")
+    alive = {key: box for key, box in zip(ids, boxes) if key not in ids[::3]}
+    query = (2.0, 3.0, 7.5, 9.0)
+    expected = sorted(key for key, b in alive.items()
+                      if b[0] <= query[2] and b[2] >= query[0] and b[1] <= query[3] and b[3] >= query[1])
+    assert bulk.query_bbox(query) == single.query_bbox(query) == expected
+    x, y = alive[ids[1]][:2]
+    assert ids[1] in bulk.query_point(x, y)
+    assert len(bulk) == len(alive)
+
+
+# ---- user-037: 写时复制的快照与副本 ----
+
+def make_grid_map(objects=None):
+    map_rep = make_map(objects if objects is not None else make_objects())
+    map_rep.grid_map = generate_grid_map_from_objects(map_rep, 0.1, use_cache=False)
+    map_rep.grid_resolution = 0.1
+    return map_rep
+
+
+def regenerate(map_rep):
+    return np.asarray(generate_grid_map_from_objects(map_rep, 0.1, use_cache=False))
+
+
+def test_fork_edits_do_not_leak_between_copies():
+    parent = make_grid_map()
+    base_grid = parent.grid_map.copy()
+    child = parent.fork()
+    child.objects["new"] = MapObject("box", (0.5, 0.5, 0.5), (3.0, 2.0, 0.0), "new")
+    del child.objects["box_1"]
+    parent.objects["box_2"] = MapObject("box", (0.4, 0.3, 0.5), (0.2, 2.4, 0.0), "box_2")
+    assert "new" not in parent.objects and "box_1" in parent.objects
+    assert child.objects["box_2"].position == pytest.approx((1.0, 0.4, 0.0))
+    assert np.array_equal(child.grid_map, regenerate(child))
+    assert np.array_equal(parent.grid_map, regenerate(parent))
+    assert not np.array_equal(parent.grid_map, base_grid)
+
+
+def test_snapshot_is_read_only():
+    snapshot = make_grid_map().snapshot()
+    assert snapshot.frozen
+    with pytest.raises(TypeError):
+        snapshot.objects["x"] = MapObject("box", (0.1, 0.1, 0.1))
+    with pytest.raises(TypeError):
+        snapshot.grid_map = np.ones((30, 40), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        snapshot.grid_map[0, 0] = 0
+    child = snapshot.fork()
+    child.objects["x"] = MapObject("box", (0.3, 0.3, 0.3), (3.5, 2.5, 0.0), "x")
+    assert "x" not in snapshot.objects
+    assert np.array_equal(child.grid_map, regenerate(child))
+
+
+def test_fork_grid_map_is_writable_and_isolated_on_both_sides():
+    parent = make_grid_map()
+    stale = parent.grid_map  # fork之前取得的数组引用
+    base_grid = stale.copy()
+    child = parent.fork()
+    snapshot = parent.snapshot()
+    with pytest.raises(ValueError):
+        stale[0, 0] = 0
+
+    parent.grid_map[0, 0:3] = 0
+    parent.notify_grid_changed((0, 1, 0, 3))
+    child.grid_map[29, 37:40] = 0
+    child.notify_grid_changed((29, 30, 37, 40))
+    assert parent.grid_map[0, 0:3].tolist() == [0, 0, 0] and parent.grid_map[29, 39] == base_grid[29, 39]
+    assert child.grid_map[29, 37:40].tolist() == [0, 0, 0] and child.grid_map[0, 0] == base_grid[0, 0]
+    assert np.array_equal(snapshot.grid_map, base_grid)
+    assert not snapshot.grid_map.flags.writeable
+
+
+def test_in_place_object_edit_in_fork_does_not_leak():
+    parent = make_grid_map()
+    snapshot = parent.snapshot()
+    first, second = parent.fork(), parent.fork()
+    obj = first.objects["box_1"]
+    obj.position = (3.0, 2.0, 0.0)
+    first.mark_dirty("box_1")
+    assert np.array_equal(first.grid_map, regenerate(first))
+    for other in (parent, snapshot, second):
+        assert other.objects["box_1"].position == pytest.approx((0.5, 0.2, 0.0))
+    assert parent.sync_objects() == [] and second.sync_objects() == []
+    assert np.array_equal(second.grid_map, regenerate(second))
+    # 经由items()取得的物体同样是本副本独占的
+    for _, item in second.objects.items():
+        item.position = (item.position[0], item.position[1], 0.25)
+    assert second.sync_objects() == list(second.objects)
+    assert parent.objects["box_0"].position[2] == 0.0
+    assert parent.sync_objects() == []
+
+
+def test_in_place_edit_in_fork_of_lazy_map_does_not_leak(lazy_map):
+    lazy_map.objects["box_2"]  # 已创建的物体与副本共享
+    child = lazy_map.fork()
+    for key in ("box_2", "box_4"):
+        child.objects[key].position = (2.5, 2.5, 0.0)
+        child.mark_dirty(key)
+    assert lazy_map.objects["box_2"].position == pytest.approx((1.0, 0.4, 0.0))
+    assert lazy_map.objects["box_4"].position == pytest.approx((2.0, 0.8, 0.0))
+    assert lazy_map.sync_objects() == []
+
+
+# ---- user-038: 稀疏分块栅格 ----
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_tiled_grid_matches_numpy_reference(sparse):
+    rng = np.random.default_rng(1)
+    reference = np.ones((50, 70), dtype=np.uint8)
+    grid = TiledGrid.filled(reference.shape, 1, tile_size=16) if sparse else TiledGrid(reference.copy(), tile_size=16)
+    for _ in range(30):
+        r0, c0 = rng.integers(0, 50), rng.integers(0, 70)
+        window = (r0, min(r0 + rng.integers(1, 30), 50), c0, min(c0 + rng.integers(1, 40), 70))
+        if rng.random() < 0.5:
+            grid.fill(window, 0)
+            reference[window[0]:window[1], window[2]:window[3]] = 0
+        else:
+            values = rng.integers(0, 2, (window[1] - window[0], window[3] - window[2])).astype(np.uint8)
+            grid.assign(window, values)
+            reference[window[0]:window[1], window[2]:window[3]] = values
+    assert np.array_equal(grid.to_array(), reference)
+    assert np.array_equal(grid.read_window((5, 40, 10, 66)), reference[5:40, 10:66])
+    rows, cols = rng.integers(0, 50, 20), rng.integers(0, 70, 20)
+    assert np.array_equal(grid[rows, cols], reference[rows, cols])
+
+
+def test_tiled_grid_fork_is_copy_on_write():
+    grid = TiledGrid.filled((40, 40), 1, tile_size=16)
+    grid.fill((0, 5, 0, 5), 0)
+    child = grid.fork()
+    child.fill((20, 25, 20, 25), 0)
+    grid[1, 30] = 0
+    assert grid[22, 22] == 1 and child[22, 22] == 0
+    assert child[1, 30] == 1 and grid[1, 30] == 0
+    assert grid[2, 2] == 0 and child[2, 2] == 0
+
+
+def test_sparse_generation_matches_dense_and_roundtrips(isolated_config):
+    objects = make_objects()
+    dense = make_grid_map(dict(objects))
+    isolated_config._config["performance"]["sparse_grid_min_cells"] = 1
+    isolated_config._config["performance"]["sparse_grid_tile_size"] = 16
+    sparse = make_grid_map(dict(objects))
+    assert isinstance(sparse.grid_map, TiledGrid) and sparse.grid_map.is_sparse
+    assert np.array_equal(sparse.grid_map.to_array(), dense.grid_map)
+    sparse.objects["new"] = MapObject("box", (0.5, 0.5, 0.5), (3.0, 2.0, 0.0), "new")
+    del sparse.objects["box_1"]
+    assert np.array_equal(sparse.grid_map.to_array(), regenerate(sparse))
+    path = sparse.save_grid_map_as_png()
+    assert path.endswith(".npz")
+    loaded = make_map(map_id=sparse.map_id)
+    assert loaded.load_grid_map_from_png()
+    assert np.array_equal(np.asarray(loaded.grid_map), sparse.grid_map.to_array())
+
+
+# ---- user-039: 位压缩栅格 ----
+
+@pytest.mark.parametrize("shape", [(13, 29), (8, 64), (1, 3)])
+def test_packed_grid_roundtrip_and_ops(shape):
+    rng = np.random.default_rng(shape[1])
+    a = (rng.random(shape) > 0.3).astype(np.uint8)
+    b = (rng.random(shape) > 0.3).astype(np.uint8)
+    pa, pb = PackedGrid.from_array(a), PackedGrid.from_array(b)
+    assert pa.nbytes <= (shape[1] + 7) // 8 * shape[0]
+    assert np.array_equal(pa.to_array(), a)
+    assert np.array_equal((pa & pb).to_array(), a & b)
+    assert np.array_equal((pa | pb).to_array(), a | b)
+    assert np.array_equal((~pa).to_array(), 1 - a)
+    assert pa.free_count() == int(a.sum()) and pa.obstacle_count() == a.size - int(a.sum())
+    assert pa == PackedGrid.from_array(a)
+    window = (0, shape[0], shape[1] // 3, shape[1])
+    assert np.array_equal(pa.read_window(window), a[:, shape[1] // 3:])
+    values = 1 - a[:, shape[1] // 3:]
+    pa.write_window(window, values)
+    a[:, shape[1] // 3:] = values
+    assert np.array_equal(pa.to_array(), a)
+
+
+@pytest.mark.parametrize("cells", [0, 1, 3, 9])
+def test_packed_inflate_matches_uint8_inflate(cells):
+    grid = (np.random.default_rng(cells).random((37, 71)) > 0.05).astype(np.uint8)
+    assert np.array_equal(PackedGrid.from_array(grid).inflate(cells).to_array(), inflate_obstacles(grid, cells))
@@ -0,0 +1,119 @@
+"""
+planners模块的行为测试
+"""
+
+import numpy as np
+
+from core.data_structures import AgentState
+from planners.lattice import lattice_path, lattice_search
+from planners.multi_agent import ReservationTable, plan_multi_agent_paths
+from processors.geometry_processor import find_first_swept_collision
+
+RESOLUTION = 0.1
+
+
+def gap_wall_grid(gap=True):
+    """6m x 4m的地图，x=3m处有一道墙，gap为True时在y=1.5~2.5m留出通道"""
+    grid = np.ones((40, 60), dtype=np.uint8)
+    grid[:, 29:31] = 0
+    if gap:
+        grid[15:25, 29:31] = 1
+    return grid
+
+
+# ---- user-027: 状态栅格规划 ----
+
+def test_lattice_search_finds_collision_free_poses():
+    size = (0.4, 0.3)
+    poses = lattice_search(gap_wall_grid(), (1.0, 2.0, 0.0), (5.0, 2.0, None), size,
+                           resolution=RESOLUTION, collision_margin=0.0)
+    assert poses is not None
+    # 起终点按格子离散，终点在每个方向上的容差为半个基元步长
+    assert max(abs(poses[0][0] - 1.0), abs(poses[0][1] - 2.0)) <= RESOLUTION
+    assert max(abs(poses[-1][0] - 5.0), abs(poses[-1][1] - 2.0)) <= 0.25 + RESOLUTION
+    # 位姿为机器人中心，AgentState.position为边界框左下角
+    states = [AgentState("robot", size, (x - size[0] / 2, y - size[1] / 2), theta) for x, y, theta in poses]
+    assert find_first_swept_collision(gap_wall_grid(), states, RESOLUTION) is None
+
+
+def test_lattice_search_returns_none_when_blocked():
+    assert lattice_search(gap_wall_grid(gap=False), (1.0, 2.0, 0.0), (5.0, 2.0, None), (0.4, 0.3),
+                          resolution=RESOLUTION, collision_margin=0.0, max_expansions=20000) is None
+
+
+def test_lattice_path_respects_origin():
+    origin = (-3.0, 10.0)
+    path = lattice_path(gap_wall_grid(), (-2.0, 12.0, 0.0), (2.0, 12.0, None), (0.4, 0.3),
+                        resolution=RESOLUTION, collision_margin=0.0, origin=origin)
+    assert path is not None
+    assert max(abs(path.points[0][0] + 2.0), abs(path.points[0][1] - 12.0)) <= RESOLUTION
+    assert max(abs(path.points[-1][0] - 2.0), abs(path.points[-1][1] - 12.0)) <= 0.25 + RESOLUTION
+
+
+# ---- user-028: 时空预约表与多智能体规划 ----
+
+def test_reservation_table_cells_edges_and_parking():
+    table = ReservationTable(100)
+    table.reserve(3, np.array([5, 6]))
+    table.reserve_edge(3, 5, 6)
+    table.park(7, np.array([9]))
+    assert not table.is_free(3, 5) and table.is_free(2, 5) and table.is_free(4, 6)
+    assert not table.is_move_free(3, 6, 5) and table.is_move_free(3, 5, 6)
+    assert table.is_free(6, 9) and not table.is_free(50, 9)
+    assert table.is_free_after(4, 5) and not table.is_free_after(3, 5) and not table.is_free_after(100, 9)
+
+
+def test_multi_agent_paths_swap_without_conflicts():
+    grid = np.ones((30, 30), dtype=np.uint8)
+    grid[:12, 14:16] = 0
+    grid[18:, 14:16] = 0
+    size = (0.2, 0.2)
+    agents = [AgentState("a", size, (0.4, 1.4), 0.0), AgentState("b", size, (2.4, 1.4), 0.0)]
+    goals = {"a": (2.5, 1.5), "b": (0.5, 1.5)}
+    paths = plan_multi_agent_paths(grid, agents, goals, resolution=RESOLUTION, collision_margin=0.0,
+                                   planning_resolution=RESOLUTION)
+    assert paths["a"] is not None and paths["b"] is not None
+    for aid, path in paths.items():
+        points = np.array(path.points)
+        assert np.abs(points[-1] - goals[aid]).max() <= RESOLUTION
+        # 每个时间步最多移动一格
+        assert np.abs(np.diff(points, axis=0)).max() <= RESOLUTION + 1e-9
+    # 按时间步对齐比较，先到达的智能体停在终点
+    horizon = max(len(path.points) for path in paths.values())
+    a = np.array([paths["a"].points[min(t, len(paths["a"].points) - 1)] for t in range(horizon)])
+    b = np.array([paths["b"].points[min(t, len(paths["b"].points) - 1)] for t in range(horizon)])
+    assert (np.abs(a - b).max(axis=1) >= size[0] - 1e-9).all()
+
+
+def test_multi_agent_unreachable_goal_is_none():
+    grid = np.ones((30, 30), dtype=np.uint8)
+    grid[:, 14:16] = 0
+    agents = [AgentState("a", (0.2, 0.2), (0.4, 1.4), 0.0)]
+    paths = plan_multi_agent_paths(grid, agents, {"a": (2.5, 1.5)}, resolution=RESOLUTION, collision_margin=0.0,
+                                   planning_resolution=RESOLUTION)
+    assert paths == {"a": None}
+
+
+# ---- user-039: 位压缩grid上的规划 ----
+
+def test_astar_on_packed_grid_matches_uint8_grid():
+    from apis import interaction_api as api
+    from core.bitgrid import PackedGrid
+    from core.data_structures import MapObject
+    from planners.astar import astar_search
+    grid = gap_wall_grid()
+    expected = astar_search(grid, (1.0, 2.0), (5.0, 2.0), resolution=RESOLUTION, collision_margin=0.2)
+    assert expected is not None
+    packed = astar_search(PackedGrid.from_array(grid), (1.0, 2.0), (5.0, 2.0), resolution=RESOLUTION,
+                          collision_margin=0.2)
+    assert packed.points == expected.points
+
+    map_rep = api.create_map("packed_plan", (6.0, 4.0), resolution=RESOLUTION)
+    map_rep.objects["wall_low"] = MapObject("wall", (0.2, 1.5, 1.0), (2.9, 0.0, 0.0), "wall_low")
+    map_rep.objects["wall_high"] = MapObject("wall", (0.2, 1.5, 1.0), (2.9, 2.5, 0.0), "wall_high")
+    api.update_grid_map_full(map_rep)
+    inflated = api.get_inflated_grid_map(map_rep, 0.2, packed=True)
+    assert isinstance(inflated, PackedGrid)
+    on_packed = astar_search(inflated, (1.0, 2.0), (5.0, 2.0), resolution=RESOLUTION, collision_margin=0.0)
+    on_dense = astar_search(np.asarray(inflated), (1.0, 2.0), (5.0, 2.0), resolution=RESOLUTION, collision_margin=0.0)
+    assert on_packed is not None and on_packed.points == on_dense.points
@@ -0,0 +1,46 @@
+"""
+processors模块的行为测试
+"""
+
+import numpy as np
+
+from core.data_structures import AgentState
+from processors.geometry_processor import find_first_swept_collision
+
+
+def wall_grid(shape=(30, 40), wall_cols=slice(20, 22)):
+    """中间有一道竖墙的grid（0为障碍）"""
+    grid = np.ones(shape, dtype=np.uint8)
+    grid[:, wall_cols] = 0
+    return grid
+
+
+def agent(x, y, theta=0.0, size=(0.3, 0.3)):
+    return AgentState("robot", size, (x, y), theta)
+
+
+# ---- user-026: 扫掠轨迹碰撞检测 ----
+
+def test_swept_collision_detects_jump_over_wall():
+    # 两个采样位姿都在墙外，只有两者之间扫过的区域穿过墙
+    states = [agent(0.5, 1.0), agent(3.0, 1.0)]
+    assert find_first_swept_collision(wall_grid(), states, 0.1) == 1
+
+
+def test_swept_collision_free_and_start_in_collision():
+    grid = wall_grid()
+    assert find_first_swept_collision(grid, [agent(0.5, 0.5), agent(0.5, 2.0), agent(1.2, 2.0)], 0.1) is None
+    assert find_first_swept_collision(grid, [agent(1.95, 1.0), agent(0.5, 1.0)], 0.1) == 0
+    assert find_first_swept_collision(grid, [], 0.1) is None
+
+
+def test_swept_collision_reports_first_colliding_segment():
+    states = [agent(0.5, 0.5), agent(0.5, 2.0), agent(3.0, 2.0), agent(3.0, 0.5)]
+    assert find_first_swept_collision(wall_grid(), states, 0.1) == 2
+
+
+def test_swept_collision_respects_origin():
+    # 画布原点平移后，同样的世界坐标对应的格子随之平移
+    states = [agent(-0.5, 1.0), agent(1.5, 1.0)]
+    assert find_first_swept_collision(wall_grid(), states, 0.1, origin=(-2.0, 0.0)) == 1
+    assert find_first_swept_collision(wall_grid(), states, 0.1) is None
@@ -0,0 +1,646 @@
+"""
+utils模块的行为测试
+"""
+
+import numpy as np
+import pytest
+
+from utils import kernels
+from utils.json_io import iter_json_object
+
+
+def random_grid(seed, shape=(24, 31), density=0.15):
+    rng = np.random.default_rng(seed)
+    return (rng.random(shape) >= density).astype(np.uint8)
+
+
+# ---- user-029: 计算内核（numba循环实现与numpy实现一致） ----
+
+@pytest.mark.parametrize("seed", range(3))
+def test_inflate_matches_loop_implementation_and_brute_force(seed):
+    grid = random_grid(seed)
+    expanded = kernels.inflate_obstacles(grid, 2)
+    assert np.array_equal(expanded, kernels._inflate_loops(grid, 2))
+    rows, cols = np.nonzero(grid == 0)
+    brute = np.ones_like(grid)
+    for r, c in zip(rows, cols):
+        brute[max(r - 2, 0):r + 3, max(c - 2, 0):c + 3] = 0
+    assert np.array_equal(expanded, brute)
+
+
+@pytest.mark.parametrize("centered", [False, True])
+def test_rasterize_matches_loop_implementation(centered):
+    rng = np.random.default_rng(7)
+    lo = rng.random((20, 2)) * 3.0
+    boxes = np.hstack([lo, lo + rng.random((20, 2)) * 0.8])
+    fast = np.ones((30, 40), dtype=np.uint8)
+    loops = fast.copy()
+    kernels.rasterize_boxes(fast, boxes, 0.1, centered)
+    kernels._rasterize_loops(loops, boxes, 0.1, centered, np.uint8(0))
+    assert np.array_equal(fast, loops)
+
+
+def test_astar_grid_matches_loop_implementation():
+    grid = random_grid(3, density=0.2)
+    grid[0, 0] = grid[-1, -1] = 1
+
+    def length(cells):
+        cells = np.array(cells)
+        return float(np.hypot(*np.diff(cells, axis=0).T).sum())
+
+    path = kernels.astar_grid(grid, (0, 0), (grid.shape[0] - 1, grid.shape[1] - 1))
+    loops = kernels._astar_loops(grid, 0, 0, grid.shape[0] - 1, grid.shape[1] - 1)
+    assert path is not None
+    assert [divmod(int(cell), grid.shape[1]) for cell in loops] == path
+    assert all(grid[r, c] for r, c in path)
+    assert length(path) >= np.hypot(grid.shape[0] - 1, grid.shape[1] - 1) - 1e-9
+    blocked = np.ones((10, 10), dtype=np.uint8)
+    blocked[:, 5] = 0
+    assert kernels.astar_grid(blocked, (0, 0), (9, 9)) is None
+
+
+def test_path_hit_and_points_in_polygon_match_loop_implementation():
+    grid = random_grid(5, density=0.05)
+    rng = np.random.default_rng(11)
+    for _ in range(20):
+        points = rng.random((4, 2)) * [3.1, 2.4]
+        assert kernels.path_hits_obstacle(grid, points, 0.1, 0.05) == \
+            kernels._path_hit_loops(grid, points, 0.1, 0.05)
+    polygon = np.array([(0.0, 0.0), (2.0, 0.0), (2.0, 1.0), (1.0, 2.0), (0.0, 1.0)])
+    xs, ys = rng.random(200) * 3 - 0.5, rng.random(200) * 3 - 0.5
+    inside = kernels.points_in_polygon(xs, ys, polygon)
+    assert np.array_equal(inside, kernels._points_in_polygon_loops(xs, ys, polygon, 1e-12))
+    assert kernels.points_in_polygon([1.0, 2.0, 1.9], [1.0, 0.5, 1.9], polygon).tolist() == [True, True, False]
+
+
+def test_backend_selection():
+    assert kernels.set_backend("numpy") == "numpy"
+    assert kernels.get_backend() == "numpy"
+    with pytest.raises(ValueError):
+        kernels.set_backend("cuda")
+    if not kernels.numba_available():
+        with pytest.raises(ValueError):
+            kernels.set_backend("numba")
+    assert kernels.set_backend("auto") in kernels.BACKENDS
+
+
+def test_import_does_not_print_backend(capsys):
+    import importlib
+    importlib.reload(kernels)
+    assert capsys.readouterr().out == ""
+    assert kernels.get_backend() in kernels.report_backend()
+
+
+def make_map(map_id="utils_map", resolution=0.1, origin=None):
+    from apis import interaction_api as api
+    from core.data_structures import MapObject
+    map_rep = api.create_map(map_id, (4, 3), resolution=resolution, origin=origin)
+    map_rep.objects["table"] = MapObject("table", (1.0, 0.8, 0.75), (0.5, 0.5, 0.0), id="table")
+    map_rep.objects["chair"] = MapObject("chair", (0.5, 0.5, 0.9), (2.2, 1.4, 0.0), id="chair")
+    map_rep.objects["lamp"] = MapObject("lamp", (0.3, 0.3, 1.6), (3.1, 2.2, 0.0), id="lamp")
+    api.update_grid_map_full(map_rep)
+    return map_rep
+
+
+def assert_same_objects(loaded, original):
+    assert list(loaded.objects) == list(original.objects)
+    for key, obj in original.objects.items():
+        other = loaded.objects[key]
+        assert (other.label, other.id) == (obj.label, obj.id)
+        assert other.position == pytest.approx(obj.position)
+        assert other.size == pytest.approx(obj.size)
+
+
+# ---- user-041: 二进制地图容器 ----
+
+def test_map_container_round_trip(tmp_path):
+    from apis import interaction_api as api
+    from utils.map_container import is_map_container, load_map_container, save_map_container
+    original = make_map(resolution=0.05, origin=(1.0, -2.0))
+    path = save_map_container(original, str(tmp_path / "room.navimap"))
+    assert is_map_container(path)
+    assert not is_map_container(original.save_to_json(str(tmp_path / "room.json")))
+
+    loaded = api.load_existing_map(path)
+    assert_same_objects(loaded, original)
+    assert loaded.canvas_size == pytest.approx(original.canvas_size)
+    assert loaded.resolution == pytest.approx(0.05)
+    assert loaded.origin == pytest.approx((1.0, -2.0))
+    assert np.array_equal(loaded.grid_map, original.grid_map)
+
+    # 写时复制映射：修改加载出的grid map不会写回文件
+    loaded.grid_map[:5, :5] = 0
+    assert np.array_equal(load_map_container(path, mmap_mode=None).grid_map, original.grid_map)
+
+
+def test_map_container_converts_to_and_from_json_png(tmp_path):
+    from core.data_structures import MapRepresentation
+    from utils.map_container import container_to_json_png, json_png_to_container
+    original = make_map("convert_map")
+    json_path = original.save_to_json(str(tmp_path / "convert_map.json"))
+    original.save_grid_map_as_png()
+    container = json_png_to_container(json_path)
+    assert container.endswith(".navimap")
+
+    back = container_to_json_png(container, str(tmp_path / "back.json"))
+    assert np.array_equal(back.grid_map, original.grid_map)
+    reloaded = MapRepresentation.load_from_json(str(tmp_path / "back.json"))
+    assert_same_objects(reloaded, original)
+    assert np.array_equal(reloaded.grid_map, original.grid_map)
+
+
+# ---- user-042: 共享内存地图 ----
+
+def _shared_map_worker(handle, queue):
+    from apis.interaction_api import get_inflated_grid_map
+    from utils.shared_map import attach_shared_map
+    with attach_shared_map(handle) as view:
+        grid = view.map_rep.grid_map
+        inflated = get_inflated_grid_map(view.map_rep, 0.2, handle.resolution)
+        queue.put((grid.tobytes(), inflated.tobytes(), grid.flags.writeable, sorted(view.map_rep.objects)))
+
+
+def test_shared_map_visible_in_worker_process():
+    import multiprocessing
+    from apis.interaction_api import get_inflated_grid_map
+    from utils.shared_map import SharedMapHost
+    map_rep = make_map("shared_map")
+    expected_inflated = np.asarray(get_inflated_grid_map(map_rep, 0.2)).copy()
+    ctx = multiprocessing.get_context("fork")
+    with SharedMapHost() as host:
+        handle = host.publish(map_rep, margins=[0.2])
+        assert handle.margins == [0.2]
+        queue = ctx.Queue()
+        worker = ctx.Process(target=_shared_map_worker, args=(handle, queue))
+        worker.start()
+        grid_bytes, inflated_bytes, writeable, keys = queue.get(timeout=30)
+        worker.join(timeout=30)
+    assert worker.exitcode == 0
+    assert grid_bytes == np.asarray(map_rep.grid_map).tobytes()
+    assert inflated_bytes == expected_inflated.tobytes()
+    assert not writeable
+    assert keys == sorted(map_rep.objects)
+
+
+def test_shared_map_host_reference_counting():
+    from utils.shared_map import SharedMapHost, attach_shared_map
+    map_rep = make_map("shared_refs")
+    host = SharedMapHost()
+    handle = host.publish(map_rep)
+    assert host.publish(map_rep) is handle
+    assert len(host) == 1 and host.refcount(handle) == 2
+
+    view = attach_shared_map(handle)
+    assert np.array_equal(view.map_rep.grid_map, map_rep.grid_map)
+    view.close()
+    assert not host.release(handle)
+    assert host.release(handle)
+    assert len(host) == 0 and host.refcount(handle) == 0
+    with pytest.raises(KeyError):
+        host.acquire(handle)
+
+    # 地图修改后版本变化，作为新地图托管
+    from apis.interaction_api import move_object
+    first = host.publish(map_rep)
+    move_object(map_rep, "lamp", (0.2, 2.2, 0.0), check_collision=False)
+    assert host.publish(map_rep) is not first
+    host.close()
+    assert len(host) == 0
+
+
+# ---- user-043: 内容寻址的grid map缓存 ----
+
+def test_grid_cache_key_ignores_object_order_but_tracks_content():
+    from apis import interaction_api as api
+    from utils.grid_cache import map_grid_cache_key
+    map_rep = make_map("key_map")
+    reordered = api.create_map("key_map", (4, 3), resolution=0.1)
+    for key in reversed(list(map_rep.objects)):
+        reordered.objects[key] = map_rep.objects[key]
+    key = map_grid_cache_key(map_rep, 0.1)
+    assert map_grid_cache_key(reordered, 0.1) == key
+    assert map_grid_cache_key(map_rep, 0.05) != key
+    api.move_object(reordered, "lamp", (0.2, 2.2, 0.0), check_collision=False)
+    assert map_grid_cache_key(reordered, 0.1) != key
+    shifted = make_map("key_map", origin=(1.0, 0.0))
+    assert map_grid_cache_key(shifted, 0.1) != key
+
+
+def test_grid_cache_hit_skips_rasterization(isolated_config, monkeypatch):
+    from apis import interaction_api as api
+    from processors import geometry_processor
+    from utils.grid_cache import get_grid_cache
+    isolated_config._config["grid_map"]["cache_enabled"] = True
+    first = make_map("cached_map")
+    reference = geometry_processor.generate_grid_map_from_objects(first, use_cache=False)
+    assert np.array_equal(first.grid_map, reference)
+    cache = get_grid_cache()
+    assert cache.contains(first.grid_digest)
+    inflated = np.asarray(api.get_inflated_grid_map(first, 0.2)).copy()
+
+    def fail(*args):
+        raise AssertionError("缓存命中时不应重新栅格化")
+
+    monkeypatch.setattr(geometry_processor, "_rasterize_objects", fail)
+    monkeypatch.setattr(api, "expand_obstacles", fail)
+    hits = cache.hits
+    second = make_map("cached_map_copy")
+    assert cache.hits == hits + 1
+    assert np.array_equal(second.grid_map, reference)
+    assert np.array_equal(api.get_inflated_grid_map(second, 0.2), inflated)
+
+
+def test_grid_cache_evicts_least_recently_used(tmp_path):
+    import os
+    from utils.grid_cache import GridCache
+    cache = GridCache(str(tmp_path / "lru"), max_bytes=1 << 30)
+    grids = {f"{k:02x}" * 32: random_grid(k, shape=(200, 200)) for k in range(3)}
+    for stamp, (digest, grid) in enumerate(grids.items()):
+        cache.put_grid(digest, grid)
+        os.utime(cache._entry(digest), (stamp, stamp))
+    digests = list(grids)
+    assert np.array_equal(cache.get_grid(digests[0]), grids[digests[0]])  # 最近使用
+    entry_size = cache.size_bytes() // 3
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    assert cache.evict() == 1
+    assert not cache.contains(digests[1])
+    assert cache.contains(digests[0]) and cache.contains(digests[2])
+    assert cache.get_grid(digests[1]) is None
+
+
+# ---- user-044: 合并写入的持久化队列 ----
+
+def test_persister_skips_identical_content_and_coalesces_background_writes():
+    import threading
+    from utils.persistence import WriteBehindPersister, content_digest
+    grid = random_grid(0)
+    assert content_digest(grid) == content_digest(grid.copy())
+    assert content_digest(grid) != content_digest(1 - grid)
+
+    persister = WriteBehindPersister(background=True)
+    gate = threading.Event()
+    written = []
+    persister.submit("blocker", gate.wait)
+    for value in range(5):
+        persister.submit("grid", lambda value=value: written.append(value), content_digest([value]))
+    assert not persister.submit("grid", lambda: written.append("dup"), content_digest([4]))
+    gate.set()
+    assert persister.wait("grid", timeout=10)
+    assert written == [4]
+    assert persister.coalesced == 4 and persister.skipped == 1
+    assert persister.persisted_digest("grid") == content_digest([4])
+    persister.close(timeout=10)
+
+
+def test_persister_reports_inline_failures_and_allows_retry():
+    from utils.persistence import WriteBehindPersister
+    persister = WriteBehindPersister(background=False)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        persister.submit("grid", broken, "d1")
+    assert isinstance(persister.error("grid"), OSError)
+    # 失败后以相同内容重试不会被跳过
+    assert persister.submit("grid", lambda: attempts.append(2), "d1")
+    assert attempts == [1, 2]
+    assert persister.error("grid") is None
+    assert persister.persisted_digest("grid") == "d1"
+
+
+def test_save_rewrites_after_in_place_edit_and_keeps_grid_writable():
+    from utils.grid_map_storage import GridMapStorage
+    map_rep = make_map("persist_map")
+    path = map_rep.save_grid_map_as_png()
+    assert path is not None
+    assert map_rep.grid_map.flags.writeable
+    map_rep.grid_map[0, 0:5] = 0
+    assert map_rep.save_grid_map_as_png() == path
+    loaded = GridMapStorage.load_grid_map_from_png("persist_map", map_rep.canvas_size, map_rep.resolution)
+    assert np.array_equal(loaded, map_rep.grid_map)
+    assert loaded[0, 0:5].tolist() == [0] * 5
+
+
+def test_save_after_delete_rewrites_unchanged_grid():
+    import os
+    from utils.grid_map_storage import GridMapStorage
+    map_rep = make_map("deleted_map")
+    path = map_rep.save_grid_map_as_png()
+    assert GridMapStorage.delete_grid_map("deleted_map")
+    assert not GridMapStorage.grid_map_exists("deleted_map")
+    assert map_rep.save_grid_map_as_png() == path
+    assert GridMapStorage.grid_map_exists("deleted_map")
+    # 在存储之外删除的文件也会被重新写入
+    os.remove(path)
+    assert map_rep.save_grid_map_as_png() == path and os.path.exists(path)
+    loaded = GridMapStorage.load_grid_map_from_png("deleted_map", map_rep.canvas_size, map_rep.resolution)
+    assert np.array_equal(loaded, map_rep.grid_map)
+
+
+def test_save_failure_returns_none_and_is_reported(isolated_config, tmp_path, capsys):
+    from utils.grid_map_storage import GridMapStorage
+    blocked = tmp_path / "not_a_directory"
+    blocked.write_text("")
+    isolated_config._config["grid_map"]["png_directory"] = str(blocked)
+    map_rep = make_map("failing_map")
+    assert map_rep.save_grid_map_as_png() is None
+    assert GridMapStorage.get_write_error("failing_map") is not None
+    assert "保存grid_map PNG文件失败" in capsys.readouterr().out
+
+    isolated_config._config["grid_map"]["png_directory"] = str(tmp_path / "grid_maps")
+    assert map_rep.save_grid_map_as_png() is not None
+    assert GridMapStorage.get_write_error("failing_map") is None
+
+
+def test_background_save_waits_for_completion(isolated_config):
+    from utils.grid_map_storage import GridMapStorage
+    isolated_config._config["grid_map"]["write_behind"] = True
+    map_rep = make_map("background_map")
+    map_rep.grid_map[1, :] = 0
+    assert map_rep.save_grid_map_as_png(wait=False) is not None
+    assert GridMapStorage.wait_for_pending("background_map", timeout=10)
+    loaded = GridMapStorage.load_grid_map_from_png("background_map", map_rep.canvas_size, map_rep.resolution)
+    assert np.array_equal(loaded, map_rep.grid_map)
+
+
+# ---- user-045: 1位PNG存储 ----
+
+def test_one_bit_png_round_trip_with_metadata():
+    from core.bitgrid import PackedGrid
+    from utils.grid_map_storage import GridMapStorage
+    grid = random_grid(5, shape=(24, 31))  # 宽度不是8的倍数
+    path = GridMapStorage.save_grid_map_as_png(grid, "bits", (3.1, 2.4), 0.1, digest="abc",
+                                               grid_version=7, origin=(0.5, -1.0))
+    loaded = GridMapStorage.load_grid_map_from_png("bits", (3.1, 2.4), 0.1, origin=(0.5, -1.0))
+    assert loaded.dtype == np.uint8 and np.array_equal(loaded, grid)
+    packed = GridMapStorage.load_grid_map_from_png("bits", None, None, packed=True)
+    assert isinstance(packed, PackedGrid) and np.array_equal(packed.to_array(), grid)
+    assert np.array_equal(GridMapStorage.decode_png(path), grid)
+
+    meta = GridMapStorage.read_png_metadata("bits")
+    assert meta["shape"] == (24, 31) and meta["bit_depth"] == 1
+    assert meta["canvas_size"] == (3.1, 2.4) and meta["origin"] == (0.5, -1.0)
+    assert meta["resolution"] == 0.1 and meta["grid_version"] == 7 and meta["digest"] == "abc"
+    loaded_many = GridMapStorage.load_many(["bits", "missing"])
+    assert np.array_equal(loaded_many["bits"], grid) and loaded_many["missing"] is None
+
+
+def test_png_with_mismatched_metadata_is_ignored():
+    from utils.grid_map_storage import GridMapStorage
+    grid = random_grid(6, shape=(20, 30))
+    GridMapStorage.save_grid_map_as_png(grid, "mismatch", (3.0, 2.0), 0.1, origin=(0.0, 0.0))
+    assert GridMapStorage.load_grid_map_from_png("mismatch", (3.0, 2.0), 0.05) is None
+    assert GridMapStorage.load_grid_map_from_png("mismatch", (4.0, 2.0), 0.1) is None
+    assert GridMapStorage.load_grid_map_from_png("mismatch", (3.0, 2.0), 0.1, origin=(1.0, 0.0)) is None
+
+
+def test_legacy_grayscale_png_is_thresholded():
+    import os
+    from PIL import Image
+    from utils.grid_map_storage import GridMapStorage
+    gray = np.array([[0, 40, 127], [128, 200, 255]], dtype=np.uint8)
+    path = GridMapStorage.get_grid_map_path("legacy")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(gray, mode="L").save(path)
+    assert GridMapStorage.read_png_metadata("legacy")["bit_depth"] == 8
+    assert GridMapStorage.decode_png(path).tolist() == [[0, 0, 0], [1, 1, 1]]
+
+
+# ---- user-046: 进程内地图缓存 ----
+
+def saved_map_file(tmp_path, map_id="cached_file_map"):
+    map_rep = make_map(map_id)
+    path = map_rep.save_to_json(str(tmp_path / f"{map_id}.json"))
+    map_rep.save_grid_map_as_png()
+    return map_rep, path
+
+
+def test_map_cache_returns_private_writable_copies(isolated_config, tmp_path):
+    from apis import interaction_api as api
+    from utils.map_cache import get_map_cache
+    isolated_config._config["performance"]["map_cache_enabled"] = True
+    original, path = saved_map_file(tmp_path)
+    cache = get_map_cache()
+    cache.invalidate()
+    first = api.load_existing_map(path)
+    assert not first.frozen and first.grid_map.flags.writeable
+    first.grid_map[:, :] = 0
+    api.move_object(first, "lamp", (0.2, 2.2, 0.0), check_collision=False)
+    del first.objects["chair"]
+
+    second = api.load_existing_map(path)
+    assert cache.stats()["hits"] >= 1 and len(cache) == 1
+    assert np.array_equal(second.grid_map, original.grid_map)
+    assert_same_objects(second, original)
+
+
+def test_map_cache_read_only_map_is_shared_and_frozen(isolated_config, tmp_path):
+    from apis import interaction_api as api
+    from utils.map_cache import get_map_cache
+    isolated_config._config["performance"]["map_cache_enabled"] = True
+    get_map_cache().invalidate()
+    _, path = saved_map_file(tmp_path, "shared_file_map")
+    shared = api.load_existing_map(path, read_only=True)
+    assert api.load_existing_map(path, read_only=True) is shared
+    assert shared.frozen and not shared.grid_map.flags.writeable
+    with pytest.raises(ValueError):
+        shared.grid_map[0, 0] = 0
+    with pytest.raises(TypeError):
+        del shared.objects["lamp"]
+
+
+def test_map_cache_reloads_when_files_change(tmp_path):
+    import os
+    from core.data_structures import MapRepresentation
+    from utils.map_cache import MapCache
+    map_rep, path = saved_map_file(tmp_path, "changing_map")
+    loads = []
+
+    def loader(file_path):
+        loads.append(file_path)
+        return MapRepresentation.load_from_json(file_path)
+
+    cache = MapCache(1 << 30)
+    cache.get(path, loader)
+    cache.get(path, loader)
+    assert len(loads) == 1
+
+    # grid map PNG变化也会使缓存失效
+    map_rep.grid_map[0, :] = 0
+    png = map_rep.save_grid_map_as_png()
+    stat = os.stat(png)
+    os.utime(png, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    reloaded = cache.get(path, loader)
+    assert len(loads) == 2 and cache.invalidations == 1
+    assert reloaded.grid_map[0].tolist() == [0] * reloaded.grid_shape[1]
+
+    cache.invalidate(path)
+    assert path not in cache
+    small = MapCache(1)
+    small.get(path, loader)
+    assert len(small) == 0  # 超过上限的地图不缓存
+
+
+# ---- user-048: 多级分块grid map档案 ----
+
+@pytest.mark.parametrize("as_tiled", [False, True])
+def test_tile_pyramid_levels_and_windows_match_dense_grid(tmp_path, as_tiled):
+    from core.tiled_grid import TiledGrid
+    from utils.tile_pyramid import TilePyramid, downsample_min, write_tile_pyramid
+    grid = random_grid(8, shape=(100, 130), density=0.05)
+    grid[:40, :48] = 1  # 均匀块
+    source = TiledGrid(grid.copy()) if as_tiled else grid
+    path = write_tile_pyramid(source, str(tmp_path / "g.gridpyr"), 0.1, origin=(1.0, -2.0), tile_size=16)
+    with TilePyramid(path) as pyramid:
+        assert pyramid.shape == (100, 130) and pyramid.origin == (1.0, -2.0)
+        level_grid = grid
+        for level in range(pyramid.num_levels):
+            assert np.array_equal(pyramid.read_level(level), level_grid)
+            level_grid = downsample_min(level_grid)
+        assert pyramid.select_level(0.45) == 2
+        assert pyramid.stats()["level_0"]["uniform_tiles"] >= 6
+
+        decoded = pyramid.tiles_decoded
+        window, origin, res = pyramid.read_window((2.05, -1.0, 3.3, 0.15))
+        assert res == 0.1 and origin == pytest.approx((2.0, -1.0))
+        assert np.array_equal(window, grid[10:22, 10:23])
+        assert pyramid.tiles_decoded - decoded <= 4  # 只解码相交的块
+
+
+def test_map_pyramid_window_matches_grid_slice():
+    from utils.grid_map_storage import GridMapStorage
+    from utils.tile_pyramid import downsample_min
+    map_rep = make_map("pyramid_map", origin=(-1.0, 0.5))
+    assert GridMapStorage.load_grid_window("pyramid_map", (0.0, 0.0, 1.0, 1.0)) is None
+    path = map_rep.save_grid_pyramid(tile_size=8)
+    assert path is not None
+    window, origin, res = GridMapStorage.load_grid_window("pyramid_map", (-0.55, 1.0, 1.0, 2.05))
+    assert origin == pytest.approx((-0.6, 1.0)) and res == pytest.approx(0.1)
+    assert np.array_equal(window, map_rep.grid_map[5:16, 4:20])
+
+    coarse, _, coarse_res = GridMapStorage.load_grid_window("pyramid_map", (-1.0, 0.5, 3.0, 3.5), resolution=0.2)
+    assert coarse_res == pytest.approx(0.2)
+    assert np.array_equal(coarse, downsample_min(map_rep.grid_map))
+
+    # 重新保存PNG后过期的档案被删除
+    map_rep.grid_map[0, 0] = 0
+    map_rep.save_grid_map_as_png()
+    assert GridMapStorage.open_grid_pyramid("pyramid_map") is None
+
+
+# ---- user-049: 增量编码的地图版本历史 ----
+
+@pytest.mark.parametrize("same_shape", [True, False])
+def test_tile_xor_delta_round_trip(same_shape):
+    from utils.map_history import apply_tile_xor_delta, tile_xor_delta
+    old = random_grid(9, shape=(37, 50))
+    new = old.copy() if same_shape else random_grid(10, shape=(40, 45))
+    new[3:6, 20:30] = 1 - new[3:6, 20:30]
+    keys, xor = tile_xor_delta(old, new, 16)
+    if same_shape:
+        assert {tuple(k) for k in keys} == {(0, 1)}
+    assert np.array_equal(apply_tile_xor_delta(old, new.shape, keys, xor, 16), new)
+
+
+def test_map_history_checkout_restores_every_version(tmp_path):
+    from apis import interaction_api as api
+    from core.data_structures import MapObject
+    from utils.map_history import MapHistory
+    history = MapHistory(str(tmp_path / "history"), keyframe_interval=3, tile_size=8)
+    base = make_map("history_map")
+    expected = {history.commit(base, message="base"): base.fork()}
+    variant = base.fork()
+    for step in range(5):
+        api.move_object(variant, "lamp", (0.2 + 0.5 * step, 2.2, 0.0), check_collision=False)
+        if step == 1:
+            del variant.objects["chair"]
+        if step == 2:
+            variant.objects["box"] = MapObject("box", (0.3, 0.3, 0.3), (1.5, 0.3, 0.0), id="box")
+            api.update_grid_map_full(variant)
+        if step == 3:
+            variant.write_grid_window((0, 2, 0, 40), 0)
+        expected[history.commit(variant)] = variant.fork()
+    branch = base.fork()
+    del branch.objects["table"]
+    api.update_grid_map_full(branch)
+    expected[history.commit(branch, parent=0, message="branch")] = branch.fork()
+
+    entries = history.versions()
+    assert [entry["keyframe"] for entry in entries] == [True, False, False, True, False, False, False]
+    assert entries[-1]["parent"] == 0
+
+    reopened = MapHistory(str(tmp_path / "history"))
+    assert len(reopened) == len(expected) and reopened.tile_size == 8
+    for version, snapshot in expected.items():
+        restored = reopened.checkout(version)
+        assert_same_objects(restored, snapshot)
+        assert np.array_equal(restored.grid_map, snapshot.grid_map)
+        assert restored.resolution == snapshot.resolution
+    edited = reopened.checkout()
+    edited.grid_map[:, :] = 0
+    assert np.array_equal(reopened.checkout().grid_map, branch.grid_map)
+    report = reopened.storage_report()
+    assert report["versions"] == 7 and report["keyframes"] == 2
+
+
+def test_map_history_deltas_are_small_for_local_edits(tmp_path):
+    from apis import interaction_api as api
+    from core.data_structures import MapObject
+    from utils.map_history import MapHistory
+    rng = np.random.default_rng(11)
+    base = api.create_map("large_history_map", (20.0, 15.0), resolution=0.05)
+    for k in range(300):
+        base.objects[f"obj_{k}"] = MapObject("box", (0.3, 0.3, 0.5), (rng.random() * 19, rng.random() * 14, 0.0),
+                                             id=f"obj_{k}")
+    api.update_grid_map_full(base)
+    history = MapHistory(str(tmp_path / "large_history"), keyframe_interval=10)
+    history.commit(base)
+    for k in range(4):
+        variant = base.fork()
+        api.move_object(variant, f"obj_{k}", (10.0, 7.0 + k, 0.0), check_collision=False)
+        history.commit(variant, parent=0)
+        assert np.array_equal(history.checkout().grid_map, variant.grid_map)
+    for entry in history.versions()[1:]:
+        assert not entry["keyframe"] and entry["stored_bytes"] * 10 < entry["full_bytes"]
+
+
+# ---- user-050: 流式读取JSON ----
+
+STREAM_DOCUMENT = ('{"a": 1.5, "n": -12, "e": 1e5, "f": -2.5E-3, "t": true, "z": null, "s": "x\\"y,1", '
+                   '"objects": {"k": 2.5, "m": {"position": [1.25, 0, 3e2], "label": "桌子"}, "q": 7}, '
+                   '"tail": [1, 2.0, {"u": 10}]}')
+
+
+def consume(path, chunk_size):
+    result = {}
+    for key, value in iter_json_object(path, chunk_size=chunk_size):
+        result[key] = dict(value) if key == "objects" else value
+    return result
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 1 << 20])
+def test_iter_json_object_matches_json_load_for_any_chunk_size(tmp_path, chunk_size):
+    import json
+    path = tmp_path / "doc.json"
+    path.write_text(STREAM_DOCUMENT, encoding="utf-8")
+    assert consume(str(path), chunk_size) == json.loads(STREAM_DOCUMENT)
+
+
+def test_iter_json_object_numbers_split_at_chunk_boundary(tmp_path):
+    path = tmp_path / "numbers.json"
+    for text, expected in [('{"a": 1.5}', {"a": 1.5}), ('{"a": 1e5}', {"a": 1e5}),
+                           ('{"objects": {"k": 2.5}}', {"objects": {"k": 2.5}})]:
+        path.write_text(text, encoding="utf-8")
+        for chunk_size in range(1, len(text) + 1):
+            assert consume(str(path), chunk_size) == expected
+
+
+def test_iter_json_object_rejects_trailing_content(tmp_path):
+    import json
+    path = tmp_path / "bad.json"
+    path.write_text('{"a": 1} 2', encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        consume(str(path), 2)
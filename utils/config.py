@@ -37,7 +37,14 @@ class Config:
                 'resolution': 0.01,
                 'default_resolution': 0.01,
                 'png_storage': True,
-                'png_directory': 'data/grid_maps'
+                'png_directory': 'data/grid_maps',
+                'cache_enabled': False,
+                'cache_directory': 'data/grid_cache',
+                'cache_max_bytes': 1073741824,
+                'write_behind': False,
+                'png_compress_level': 6,
+                'pyramid_enabled': False,
+                'pyramid_tile_size': 256
             },
             'collision': {
                 'margin': 0.3,
@@ -45,16 +52,31 @@ class Config:
             },
             'pathfinding': {
                 'max_search_radius': 2.0,
-                'sample_step': 0.05
+                'sample_step': 0.05,
+                'multi_agent_resolution': 0.1
             },
             'map': {
-                'default_canvas_size': [15.0, 12.0]
+                'default_canvas_size': [15.0, 12.0],
+                'history_keyframe_interval': 10,
+                'history_tile_size': 64,
+                'lazy_objects': False,
+                'json_compact': False
             },
             'visualization': {
                 'alpha': 0.3
             },
             'objects': {
                 'default_size': [0.3, 0.3, 0.6]
+            },
+            'performance': {
+                'backend': 'auto',
+                'report_backend': False,
+                'spatial_index_cell_size': 1.0,
+                'sparse_grid_min_cells': 100000000,
+                'sparse_grid_tile_size': 256,
+                'map_cache_enabled': True,
+                'map_cache_max_bytes': 536870912,
+                'json_backend': 'auto'
             }
         }
     
@@ -90,6 +112,34 @@ class Config:
         """获取PNG存储目录"""
         return self.get('grid_map.png_directory', 'data/grid_maps')
     
+    def get_grid_cache_enabled(self) -> bool:
+        """获取是否启用grid map内容缓存"""
+        return self.get('grid_map.cache_enabled', False)
+    
+    def get_grid_cache_directory(self) -> str:
+        """获取grid map缓存目录"""
+        return self.get('grid_map.cache_directory', 'data/grid_cache')
+    
+    def get_grid_cache_max_bytes(self) -> int:
+        """获取grid map缓存的磁盘上限（字节）"""
+        return int(self.get('grid_map.cache_max_bytes', 1073741824))
+    
+    def get_write_behind_enabled(self) -> bool:
+        """获取是否在后台线程中保存grid map文件"""
+        return self.get('grid_map.write_behind', False)
+    
+    def get_png_compress_level(self) -> int:
+        """获取grid map PNG的zlib压缩级别（0-9）"""
+        return int(self.get('grid_map.png_compress_level', 6))
+    
+    def get_grid_pyramid_enabled(self) -> bool:
+        """获取保存grid map时是否同时写多级分块档案"""
+        return self.get('grid_map.pyramid_enabled', False)
+    
+    def get_grid_pyramid_tile_size(self) -> int:
+        """获取多级分块档案的块边长（格）"""
+        return int(self.get('grid_map.pyramid_tile_size', 256))
+    
     def get_collision_margin(self) -> float:
         """获取碰撞边缘距离"""
         return self.get('collision.margin', 0.3)
@@ -106,11 +156,31 @@ class Config:
         """获取路径采样步长"""
         return self.get('pathfinding.sample_step', 0.05)
     
+    def get_multi_agent_resolution(self) -> float:
+        """获取多智能体规划栅格分辨率"""
+        return self.get('pathfinding.multi_agent_resolution', 0.1)
+    
     def get_default_canvas_size(self) -> Tuple[float, float]:
         """获取默认画布大小"""
         size = self.get('map.default_canvas_size', [15.0, 12.0])
         return tuple(size)
     
+    def get_history_keyframe_interval(self) -> int:
+        """获取地图历史中两个关键帧之间最多连续的增量版本数"""
+        return max(1, int(self.get('map.history_keyframe_interval', 10)))
+    
+    def get_history_tile_size(self) -> int:
+        """获取地图历史中grid增量的块边长（格）"""
+        return int(self.get('map.history_tile_size', 64))
+    
+    def get_lazy_objects(self) -> bool:
+        """获取加载地图JSON时是否按需创建MapObject"""
+        return self.get('map.lazy_objects', False)
+    
+    def get_json_compact(self) -> bool:
+        """获取保存地图JSON时是否使用紧凑格式（无缩进）"""
+        return self.get('map.json_compact', False)
+    
     def get_visualization_alpha(self) -> float:
         """获取可视化透明度"""
         return self.get('visualization.alpha', 0.3)
@@ -118,6 +188,38 @@ class Config:
     def get_default_object_size(self) -> List[float]:
         """获取默认对象尺寸"""
         return self.get('objects.default_size', [0.3, 0.3, 0.6])
+    
+    def get_compute_backend(self) -> str:
+        """获取计算后端（auto/numba/numpy）"""
+        return self.get('performance.backend', 'auto')
+    
+    def get_json_backend(self) -> str:
+        """获取JSON编码后端（auto/orjson/json）"""
+        return self.get('performance.json_backend', 'auto')
+    
+    def get_report_backend(self) -> bool:
+        """获取启动时是否打印计算后端"""
+        return self.get('performance.report_backend', False)
+    
+    def get_spatial_index_cell_size(self) -> float:
+        """获取物体空间索引的分桶边长（米）"""
+        return self.get('performance.spatial_index_cell_size', 1.0)
+    
+    def get_sparse_grid_min_cells(self) -> int:
+        """获取以稀疏分块方式生成grid map的最小格子数"""
+        return int(self.get('performance.sparse_grid_min_cells', 100000000))
+    
+    def get_sparse_grid_tile_size(self) -> int:
+        """获取稀疏grid map的块边长（格）"""
+        return int(self.get('performance.sparse_grid_tile_size', 256))
+    
+    def get_map_cache_enabled(self) -> bool:
+        """获取是否在进程内缓存已加载的地图"""
+        return self.get('performance.map_cache_enabled', True)
+    
+    def get_map_cache_max_bytes(self) -> int:
+        """获取进程内地图缓存的内存上限（字节，按grid占用计算）"""
+        return int(self.get('performance.map_cache_max_bytes', 536870912))
 
 # 创建全局配置实例
 config = Config()
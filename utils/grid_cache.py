@@ -0,0 +1,235 @@
+"""
+内容寻址的grid map缓存
+以规范化的物体表（按键排序的键和3D边界框）、画布大小和原点、分辨率及生成方式的哈希为键，
+在磁盘上保存生成的grid map及派生层（实例标签栅格、膨胀grid map），内容相同时直接返回而不重新栅格化。
+每个摘要对应一个目录，按最近使用时间淘汰，总大小不超过配置的上限。
+"""
+
+import hashlib
+import os
+import shutil
+import struct
+import time
+from pathlib import Path
+from typing import Optional, Tuple, Union
+import numpy as np
+from core.bitgrid import PackedGrid
+from core.instance_map import InstanceMap
+from core.tiled_grid import TiledGrid
+from utils.config import config
+from utils.grid_map_storage import GridMapStorage
+from utils.persistence import atomic_write
+
+# 栅格化规则变化时递增，使旧的缓存条目失效
+CACHE_FORMAT_VERSION = 2
+
+
+def grid_cache_key(object_ids, bounds: np.ndarray, canvas_size: Tuple[float, float], resolution: float,
+                   sparse_tile_size: int = 0, origin: Tuple[float, float] = (0.0, 0.0)) -> str:
+    """
+    计算grid map的内容摘要（与物体顺序无关）
+
+    Args:
+        object_ids: 物体键列表
+        bounds: (N, 6) 的3D边界框，与object_ids对应
+        canvas_size: 画布大小 (width, height)
+        resolution: 网格分辨率
+        sparse_tile_size: 以稀疏分块方式生成时的块边长，稠密生成为0
+        origin: 画布原点（grid第(0, 0)格左下角的世界坐标）
+
+    Returns:
+        十六进制SHA-256摘要
+    """
+    h = hashlib.sha256()
+    h.update(struct.pack("<Iddd q dd", CACHE_FORMAT_VERSION, float(canvas_size[0]), float(canvas_size[1]),
+                         float(resolution), int(sparse_tile_size), float(origin[0]), float(origin[1])))
+    order = sorted(range(len(object_ids)), key=lambda k: object_ids[k])
+    bounds = np.asarray(bounds, dtype="<f8").reshape(-1, 6)
+    h.update(np.ascontiguousarray(bounds[order]).tobytes())
+    for k in order:
+        h.update(object_ids[k].encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def map_grid_cache_key(map_rep, resolution: float) -> str:
+    """
+    按generate_grid_map_from_objects的生成方式计算地图的内容摘要
+
+    Args:
+        map_rep: MapRepresentation，必须设置canvas_size
+        resolution: 网格分辨率
+
+    Returns:
+        十六进制SHA-256摘要
+    """
+    grid_h, grid_w = GridMapStorage.grid_shape(map_rep.canvas_size, resolution)
+    tile_size = config.get_sparse_grid_tile_size() if grid_h * grid_w >= config.get_sparse_grid_min_cells() else 0
+    table = map_rep.object_table
+    return grid_cache_key(table.ids, table.bounds, map_rep.canvas_size, resolution, tile_size, map_rep.origin)
+
+
+class GridCache:
+    """磁盘上的内容寻址grid map缓存"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def _touch(self, entry: Path):
+        try:
+            now = time.time()
+            os.utime(entry, (now, now))
+        except OSError:
+            pass
+
+    def contains(self, digest: str) -> bool:
+        entry = self._entry(digest)
+        return (entry / "grid.npz").exists() or (entry / "grid_tiles.npz").exists()
+
+    def get_grid(self, digest: str) -> Optional[Union[np.ndarray, TiledGrid]]:
+        """
+        读取缓存的grid map
+
+        Returns:
+            grid map（稀疏生成的为TiledGrid），未命中时返回None
+        """
+        entry = self._entry(digest)
+        try:
+            if (entry / "grid.npz").exists():
+                grid_map = self._read_packed(entry / "grid.npz")
+            elif (entry / "grid_tiles.npz").exists():
+                grid_map = GridMapStorage.read_grid_tiles(str(entry / "grid_tiles.npz"))
+            else:
+                self.misses += 1
+                return None
+        except (OSError, ValueError, KeyError):
+            # 损坏或被并发淘汰的条目视为未命中
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(entry)
+        return grid_map
+
+    def put_grid(self, digest: str, grid_map: Union[np.ndarray, TiledGrid]):
+        """保存grid map（稠密的按位压缩保存，稀疏的逐块保存），随后按大小上限淘汰"""
+        entry = self._entry(digest)
+        entry.mkdir(parents=True, exist_ok=True)
+        if isinstance(grid_map, TiledGrid) and grid_map.is_sparse:
+            atomic_write(entry / "grid_tiles.npz",
+                          lambda path: GridMapStorage.write_grid_tiles(grid_map, path, digest=digest))
+        else:
+            self._write_packed(entry / "grid.npz", grid_map)
+        self._touch(entry)
+        self.evict()
+
+    def get_layer(self, digest: str, name: str) -> Optional[np.ndarray]:
+        """读取派生的二值层（例如 "inflated_0.3"），未命中时返回None"""
+        path = self._entry(digest) / f"{name}.npz"
+        try:
+            layer = self._read_packed(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        self._touch(path.parent)
+        return layer
+
+    def put_layer(self, digest: str, name: str, layer: np.ndarray):
+        """保存派生的二值层（只在该摘要的grid已缓存时保存）"""
+        entry = self._entry(digest)
+        if not entry.exists():
+            return
+        self._write_packed(entry / f"{name}.npz", layer)
+        self.evict()
+
+    def get_instance_map(self, digest: str) -> Optional[InstanceMap]:
+        path = self._entry(digest) / "instances.npz"
+        try:
+            with np.load(path) as data:
+                return InstanceMap(data["labels"], data["object_ids"].tolist(), data["z_min"], data["z_max"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put_instance_map(self, digest: str, instance_map: InstanceMap):
+        entry = self._entry(digest)
+        if not entry.exists():
+            return
+        atomic_write(entry / "instances.npz", lambda path: np.savez_compressed(
+            path, labels=instance_map.labels, object_ids=np.array(instance_map.object_ids, dtype=str),
+            z_min=instance_map.z_min, z_max=instance_map.z_max))
+        self.evict()
+
+    @staticmethod
+    def _read_packed(path: Path) -> np.ndarray:
+        with np.load(path) as data:
+            return PackedGrid(data["bits"], int(data["width"])).to_array()
+
+    @staticmethod
+    def _write_packed(path: Path, grid_map):
+        packed = grid_map if isinstance(grid_map, PackedGrid) else PackedGrid.from_array(grid_map)
+        atomic_write(path, lambda tmp: np.savez(tmp, bits=packed.bits, width=np.int64(packed.width)))
+
+    def _entries(self):
+        """[(最近使用时间, 大小, 目录), ...]"""
+        entries = []
+        if not self.directory.exists():
+            return entries
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if not entry.is_dir():
+                    continue
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((entry.stat().st_mtime, size, Path(entry.path)))
+        return entries
+
+    def size_bytes(self) -> int:
+        """缓存当前占用的磁盘大小"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """
+        按最近使用时间淘汰条目，直到总大小不超过max_bytes
+
+        Returns:
+            被淘汰的条目数
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_grid_cache: Optional[GridCache] = None
+
+
+def get_grid_cache() -> Optional[GridCache]:
+    """
+    获取按配置创建的全局grid map缓存
+
+    Returns:
+        GridCache，配置中禁用缓存时返回None
+    """
+    global _grid_cache
+    if not config.get_grid_cache_enabled():
+        return None
+    directory, max_bytes = config.get_grid_cache_directory(), config.get_grid_cache_max_bytes()
+    if _grid_cache is None or str(_grid_cache.directory) != directory or _grid_cache.max_bytes != max_bytes:
+        _grid_cache = GridCache(directory, max_bytes)
+    return _grid_cache
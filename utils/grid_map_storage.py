@@ -1,14 +1,27 @@
 """
 Grid Map PNG存储工具
-提供grid_map的PNG格式存储和加载功能
+提供grid_map的PNG格式存储和加载功能；超大画布的稀疏分块grid_map按块存储为npz；
+可选的多级分块档案（utils.tile_pyramid）用于只读取局部窗口。
+所有文件都先写临时文件再原子替换；persist_*方法把写入交给后台持久化队列（utils.persistence），
+同一地图的连续保存只写最后一次，读取、删除前会等待该地图尚未完成的写入。
 """
 
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
+from PIL.PngImagePlugin import PngInfo
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from core.bitgrid import PackedGrid
+from core.tiled_grid import TiledGrid
 from utils.config import config
+from utils.persistence import atomic_write, content_digest, get_persister
+from utils.tile_pyramid import PYRAMID_SUFFIX, TilePyramid, write_tile_pyramid
+
+# 旧的8位灰度PNG按127阈值二值化
+_THRESHOLD_LUT = [0] * 128 + [1] * 128
 
 
 class GridMapStorage:
@@ -17,19 +30,31 @@ class GridMapStorage:
     @staticmethod
     def save_grid_map_as_png(grid_map: np.ndarray, map_id: str, 
                             canvas_size: Tuple[float, float], 
-                            resolution: float) -> str:
+                            resolution: float, digest: Optional[str] = None,
+                            grid_version: Optional[int] = None,
+                            origin: Optional[Tuple[float, float]] = None) -> str:
         """
-        将grid_map保存为PNG文件
+        将grid_map保存为1位（mode "1"）PNG文件，画布大小、原点、分辨率、版本号和内容摘要写入PNG文本块
         
         Args:
             grid_map: numpy数组，形状为(height, width)
             map_id: 地图ID
             canvas_size: 画布大小 (width, height)
             resolution: 网格分辨率
+            digest: 可选的内容摘要（见utils.grid_cache），用于跳过内容相同的重复保存
+            grid_version: 可选的grid版本号
+            origin: 可选的画布原点（grid第(0, 0)格左下角的世界坐标）
             
         Returns:
             PNG文件的绝对路径
         """
+        GridMapStorage.wait_for_pending(map_id)
+        return GridMapStorage._write_png(grid_map, map_id, canvas_size, resolution, digest, grid_version, origin)
+    
+    @staticmethod
+    def _write_png(grid_map: np.ndarray, map_id: str, canvas_size: Optional[Tuple[float, float]],
+                   resolution: Optional[float], digest: Optional[str], grid_version: Optional[int],
+                   origin: Optional[Tuple[float, float]] = None) -> str:
         # 确保存储目录存在
         png_dir = config.get_png_directory()
         png_path = Path(png_dir)
@@ -39,48 +64,597 @@ class GridMapStorage:
         filename = f"{map_id}_grid_map.png"
         file_path = png_path / filename
         
-        # 将numpy数组转换为PIL图像
-        # 0表示障碍物（黑色），1表示可通行区域（白色）
-        # 转换为0-255的灰度值
-        img_array = grid_map.astype(np.uint8) * 255
-        img = Image.fromarray(img_array, mode='L')
+        # 按位压缩后直接作为1位图像：0表示障碍物（黑色），1表示可通行区域（白色），
+        # 行内按高位在前逐字节排列，与PIL的"1"模式原始数据格式相同
+        packed = grid_map if isinstance(grid_map, PackedGrid) else PackedGrid.from_array(grid_map)
+        height, width = packed.shape
+        img = Image.frombytes('1', (width, height), packed.bits.tobytes())
+        
+        # 元数据写在图像数据之前，读取时不需要解码图像
+        pnginfo = PngInfo()
+        if canvas_size is not None:
+            pnginfo.add_text("canvas_size", json.dumps([float(v) for v in canvas_size]))
+        if origin is not None:
+            pnginfo.add_text("origin", json.dumps([float(v) for v in origin]))
+        if resolution is not None:
+            pnginfo.add_text("resolution", repr(float(resolution)))
+        if grid_version is not None:
+            pnginfo.add_text("grid_version", str(int(grid_version)))
+        if digest is not None:
+            pnginfo.add_text("grid_digest", digest)
         
         # 保存PNG文件
-        img.save(file_path, 'PNG')
+        compress_level = config.get_png_compress_level()
+        atomic_write(file_path, lambda tmp: img.save(tmp, 'PNG', pnginfo=pnginfo, compress_level=compress_level))
+        # 同一地图的分块文件和多级分块档案已过期
+        for stale_path in (GridMapStorage.get_grid_tiles_path(map_id), GridMapStorage.get_grid_pyramid_path(map_id)):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
         
         return str(file_path.absolute())
     
     @staticmethod
-    def load_grid_map_from_png(map_id: str, canvas_size: Tuple[float, float], 
-                              resolution: float) -> Optional[np.ndarray]:
+    def _write_tiles(grid_map: Union[np.ndarray, TiledGrid], map_id: str,
+                     tile_size: Optional[int], digest: Optional[str]) -> str:
+        Path(config.get_png_directory()).mkdir(parents=True, exist_ok=True)
+        file_path = GridMapStorage.get_grid_tiles_path(map_id)
+        atomic_write(file_path, lambda tmp: GridMapStorage.write_grid_tiles(grid_map, tmp, tile_size, digest))
+        # 同一地图的PNG和多级分块档案已过期
+        for stale_path in (GridMapStorage.get_grid_map_path(map_id), GridMapStorage.get_grid_pyramid_path(map_id)):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        return file_path
+    
+    @staticmethod
+    def persist_grid_map(grid_map: Union[np.ndarray, TiledGrid], map_id: str,
+                         canvas_size: Optional[Tuple[float, float]] = None, resolution: Optional[float] = None,
+                         digest: Optional[str] = None, grid_version: Optional[int] = None,
+                         origin: Optional[Tuple[float, float]] = None) -> str:
+        """
+        保存grid_map（稀疏TiledGrid保存为分块文件，其余保存为PNG），内容与该地图最近一次提交的相同且文件仍存在时跳过；
+        配置grid_map.write_behind为true时在后台线程中写入并立即返回（失败见get_write_error）；
+        配置grid_map.pyramid_enabled为true时同时写多级分块档案
+        
+        Args:
+            grid_map: 要保存的grid_map，提交后调用方不能再原地修改它（传入副本或TiledGrid.copy()）
+            map_id: 地图ID
+            canvas_size: 可选的画布大小，写入PNG元数据
+            resolution: 可选的网格分辨率，写入PNG元数据
+            digest: 可选的生成摘要（见utils.grid_cache）；已保存文件记录的摘要相同时不重新写入
+            grid_version: 可选的grid版本号，写入PNG元数据
+            origin: 可选的画布原点，写入PNG元数据
+            
+        Returns:
+            保存完成后文件的绝对路径
+            
+        Raises:
+            Exception: 同步写入时写入失败
+        """
+        sparse = isinstance(grid_map, TiledGrid) and grid_map.is_sparse
+        
+        with_pyramid = config.get_grid_pyramid_enabled() and resolution is not None
+        
+        def write():
+            if digest is not None and GridMapStorage._read_saved_digest(map_id) == digest:
+                if with_pyramid and not os.path.exists(GridMapStorage.get_grid_pyramid_path(map_id)):
+                    GridMapStorage._write_pyramid(grid_map, map_id, resolution, origin, canvas_size, digest, grid_version)
+                return
+            if sparse:
+                GridMapStorage._write_tiles(grid_map, map_id, None, digest)
+            else:
+                GridMapStorage._write_png(grid_map, map_id, canvas_size, resolution, digest, grid_version, origin)
+            if with_pyramid:
+                GridMapStorage._write_pyramid(grid_map, map_id, resolution, origin, canvas_size, digest, grid_version)
+        
+        path = GridMapStorage.get_grid_tiles_path(map_id) if sparse else GridMapStorage.get_grid_map_path(map_id)
+        get_persister().submit(GridMapStorage._grid_key(map_id), write,
+                               content_digest(grid_map, (canvas_size, resolution, digest, origin)), path)
+        return path
+    
+    @staticmethod
+    def _grid_key(map_id: str) -> Tuple[str, str]:
+        """grid_map文件（PNG或分块文件）在后台持久化队列中的键"""
+        return "grid_map", GridMapStorage.get_grid_map_path(map_id)
+    
+    @staticmethod
+    def _instance_key(map_id: str) -> Tuple[str, str]:
+        return "instance_map", GridMapStorage.get_instance_map_path(map_id)
+    
+    @staticmethod
+    def get_write_error(map_id: str) -> Optional[BaseException]:
+        """
+        该地图grid_map或实例标签栅格最近一次写入失败的异常（后台写入时在wait_for_pending之后查询）
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            异常，最近一次写入成功或尚未写入时为None
+        """
+        persister = get_persister()
+        return persister.error(GridMapStorage._grid_key(map_id)) or persister.error(GridMapStorage._instance_key(map_id))
+    
+    @staticmethod
+    def wait_for_pending(map_id: str, timeout: Optional[float] = None) -> bool:
         """
-        从PNG文件加载grid_map
+        等待该地图尚未完成的后台保存（grid_map和实例标签栅格）
         
         Args:
             map_id: 地图ID
+            timeout: 超时时间（秒），None表示一直等待
+            
+        Returns:
+            是否已完成
+        """
+        persister = get_persister()
+        return persister.wait(GridMapStorage._grid_key(map_id), timeout) and \
+            persister.wait(GridMapStorage._instance_key(map_id), timeout)
+    
+    @staticmethod
+    def grid_shape(canvas_size: Tuple[float, float], resolution: float) -> Tuple[int, int]:
+        """
+        画布按分辨率划分后的grid形状
+        
+        Args:
             canvas_size: 画布大小 (width, height)
             resolution: 网格分辨率
             
         Returns:
-            numpy数组，如果文件不存在则返回None
+            (height, width)
+        """
+        width, height = canvas_size
+        return int(round(height / resolution)), int(round(width / resolution))
+    
+    @staticmethod
+    def load_grid_map_from_png(map_id: str, canvas_size: Optional[Tuple[float, float]],
+                              resolution: Optional[float], packed: bool = False,
+                              origin: Optional[Tuple[float, float]] = None) -> Optional[Union[np.ndarray, PackedGrid]]:
+        """
+        从PNG文件加载grid_map。给出画布大小和分辨率时检查图像尺寸和PNG记录的分辨率、原点，
+        不一致（例如按其他分辨率生成的文件）时不加载
+        
+        Args:
+            map_id: 地图ID
+            canvas_size: 画布大小 (width, height)，None表示不检查
+            resolution: 网格分辨率，None表示不检查
+            packed: 为True时返回PackedGrid（1位PNG直接使用解码出的按位数据，不展开）
+            origin: 画布原点，None表示不检查；PNG未记录原点时视为一致
+            
+        Returns:
+            numpy数组（或PackedGrid），如果文件不存在或与地图不一致则返回None
         """
+        GridMapStorage.wait_for_pending(map_id)
         # 构建文件路径
+        file_path = GridMapStorage.get_grid_map_path(map_id)
+        
+        if not os.path.exists(file_path):
+            return None
+        
+        with Image.open(file_path) as img:
+            mismatch = GridMapStorage._metadata_mismatch(img, canvas_size, resolution, origin)
+            if mismatch:
+                print(f"忽略与地图不一致的grid_map PNG {file_path}: {mismatch}")
+                return None
+            return GridMapStorage._decode_image(img, packed)
+    
+    @staticmethod
+    def _metadata_mismatch(img: Image.Image, canvas_size, resolution, origin) -> Optional[str]:
+        """PNG与期望的画布、分辨率、原点不一致的原因，一致时返回None"""
+        info = img.info
+        if resolution is not None:
+            saved = float(info["resolution"]) if "resolution" in info else None
+            if saved is not None and not np.isclose(saved, resolution, rtol=1e-9, atol=0.0):
+                return f"分辨率 {saved} != {resolution}"
+            if canvas_size is not None:
+                width, height = img.size
+                expected = GridMapStorage.grid_shape(canvas_size, resolution)
+                if (height, width) != expected:
+                    return f"形状 {(height, width)} != {expected}"
+        if origin is not None and "origin" in info:
+            saved = tuple(json.loads(info["origin"]))
+            if not np.allclose(saved, origin, rtol=0.0, atol=1e-9):
+                return f"原点 {saved} != {tuple(origin)}"
+        return None
+    
+    @staticmethod
+    def decode_png(file_path: str, packed: bool = False) -> Union[np.ndarray, PackedGrid]:
+        """
+        解码grid_map PNG：1位PNG解码一次即得到0/1数组；兼容旧的8位灰度PNG（按127阈值二值化）
+        
+        Args:
+            file_path: PNG文件路径
+            packed: 为True时返回PackedGrid
+            
+        Returns:
+            uint8数组（0表示障碍物，1表示可通行区域）或PackedGrid
+        """
+        with Image.open(file_path) as img:
+            return GridMapStorage._decode_image(img, packed)
+    
+    @staticmethod
+    def _decode_image(img: Image.Image, packed: bool) -> Union[np.ndarray, PackedGrid]:
+        if img.mode == '1':
+            if packed:
+                img.load()
+                width, height = img.size
+                bits = np.frombuffer(img.tobytes(), dtype=np.uint8).reshape(height, (width + 7) // 8)
+                grid = PackedGrid(bits.copy(), width)
+                grid._clear_padding()
+                return grid
+            # PIL把"1"模式展开为取值0/255的bool数组，原地与1得到0/1
+            grid_map = np.array(img).view(np.uint8)
+            grid_map &= 1
+        else:
+            if img.mode != 'L':
+                img = img.convert('L')
+            grid_map = np.array(img.point(_THRESHOLD_LUT))
+        return PackedGrid.from_array(grid_map) if packed else grid_map
+    
+    @staticmethod
+    def load_many(map_ids: Iterable[str], packed: bool = False,
+                  max_workers: Optional[int] = None) -> Dict[str, Optional[Union[np.ndarray, PackedGrid, TiledGrid]]]:
+        """
+        用线程池批量加载grid_map（PNG解码时不持有GIL，多个文件并行解码）
+        
+        Args:
+            map_ids: 地图ID列表
+            packed: 为True时PNG加载为PackedGrid
+            max_workers: 线程数，None表示使用ThreadPoolExecutor的默认值
+            
+        Returns:
+            map_id -> grid_map（只有分块文件的大地图为TiledGrid，文件不存在时为None）
+        """
+        map_ids = list(dict.fromkeys(map_ids))
+        
+        def load(map_id: str):
+            grid_map = GridMapStorage.load_grid_map_from_png(map_id, None, None, packed)
+            if grid_map is None:
+                grid_map = GridMapStorage.load_grid_map_tiles(map_id)
+            return grid_map
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(map_ids, executor.map(load, map_ids)))
+    
+    @staticmethod
+    def read_png_metadata(map_id: str) -> Optional[dict]:
+        """
+        读取grid_map PNG的元数据（只读取文件头部，不解码图像）
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            {"shape", "bit_depth", "canvas_size", "origin", "resolution", "grid_version", "digest"}，
+            未记录的项为None；文件不存在时返回None
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        file_path = GridMapStorage.get_grid_map_path(map_id)
+        if not os.path.exists(file_path):
+            return None
+        with Image.open(file_path) as img:
+            info = img.info
+            width, height = img.size
+            return {
+                "shape": (height, width),
+                "bit_depth": 1 if img.mode == '1' else 8,
+                "canvas_size": tuple(json.loads(info["canvas_size"])) if "canvas_size" in info else None,
+                "origin": tuple(json.loads(info["origin"])) if "origin" in info else None,
+                "resolution": float(info["resolution"]) if "resolution" in info else None,
+                "grid_version": int(info["grid_version"]) if "grid_version" in info else None,
+                "digest": info.get("grid_digest"),
+            }
+    
+    @staticmethod
+    def get_grid_tiles_path(map_id: str) -> str:
+        """
+        获取分块grid_map文件的路径（与grid_map PNG位于同一目录）
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            npz文件的绝对路径
+        """
         png_dir = config.get_png_directory()
-        filename = f"{map_id}_grid_map.png"
-        file_path = Path(png_dir) / filename
+        filename = f"{map_id}_grid_tiles.npz"
+        return str((Path(png_dir) / filename).absolute())
+    
+    @staticmethod
+    def write_grid_tiles(grid_map: Union[np.ndarray, TiledGrid], file_path: str,
+                         tile_size: Optional[int] = None, digest: Optional[str] = None) -> str:
+        """
+        逐块写入grid_map：取值均匀的块只记录一个值，其余块各自作为一个数组条目写入，
+        不需要组装整张稠密数组
+        
+        Args:
+            grid_map: numpy数组或TiledGrid
+            file_path: npz文件路径
+            tile_size: grid_map为numpy数组时使用的块边长，None表示使用配置值
+            digest: 可选的内容摘要
+            
+        Returns:
+            npz文件路径
+        """
+        if not isinstance(grid_map, TiledGrid):
+            grid_map = TiledGrid(np.asarray(grid_map), tile_size or config.get_sparse_grid_tile_size())
+        fill_value = grid_map.fill_value if grid_map.fill_value is not None else grid_map.dtype.type(1)
+        uniform_keys, uniform_values = [], []
+        arrays = {}
+        for tr, tc, _, tile in grid_map.iter_tiles():
+            if isinstance(tile, np.ndarray):
+                first = tile.flat[0]
+                if not (tile == first).all():
+                    arrays[f"tile_{tr}_{tc}"] = tile
+                    continue
+                tile = first
+            if tile != fill_value:
+                uniform_keys.append((tr, tc))
+                uniform_values.append(tile)
         
-        if not file_path.exists():
+        np.savez_compressed(
+            file_path,
+            shape=np.array(grid_map.shape, dtype=np.int64),
+            tile_size=np.array(grid_map.tile_size, dtype=np.int64),
+            fill_value=np.array(fill_value, dtype=grid_map.dtype),
+            uniform_keys=np.array(uniform_keys, dtype=np.int64).reshape(-1, 2),
+            uniform_values=np.array(uniform_values, dtype=grid_map.dtype),
+            digest=np.array(digest or ""),
+            **arrays,
+        )
+        return file_path
+    
+    @staticmethod
+    def read_grid_tiles(file_path: str) -> TiledGrid:
+        """
+        逐块读取write_grid_tiles写入的文件
+        
+        Args:
+            file_path: npz文件路径
+            
+        Returns:
+            稀疏TiledGrid
+        """
+        with np.load(file_path) as data:
+            fill_value = data["fill_value"]
+            uniform = {(int(tr), int(tc)): value
+                       for (tr, tc), value in zip(data["uniform_keys"], data["uniform_values"])}
+            tiles = {}
+            for name in data.files:
+                if name.startswith("tile_") and name != "tile_size":
+                    _, tr, tc = name.split("_")
+                    tiles[(int(tr), int(tc))] = data[name]
+            return TiledGrid.from_tiles(tuple(int(v) for v in data["shape"]), fill_value.dtype,
+                                        int(data["tile_size"]), fill_value[()], uniform, tiles)
+    
+    @staticmethod
+    def save_grid_map_tiles(grid_map: Union[np.ndarray, TiledGrid], map_id: str,
+                            tile_size: Optional[int] = None, digest: Optional[str] = None) -> str:
+        """
+        逐块保存grid_map（见write_grid_tiles）
+        
+        Args:
+            grid_map: numpy数组或TiledGrid
+            map_id: 地图ID
+            tile_size: grid_map为numpy数组时使用的块边长，None表示使用配置值
+            digest: 可选的内容摘要
+            
+        Returns:
+            npz文件的绝对路径
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        return GridMapStorage._write_tiles(grid_map, map_id, tile_size, digest)
+    
+    @staticmethod
+    def load_grid_map_tiles(map_id: str) -> Optional[TiledGrid]:
+        """
+        逐块加载分块grid_map
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            稀疏TiledGrid，如果文件不存在则返回None
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        file_path = GridMapStorage.get_grid_tiles_path(map_id)
+        if not os.path.exists(file_path):
+            return None
+        return GridMapStorage.read_grid_tiles(file_path)
+    
+    @staticmethod
+    def get_grid_pyramid_path(map_id: str) -> str:
+        """
+        获取多级分块档案的路径（与grid_map PNG位于同一目录）
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            档案的绝对路径
+        """
+        return str((Path(config.get_png_directory()) / f"{map_id}_grid_pyramid{PYRAMID_SUFFIX}").absolute())
+    
+    @staticmethod
+    def _write_pyramid(grid_map, map_id: str, resolution: float, origin: Optional[Tuple[float, float]],
+                       canvas_size: Optional[Tuple[float, float]], digest: Optional[str],
+                       grid_version: Optional[int], tile_size: Optional[int] = None) -> str:
+        Path(config.get_png_directory()).mkdir(parents=True, exist_ok=True)
+        return write_tile_pyramid(grid_map, GridMapStorage.get_grid_pyramid_path(map_id), resolution,
+                                  origin if origin is not None else (0.0, 0.0), tile_size,
+                                  canvas_size=canvas_size, digest=digest, grid_version=grid_version)
+    
+    @staticmethod
+    def save_grid_pyramid(grid_map: Union[np.ndarray, TiledGrid, PackedGrid], map_id: str, resolution: float,
+                          origin: Optional[Tuple[float, float]] = None,
+                          canvas_size: Optional[Tuple[float, float]] = None, tile_size: Optional[int] = None,
+                          digest: Optional[str] = None, grid_version: Optional[int] = None) -> str:
+        """
+        把grid_map保存为多级分块档案（见utils.tile_pyramid）
+        
+        Args:
+            grid_map: numpy数组、TiledGrid或PackedGrid
+            map_id: 地图ID
+            resolution: 网格分辨率
+            origin: 画布原点，None表示(0, 0)
+            canvas_size: 可选的画布大小
+            tile_size: 块边长（格），None表示使用配置值
+            digest: 可选的内容摘要
+            grid_version: 可选的grid版本号
+            
+        Returns:
+            档案的绝对路径
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        return GridMapStorage._write_pyramid(grid_map, map_id, resolution, origin, canvas_size, digest,
+                                             grid_version, tile_size)
+    
+    @staticmethod
+    def open_grid_pyramid(map_id: str) -> Optional[TilePyramid]:
+        """
+        打开地图的多级分块档案（用完后调用close，或用with语句）
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            TilePyramid，档案不存在时返回None
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        file_path = GridMapStorage.get_grid_pyramid_path(map_id)
+        if not os.path.exists(file_path):
+            return None
+        return TilePyramid(file_path)
+    
+    @staticmethod
+    def load_grid_window(map_id: str, bbox_2d: Tuple[float, float, float, float],
+                         resolution: Optional[float] = None) -> Optional[Tuple[np.ndarray, Tuple[float, float], float]]:
+        """
+        从多级分块档案读取世界坐标窗口，只解码与窗口相交的块
+        
+        Args:
+            map_id: 地图ID
+            bbox_2d: (min_x, min_y, max_x, max_y)，世界坐标
+            resolution: 期望的分辨率，使用不粗于它的最粗一级；None表示原始分辨率
+            
+        Returns:
+            (grid, origin, resolution)，含义同TilePyramid.read_window；档案不存在时返回None
+        """
+        pyramid = GridMapStorage.open_grid_pyramid(map_id)
+        if pyramid is None:
             return None
+        with pyramid:
+            return pyramid.read_window(bbox_2d, resolution)
+    
+    @staticmethod
+    def get_saved_grid_digest(map_id: str) -> Optional[str]:
+        """
+        读取已保存的grid_map（PNG或分块文件）记录的内容摘要，只读取文件头部
         
-        # 加载PNG图像
-        img = Image.open(file_path)
-        img_array = np.array(img, dtype=np.uint8)
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            内容摘要，文件不存在或没有记录时返回None
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        return GridMapStorage._read_saved_digest(map_id)
+    
+    @staticmethod
+    def _read_saved_digest(map_id: str) -> Optional[str]:
+        png_path = GridMapStorage.get_grid_map_path(map_id)
+        try:
+            if os.path.exists(png_path):
+                with Image.open(png_path) as img:
+                    # img.text会解码整张图像，文本块位于图像数据之前，直接从info读取
+                    return img.info.get("grid_digest")
+            tiles_path = GridMapStorage.get_grid_tiles_path(map_id)
+            if os.path.exists(tiles_path):
+                with np.load(tiles_path) as data:
+                    if "digest" in data.files:
+                        return str(data["digest"]) or None
+        except Exception:
+            return None
+        return None
+    
+    @staticmethod
+    def get_instance_map_path(map_id: str) -> str:
+        """
+        获取实例标签栅格文件的路径（与grid_map PNG位于同一目录）
         
-        # 转换为0-1的二进制值
-        # 0表示障碍物，1表示可通行区域
-        grid_map = (img_array > 127).astype(np.uint8)
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            npz文件的绝对路径
+        """
+        png_dir = config.get_png_directory()
+        filename = f"{map_id}_instance_map.npz"
+        return str((Path(png_dir) / filename).absolute())
+    
+    @staticmethod
+    def save_instance_map(map_id: str, labels: np.ndarray, object_ids: List[str],
+                          z_min: np.ndarray, z_max: np.ndarray) -> str:
+        """
+        保存实例标签栅格及每格高度范围
         
-        return grid_map
+        Args:
+            map_id: 地图ID
+            labels: 实例标签数组，形状与grid_map相同
+            object_ids: 标签k对应object_ids[k-1]
+            z_min: 每格最低高度
+            z_max: 每格最高高度
+            
+        Returns:
+            npz文件的绝对路径
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        return GridMapStorage._write_instance_map(map_id, labels, object_ids, z_min, z_max)
+    
+    @staticmethod
+    def _write_instance_map(map_id: str, labels: np.ndarray, object_ids: List[str],
+                            z_min: np.ndarray, z_max: np.ndarray) -> str:
+        Path(config.get_png_directory()).mkdir(parents=True, exist_ok=True)
+        file_path = GridMapStorage.get_instance_map_path(map_id)
+        atomic_write(file_path, lambda tmp: np.savez_compressed(
+            tmp, labels=labels, object_ids=np.array(object_ids, dtype=str), z_min=z_min, z_max=z_max))
+        return file_path
+    
+    @staticmethod
+    def persist_instance_map(map_id: str, labels: np.ndarray, object_ids: List[str],
+                             z_min: np.ndarray, z_max: np.ndarray) -> str:
+        """
+        保存实例标签栅格，参数含义同save_instance_map（提交后调用方不能再原地修改这些数组）；
+        内容与该地图最近一次提交的相同且文件仍存在时跳过，写入方式同persist_grid_map
+            
+        Returns:
+            保存完成后文件的绝对路径
+            
+        Raises:
+            Exception: 同步写入时写入失败
+        """
+        path = GridMapStorage.get_instance_map_path(map_id)
+        get_persister().submit(GridMapStorage._instance_key(map_id),
+                               lambda: GridMapStorage._write_instance_map(map_id, labels, object_ids, z_min, z_max),
+                               content_digest(labels, object_ids, z_min, z_max), path)
+        return path
+    
+    @staticmethod
+    def load_instance_map(map_id: str) -> Optional[Tuple[np.ndarray, List[str], np.ndarray, np.ndarray]]:
+        """
+        加载实例标签栅格
+        
+        Args:
+            map_id: 地图ID
+            
+        Returns:
+            (labels, object_ids, z_min, z_max)，如果文件不存在则返回None
+        """
+        GridMapStorage.wait_for_pending(map_id)
+        file_path = GridMapStorage.get_instance_map_path(map_id)
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            return data["labels"], data["object_ids"].tolist(), data["z_min"], data["z_max"]
     
     @staticmethod
     def get_grid_map_path(map_id: str) -> str:
@@ -101,7 +675,7 @@ class GridMapStorage:
     @staticmethod
     def grid_map_exists(map_id: str) -> bool:
         """
-        检查grid_map PNG文件是否存在
+        检查grid_map PNG文件（或分块文件）是否存在
         
         Args:
             map_id: 地图ID
@@ -109,13 +683,14 @@ class GridMapStorage:
         Returns:
             文件是否存在
         """
+        GridMapStorage.wait_for_pending(map_id)
         file_path = GridMapStorage.get_grid_map_path(map_id)
-        return os.path.exists(file_path)
+        return os.path.exists(file_path) or os.path.exists(GridMapStorage.get_grid_tiles_path(map_id))
     
     @staticmethod
     def delete_grid_map(map_id: str) -> bool:
         """
-        删除grid_map PNG文件
+        删除grid_map PNG文件（及分块文件、多级分块档案）
         
         Args:
             map_id: 地图ID
@@ -123,11 +698,25 @@ class GridMapStorage:
         Returns:
             是否成功删除
         """
+        GridMapStorage.wait_for_pending(map_id)
+        # 文件删除后，内容相同的保存也要重新写入
+        persister = get_persister()
+        persister.forget(GridMapStorage._grid_key(map_id))
+        persister.forget(GridMapStorage._instance_key(map_id))
         file_path = GridMapStorage.get_grid_map_path(map_id)
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
-            return False
+            # 实例标签栅格随grid_map一起删除
+            instance_path = GridMapStorage.get_instance_map_path(map_id)
+            if os.path.exists(instance_path):
+                os.remove(instance_path)
+            deleted = False
+            pyramid_path = GridMapStorage.get_grid_pyramid_path(map_id)
+            if os.path.exists(pyramid_path):
+                os.remove(pyramid_path)
+            for path in (file_path, GridMapStorage.get_grid_tiles_path(map_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+                    deleted = True
+            return deleted
         except Exception:
             return False 
\ No newline at end of file
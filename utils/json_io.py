@@ -0,0 +1,205 @@
+"""
+地图JSON的读写
+- 流式读取：按块读取文件，逐个解码顶层字段；指定的字段（例如物体表 "objects"）按成员逐个解码，
+  任何时刻只持有当前成员的解析结果，不需要先把整个文件解析成一棵完整的对象树
+- 序列化：可选紧凑格式（无缩进）；安装了orjson时默认用orjson编码，否则使用标准库json
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Tuple
+from utils.config import config
+
+try:
+    import orjson
+except ImportError:  # orjson是可选依赖
+    orjson = None
+
+JSON_BACKENDS = ("orjson", "json")
+DEFAULT_CHUNK_SIZE = 1 << 20
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# 数字之后直到缓冲区末尾都是数字字符时，数字可能被块边界截断
+_NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*\Z")
+
+
+def orjson_available() -> bool:
+    """检查orjson是否可用"""
+    return orjson is not None
+
+
+def get_json_backend() -> str:
+    """
+    获取按配置生效的JSON编码后端
+
+    Returns:
+        "orjson" 或 "json"
+
+    Raises:
+        ValueError: 后端名称无效，或指定了orjson但未安装
+    """
+    name = config.get_json_backend()
+    if name == "auto":
+        return "orjson" if orjson_available() else "json"
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"不支持的JSON后端: {name}，可选: auto, {', '.join(JSON_BACKENDS)}")
+    if name == "orjson" and not orjson_available():
+        raise ValueError("未安装orjson，无法使用orjson后端")
+    return name
+
+
+def _orjson_default(value):
+    # numpy标量数组等之外的float/int子类交回Python类型
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, int):
+        return int(value)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"无法序列化为JSON的类型: {type(value).__name__}")
+
+
+def dumps(data: Any, compact: bool = False) -> bytes:
+    """
+    编码为UTF-8的JSON
+
+    Args:
+        data: 待编码的数据
+        compact: True时不缩进、不加多余空格，否则缩进2格
+
+    Returns:
+        UTF-8字节串
+    """
+    if get_json_backend() == "orjson":
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_SUBCLASS
+        if not compact:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_orjson_default, option=option)
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def write_json(path: str, data: Any, compact: Optional[bool] = None) -> str:
+    """
+    写入JSON文件（目录不存在时创建）
+
+    Args:
+        path: 文件路径
+        data: 待编码的数据
+        compact: 是否使用紧凑格式，None表示使用配置值
+
+    Returns:
+        文件的绝对路径
+    """
+    if compact is None:
+        compact = config.get_json_compact()
+    file_path = Path(path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(dumps(data, compact))
+    return str(file_path.absolute())
+
+
+class _JsonStreamReader:
+    """在按块读入的文本缓冲区上逐个解码JSON值"""
+
+    def __init__(self, f, chunk_size: int):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """丢弃已解码的部分并读入更多内容，至少读入与未解码部分等长的内容，使大值的重试次数为对数级"""
+        if self._eof:
+            return False
+        chunk = self._f.read(max(self._chunk_size, len(self._buf) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符，文件结束时返回空串"""
+        while True:
+            pos = self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if pos < len(self._buf):
+                return self._buf[pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"期望 {char!r}，实际为 {found!r}", self._buf, self._pos)
+        self._pos += 1
+
+    def value(self) -> Any:
+        """解码下一个完整的JSON值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # 值被块边界截断，读入更多内容后重试
+                if self._fill():
+                    continue
+                raise
+            # 数字可能被块边界截断（"12" 实为 "123"，"1" 实为 "1.5" 或 "1e5"）
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                    _NUMBER_TAIL.match(self._buf, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def keys(self) -> Iterator[str]:
+        """
+        逐个读取对象的键；每次产出键后，调用方必须先读取对应的值（value()或嵌套的keys()）再继续迭代
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError("对象的键必须是字符串", self._buf, self._pos)
+            self.expect(":")
+            yield key
+            if self.peek() == "}":
+                self._pos += 1
+                return
+            self.expect(",")
+
+
+def iter_json_object(path: str, stream_keys: Iterable[str] = ("objects",),
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    流式读取顶层为对象的JSON文件
+
+    Args:
+        path: 文件路径
+        stream_keys: 这些字段的值为对象时按成员逐个解码
+        chunk_size: 每次读取的字符数
+
+    Returns:
+        (key, value) 的迭代器；stream_keys中的字段产出 (key, members)，members为 (成员键, 成员值) 的迭代器，
+        需要在继续外层迭代之前用完（未用完的部分会被跳过）
+    """
+    stream_keys = frozenset(stream_keys)
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _JsonStreamReader(f, chunk_size)
+        for key in reader.keys():
+            if key in stream_keys and reader.peek() == "{":
+                members = ((member, reader.value()) for member in reader.keys())
+                yield key, members
+                for _ in members:
+                    pass
+            else:
+                yield key, reader.value()
+        if reader.peek() != "":
+            raise json.JSONDecodeError("顶层对象之后还有多余内容", reader._buf, reader._pos)
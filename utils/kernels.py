@@ -0,0 +1,565 @@
+"""
+计算内核
+热点循环（A*扩展、障碍物膨胀、矩形栅格化、路径遍历、多边形点包含测试）的统一入口。
+安装了numba时使用JIT编译的循环实现，否则使用语义一致的纯numpy实现。
+"""
+
+import heapq
+import math
+from typing import List, Optional, Tuple
+import numpy as np
+from core.bitgrid import PackedGrid
+from utils.config import config
+
+try:
+    import numba
+except ImportError:  # numba是可选依赖
+    numba = None
+
+BACKENDS = ("numba", "numpy")
+_backend = None
+
+
+def numba_available() -> bool:
+    """检查numba是否可用"""
+    return numba is not None
+
+
+def set_backend(name: str) -> str:
+    """
+    切换计算后端
+
+    Args:
+        name: "auto"、"numba" 或 "numpy"；auto表示有numba时用numba
+
+    Returns:
+        实际生效的后端名称
+
+    Raises:
+        ValueError: 后端名称无效，或指定了numba但未安装
+    """
+    global _backend
+    if name == "auto":
+        name = "numba" if numba_available() else "numpy"
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的计算后端: {name}，可选: auto, {', '.join(BACKENDS)}")
+    if name == "numba" and not numba_available():
+        raise ValueError("未安装numba，无法使用numba后端")
+    _backend = name
+    return _backend
+
+
+def get_backend() -> str:
+    """获取当前生效的计算后端"""
+    if _backend is None:
+        set_backend(config.get_compute_backend())
+    return _backend
+
+
+def report_backend() -> str:
+    """
+    打印并返回当前计算后端信息
+
+    Returns:
+        后端描述字符串
+    """
+    backend = get_backend()
+    if backend == "numba":
+        info = f"计算后端: numba {numba.__version__} (JIT)"
+    elif numba_available():
+        info = "计算后端: numpy（已安装numba，但被配置禁用）"
+    else:
+        info = "计算后端: numpy（未安装numba）"
+    print(info)
+    return info
+
+
+# ---------------------------------------------------------------------------
+# 循环实现（numba编译目标）
+# ---------------------------------------------------------------------------
+
+def _inflate_loops(grid_map, expand_cells):
+    height, width = grid_map.shape
+    # 先按行再按列做可分离的方形膨胀
+    row_pass = grid_map.copy()
+    for row in range(height):
+        last_obstacle = -expand_cells - 1
+        for col in range(width + expand_cells):
+            if col < width and grid_map[row, col] == 0:
+                last_obstacle = col
+            target = col - expand_cells
+            # 右侧窗口内的障碍在扫描到col时记录，回填target
+            if target >= 0 and col - last_obstacle <= 2 * expand_cells:
+                row_pass[row, target] = 0
+    expanded = row_pass.copy()
+    for col in range(width):
+        last_obstacle = -expand_cells - 1
+        for row in range(height + expand_cells):
+            if row < height and row_pass[row, col] == 0:
+                last_obstacle = row
+            target = row - expand_cells
+            if target >= 0 and row - last_obstacle <= 2 * expand_cells:
+                expanded[target, col] = 0
+    return expanded
+
+
+def _rasterize_loops(grid_map, boxes, resolution, centered, value):
+    height, width = grid_map.shape
+    offset = 0.5 if centered else 0.0
+    for i in range(boxes.shape[0]):
+        min_x, min_y, max_x, max_y = boxes[i, 0], boxes[i, 1], boxes[i, 2], boxes[i, 3]
+        for row in range(height):
+            y = (row + offset) * resolution
+            if centered:
+                inside_y = min_y <= y <= max_y
+            else:
+                inside_y = min_y <= y < max_y
+            if not inside_y:
+                continue
+            for col in range(width):
+                x = (col + offset) * resolution
+                if centered:
+                    inside_x = min_x <= x <= max_x
+                else:
+                    inside_x = min_x <= x < max_x
+                if inside_x:
+                    grid_map[row, col] = value
+
+
+def _heap_less(heap_f, heap_r, heap_c, i, j):
+    if heap_f[i] != heap_f[j]:
+        return heap_f[i] < heap_f[j]
+    if heap_r[i] != heap_r[j]:
+        return heap_r[i] < heap_r[j]
+    return heap_c[i] < heap_c[j]
+
+
+def _astar_loops(free_map, start_row, start_col, goal_row, goal_col):
+    height, width = free_map.shape
+    n = height * width
+    g_score = np.full(n, np.inf)
+    came_from = np.full(n, -1, dtype=np.int64)
+    capacity = 1024
+    heap_f = np.empty(capacity)
+    heap_r = np.empty(capacity, dtype=np.int64)
+    heap_c = np.empty(capacity, dtype=np.int64)
+    size = 0
+    dirs_r = np.array([-1, 1, 0, 0, -1, -1, 1, 1])
+    dirs_c = np.array([0, 0, -1, 1, -1, 1, -1, 1])
+
+    g_score[start_row * width + start_col] = 0.0
+    heap_f[0] = 0.0
+    heap_r[0] = start_row
+    heap_c[0] = start_col
+    size = 1
+    while size > 0:
+        # 弹出堆顶（按 f, row, col 字典序，与heapq对元组的比较一致）
+        row = heap_r[0]
+        col = heap_c[0]
+        size -= 1
+        heap_f[0] = heap_f[size]
+        heap_r[0] = heap_r[size]
+        heap_c[0] = heap_c[size]
+        i = 0
+        while True:
+            left = 2 * i + 1
+            if left >= size:
+                break
+            child = left
+            if left + 1 < size and _heap_less(heap_f, heap_r, heap_c, left + 1, left):
+                child = left + 1
+            if _heap_less(heap_f, heap_r, heap_c, child, i):
+                heap_f[i], heap_f[child] = heap_f[child], heap_f[i]
+                heap_r[i], heap_r[child] = heap_r[child], heap_r[i]
+                heap_c[i], heap_c[child] = heap_c[child], heap_c[i]
+                i = child
+            else:
+                break
+
+        current = row * width + col
+        if row == goal_row and col == goal_col:
+            length = 1
+            node = current
+            while came_from[node] != -1:
+                node = came_from[node]
+                length += 1
+            path = np.empty(length, dtype=np.int64)
+            node = current
+            for k in range(length - 1, -1, -1):
+                path[k] = node
+                node = came_from[node]
+            return path
+
+        for d in range(8):
+            nr = row + dirs_r[d]
+            nc = col + dirs_c[d]
+            if nr < 0 or nr >= height or nc < 0 or nc >= width:
+                continue
+            if free_map[nr, nc] == 0:
+                continue
+            neighbor = nr * width + nc
+            step = math.sqrt(float(dirs_r[d] * dirs_r[d] + dirs_c[d] * dirs_c[d]))
+            tentative_g = g_score[current] + step
+            if tentative_g < g_score[neighbor]:
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g
+                gr = nr - goal_row
+                gc = nc - goal_col
+                f = tentative_g + math.sqrt(float(gr * gr + gc * gc))
+                if size == capacity:
+                    capacity *= 2
+                    new_f = np.empty(capacity)
+                    new_r = np.empty(capacity, dtype=np.int64)
+                    new_c = np.empty(capacity, dtype=np.int64)
+                    new_f[:size] = heap_f[:size]
+                    new_r[:size] = heap_r[:size]
+                    new_c[:size] = heap_c[:size]
+                    heap_f, heap_r, heap_c = new_f, new_r, new_c
+                # 压入并上浮
+                i = size
+                heap_f[i] = f
+                heap_r[i] = nr
+                heap_c[i] = nc
+                size += 1
+                while i > 0:
+                    parent = (i - 1) // 2
+                    if _heap_less(heap_f, heap_r, heap_c, i, parent):
+                        heap_f[i], heap_f[parent] = heap_f[parent], heap_f[i]
+                        heap_r[i], heap_r[parent] = heap_r[parent], heap_r[i]
+                        heap_c[i], heap_c[parent] = heap_c[parent], heap_c[i]
+                        i = parent
+                    else:
+                        break
+    return np.empty(0, dtype=np.int64)
+
+
+def _path_hit_loops(grid_map, points, resolution, sample_step):
+    height, width = grid_map.shape
+    for idx in range(points.shape[0] - 1):
+        x0, y0 = points[idx, 0], points[idx, 1]
+        dx = points[idx + 1, 0] - x0
+        dy = points[idx + 1, 1] - y0
+        dist = (dx ** 2 + dy ** 2) ** 0.5
+        steps = max(2, int(dist / sample_step) + 1)
+        for s in range(steps + 1):
+            t = s / steps
+            col = int((x0 + t * dx) // resolution)
+            row = int((y0 + t * dy) // resolution)
+            if 0 <= row < height and 0 <= col < width:
+                if grid_map[row, col] == 0:
+                    return True
+    return False
+
+
+def _points_in_polygon_loops(xs, ys, polygon, eps):
+    n = polygon.shape[0]
+    result = np.zeros(xs.shape[0], dtype=np.bool_)
+    for k in range(xs.shape[0]):
+        x, y = xs[k], ys[k]
+        inside = False
+        on_edge = False
+        for i in range(n):
+            x1, y1 = polygon[i, 0], polygon[i, 1]
+            x2, y2 = polygon[(i + 1) % n, 0], polygon[(i + 1) % n, 1]
+            cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+            if (abs(cross) <= eps and min(x1, x2) - eps <= x <= max(x1, x2) + eps
+                    and min(y1, y2) - eps <= y <= max(y1, y2) + eps):
+                on_edge = True
+                break
+            if (y1 > y) != (y2 > y):
+                x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                if x < x_cross:
+                    inside = not inside
+        result[k] = inside or on_edge
+    return result
+
+
+if numba is not None:
+    _inflate_numba = numba.njit(cache=True)(_inflate_loops)
+    _rasterize_numba = numba.njit(cache=True)(_rasterize_loops)
+    _heap_less = numba.njit(cache=True)(_heap_less)
+    _astar_numba = numba.njit(cache=True)(_astar_loops)
+    _path_hit_numba = numba.njit(cache=True)(_path_hit_loops)
+    _points_in_polygon_numba = numba.njit(cache=True)(_points_in_polygon_loops)
+
+
+# ---------------------------------------------------------------------------
+# numpy实现
+# ---------------------------------------------------------------------------
+
+def _window_any(mask: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """沿某一轴判断 [i - radius, i + radius] 窗口内是否存在True"""
+    length = mask.shape[axis]
+    cumsum = np.cumsum(mask, axis=axis, dtype=np.int64)
+    zero_shape = list(mask.shape)
+    zero_shape[axis] = 1
+    cumsum = np.concatenate([np.zeros(zero_shape, dtype=np.int64), cumsum], axis=axis)
+    idx = np.arange(length)
+    hi = np.minimum(idx + radius + 1, length)
+    lo = np.maximum(idx - radius, 0)
+    return (np.take(cumsum, hi, axis=axis) - np.take(cumsum, lo, axis=axis)) > 0
+
+
+def _inflate_numpy(grid_map: np.ndarray, expand_cells: int) -> np.ndarray:
+    obstacles = grid_map == 0
+    dilated = _window_any(_window_any(obstacles, expand_cells, axis=1), expand_cells, axis=0)
+    expanded = grid_map.copy()
+    expanded[dilated] = 0
+    return expanded
+
+
+def _rasterize_numpy(grid_map: np.ndarray, boxes: np.ndarray, resolution: float, centered: bool, value: int):
+    shape = grid_map.shape
+    for box in boxes:
+        r0, r1, c0, c1 = cell_window(box, resolution, shape, centered)
+        if c0 < c1 and r0 < r1:
+            grid_map[r0:r1, c0:c1] = value
+
+
+def _astar_python(free_map: np.ndarray, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[int]]:
+    height, width = free_map.shape
+    free = free_map.ravel().tolist()
+    goal_row, goal_col = goal
+    start_cell = start[0] * width + start[1]
+    g_score = {start_cell: 0.0}
+    came_from = {}
+    open_set = [(0.0, start[0], start[1])]
+    dirs = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+    steps = [math.sqrt(float(dr * dr + dc * dc)) for dr, dc in dirs]
+    while open_set:
+        _, row, col = heapq.heappop(open_set)
+        current = row * width + col
+        if row == goal_row and col == goal_col:
+            path = [current]
+            while current in came_from:
+                current = came_from[current]
+                path.append(current)
+            path.reverse()
+            return path
+        g_current = g_score[current]
+        for (dr, dc), step in zip(dirs, steps):
+            nr, nc = row + dr, col + dc
+            if not (0 <= nr < height and 0 <= nc < width):
+                continue
+            neighbor = nr * width + nc
+            if free[neighbor] == 0:
+                continue
+            tentative_g = g_current + step
+            if tentative_g < g_score.get(neighbor, math.inf):
+                came_from[neighbor] = current
+                g_score[neighbor] = tentative_g
+                gr, gc = nr - goal_row, nc - goal_col
+                heapq.heappush(open_set, (tentative_g + math.sqrt(float(gr * gr + gc * gc)), nr, nc))
+    return None
+
+
+def _path_hit_numpy(grid_map: np.ndarray, points: np.ndarray, resolution: float, sample_step: float) -> bool:
+    if len(points) < 2:
+        return False
+    height, width = grid_map.shape
+    p0 = points[:-1]
+    d = points[1:] - p0
+    dist = (d[:, 0] ** 2 + d[:, 1] ** 2) ** 0.5
+    steps = np.maximum(2, (dist / sample_step).astype(np.int64) + 1)
+    seg = np.repeat(np.arange(len(steps)), steps + 1)
+    offsets = np.concatenate([[0], np.cumsum(steps + 1)[:-1]])
+    t = (np.arange(len(seg)) - offsets[seg]) / steps[seg]
+    # floor_divide与Python的 // 语义一致（与 floor(x / y) 在边界处可能不同）
+    cols = np.floor_divide(p0[seg, 0] + t * d[seg, 0], resolution).astype(np.int64)
+    rows = np.floor_divide(p0[seg, 1] + t * d[seg, 1], resolution).astype(np.int64)
+    valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    return bool(np.any(grid_map[rows[valid], cols[valid]] == 0))
+
+
+def _points_in_polygon_numpy(xs: np.ndarray, ys: np.ndarray, polygon: np.ndarray, eps: float) -> np.ndarray:
+    inside = np.zeros(xs.shape[0], dtype=bool)
+    on_edge = np.zeros(xs.shape[0], dtype=bool)
+    n = polygon.shape[0]
+    for i in range(n):
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[(i + 1) % n]
+        cross = (x2 - x1) * (ys - y1) - (y2 - y1) * (xs - x1)
+        on_edge |= ((np.abs(cross) <= eps)
+                    & (xs >= min(x1, x2) - eps) & (xs <= max(x1, x2) + eps)
+                    & (ys >= min(y1, y2) - eps) & (ys <= max(y1, y2) + eps))
+        straddle = (y1 > ys) != (y2 > ys)
+        if y1 != y2:
+            x_cross = x1 + (ys - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= straddle & (xs < x_cross)
+    return inside | on_edge
+
+
+# ---------------------------------------------------------------------------
+# 对外接口
+# ---------------------------------------------------------------------------
+
+def cell_window(bbox_2d, resolution: float, shape: Tuple[int, int], centered: bool = False,
+                origin: Tuple[float, float] = (0.0, 0.0)) -> Tuple[int, int, int, int]:
+    """
+    计算被2D矩形覆盖的连续格子区间
+
+    Args:
+        bbox_2d: (min_x, min_y, max_x, max_y)，世界坐标
+        resolution: 网格分辨率
+        shape: grid map形状 (height, width)
+        centered: 判断规则，含义同rasterize_boxes
+        origin: grid第(0, 0)格左下角的世界坐标
+
+    Returns:
+        (row_start, row_end, col_start, col_end)，左闭右开；区间可能为空
+    """
+    height, width = shape
+    min_x, min_y, max_x, max_y = bbox_2d
+    if origin[0] or origin[1]:
+        ox, oy = origin
+        min_x, min_y, max_x, max_y = min_x - ox, min_y - oy, max_x - ox, max_y - oy
+    offset = 0.5 if centered else 0.0
+    # 与逐格判断使用完全相同的浮点表达式，再用二分查找得到连续的行列区间
+    xs = (np.arange(width) + offset) * resolution
+    ys = (np.arange(height) + offset) * resolution
+    upper_side = "right" if centered else "left"
+    c0 = int(np.searchsorted(xs, min_x, side="left"))
+    c1 = int(np.searchsorted(xs, max_x, side=upper_side))
+    r0 = int(np.searchsorted(ys, min_y, side="left"))
+    r1 = int(np.searchsorted(ys, max_y, side=upper_side))
+    return r0, r1, c0, c1
+
+
+def to_grid_frame(boxes, origin: Tuple[float, float]) -> np.ndarray:
+    """
+    把世界坐标系下的边界框平移到grid坐标系（grid第(0, 0)格左下角为原点）
+
+    Args:
+        boxes: (N, 4) 的2D边界框 (min_x, min_y, max_x, max_y) 或 (N, 6) 的3D边界框
+        origin: grid第(0, 0)格左下角的世界坐标
+
+    Returns:
+        平移后的新数组；原点为(0, 0)时直接返回输入
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if not (origin[0] or origin[1]):
+        return boxes
+    boxes = boxes.copy()
+    if boxes.shape[-1] == 6:
+        boxes[..., [0, 3]] -= origin[0]
+        boxes[..., [1, 4]] -= origin[1]
+    else:
+        boxes[..., [0, 2]] -= origin[0]
+        boxes[..., [1, 3]] -= origin[1]
+    return boxes
+
+
+def inflate_obstacles(grid_map: np.ndarray, expand_cells: int) -> np.ndarray:
+    """
+    方形膨胀障碍物：每个障碍格子周围expand_cells范围内（越界部分裁剪）都标记为障碍
+
+    Args:
+        grid_map: 网格地图，0为障碍，1为可通行
+        expand_cells: 膨胀格子数
+
+    Returns:
+        膨胀后的新地图
+    """
+    # 位压缩栅格直接在压缩数据上膨胀
+    if isinstance(grid_map, PackedGrid):
+        return grid_map.inflate(expand_cells)
+    # 分块栅格（TiledGrid）先组装为完整数组
+    grid_map = np.asarray(grid_map)
+    if expand_cells <= 0:
+        return grid_map.copy()
+    if get_backend() == "numba":
+        return _inflate_numba(np.ascontiguousarray(grid_map), int(expand_cells))
+    return _inflate_numpy(grid_map, int(expand_cells))
+
+
+def rasterize_boxes(grid_map: np.ndarray, boxes, resolution: float, centered: bool = False, value: int = 0):
+    """
+    将一组2D矩形原地写入grid map
+
+    Args:
+        grid_map: 网格地图（原地修改）
+        boxes: (N, 4) 的 (min_x, min_y, max_x, max_y)
+        resolution: 网格分辨率
+        centered: False时以格子左下角判断、右上边界开区间（与全量生成一致）；
+                  True时以格子中心判断、闭区间（与增量更新一致）
+        value: 写入的值，默认0（障碍）
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return
+    if get_backend() == "numba":
+        _rasterize_numba(grid_map, boxes, float(resolution), bool(centered), grid_map.dtype.type(value))
+    else:
+        _rasterize_numpy(grid_map, boxes, resolution, centered, value)
+
+
+def astar_grid(free_map: np.ndarray, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+    """
+    8邻域网格A*，代价为欧氏步长，启发式为到终点的欧氏距离；
+    堆按 (f, row, col) 排序
+
+    Args:
+        free_map: 网格地图，0为障碍，非0为可通行（numpy数组，或PackedGrid、TiledGrid等可转换为数组的栅格）
+        start: 起点格子 (row, col)
+        goal: 终点格子 (row, col)
+
+    Returns:
+        从起点到终点的格子列表，若无路则返回None
+    """
+    # 位压缩或分块的栅格先展开为uint8数组
+    free_map = np.asarray(free_map)
+    width = free_map.shape[1]
+    if get_backend() == "numba":
+        cells = _astar_numba(np.ascontiguousarray(free_map), int(start[0]), int(start[1]), int(goal[0]), int(goal[1]))
+        if len(cells) == 0:
+            return None
+        cells = cells.tolist()
+    else:
+        cells = _astar_python(free_map, start, goal)
+        if cells is None:
+            return None
+    return [divmod(cell, width) for cell in cells]
+
+
+def path_hits_obstacle(grid_map: np.ndarray, points, resolution: float, sample_step: float) -> bool:
+    """
+    对折线每一段按sample_step采样，判断是否有采样点落在障碍格上（越界点忽略）
+
+    Args:
+        grid_map: 网格地图，0为障碍，1为可通行
+        points: 折线顶点 [(x, y), ...]
+        resolution: 网格分辨率
+        sample_step: 采样步长
+
+    Returns:
+        是否碰撞
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    # 分块栅格（TiledGrid）走按点取值的numpy实现，不组装完整数组
+    if get_backend() == "numba" and isinstance(grid_map, np.ndarray):
+        return bool(_path_hit_numba(grid_map, points, float(resolution), float(sample_step)))
+    return _path_hit_numpy(grid_map, points, resolution, sample_step)
+
+
+def points_in_polygon(xs: np.ndarray, ys: np.ndarray, polygon, eps: float = 1e-12) -> np.ndarray:
+    """
+    批量判断点是否被多边形覆盖（内部或边界上）
+
+    Args:
+        xs, ys: 点坐标数组
+        polygon: 多边形顶点 [(x, y), ...]
+        eps: 判断点在边上的容差
+
+    Returns:
+        布尔数组
+    """
+    xs = np.asarray(xs, dtype=np.float64).ravel()
+    ys = np.asarray(ys, dtype=np.float64).ravel()
+    polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    if get_backend() == "numba":
+        return _points_in_polygon_numba(xs, ys, polygon, float(eps))
+    return _points_in_polygon_numpy(xs, ys, polygon, eps)
+
+
+if config.get_report_backend():
+    report_backend()
@@ -0,0 +1,192 @@
+"""
+进程内地图缓存
+按文件路径缓存已加载的地图，命中时不再读盘和解码JSON/PNG。
+条目记录地图文件及其grid map文件（PNG、分块文件、实例标签栅格）的修改时间和大小，任一文件变化即视为过期。
+缓存的地图被冻结，调用方默认得到独立的可写副本（grid_map可原地修改，不影响缓存，省去读盘和解码），
+也可以直接共享只读的缓存地图；按grid占用的内存计算总量，超出上限时淘汰最久未使用的条目。
+"""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from core.data_structures import MapRepresentation
+from utils.config import config
+from utils.grid_map_storage import GridMapStorage
+from utils.map_container import is_map_container
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """文件的 (修改时间ns, 大小)，文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def map_nbytes(map_rep: MapRepresentation) -> int:
+    """
+    估算地图的grid内存占用（grid map及实例标签栅格）
+
+    Args:
+        map_rep: 地图
+
+    Returns:
+        字节数
+    """
+    total = map_rep._grid_store.nbytes if map_rep._grid_store is not None else 0
+    if map_rep.instance_map is not None:
+        im = map_rep.instance_map
+        total += im.labels.nbytes + im.z_min.nbytes + im.z_max.nbytes
+    return total
+
+
+class _CachedMap:
+    def __init__(self, map_rep: MapRepresentation, files: Dict[str, Optional[Tuple[int, int]]], nbytes: int):
+        self.map_rep = map_rep
+        self.files = files
+        self.nbytes = nbytes
+
+
+class MapCache:
+    """按路径缓存已加载地图的LRU缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[str, _CachedMap]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._entries
+
+    @staticmethod
+    def _dependent_files(path: str, map_rep: MapRepresentation) -> list:
+        """加载地图时读取的grid文件（二进制容器自带grid，没有附属文件）"""
+        if is_map_container(path):
+            return []
+        return [GridMapStorage.get_grid_map_path(map_rep.map_id),
+                GridMapStorage.get_grid_tiles_path(map_rep.map_id),
+                GridMapStorage.get_instance_map_path(map_rep.map_id)]
+
+    def _is_fresh(self, entry: _CachedMap) -> bool:
+        GridMapStorage.wait_for_pending(entry.map_rep.map_id)
+        return all(_file_signature(file) == signature for file, signature in entry.files.items())
+
+    def get(self, path: str, loader: Callable[[str], MapRepresentation], read_only: bool = False) -> MapRepresentation:
+        """
+        获取地图，未命中或文件已变化时用loader加载并缓存
+
+        Args:
+            path: 地图文件路径
+            loader: 加载函数，参数为文件路径
+            read_only: 为True时直接返回共享的只读地图（修改会抛出TypeError），
+                       否则返回独立的可写副本（物体和grid都不与缓存共享）
+
+        Returns:
+            MapRepresentation
+        """
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not self._is_fresh(entry):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._remove(key)
+                    self.invalidations += 1
+            entry = None
+        if entry is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            # 先记录文件状态再加载，加载期间文件被修改时下次访问会重新加载
+            signature = _file_signature(key)
+            map_rep = loader(path)
+            GridMapStorage.wait_for_pending(map_rep.map_id)
+            files = {key: signature}
+            for file in self._dependent_files(key, map_rep):
+                files[file] = _file_signature(file)
+            map_rep.freeze()
+            entry = _CachedMap(map_rep, files, map_nbytes(map_rep))
+            self._put(key, entry)
+        return entry.map_rep if read_only else copy.deepcopy(entry.map_rep)
+
+    def _put(self, key: str, entry: _CachedMap):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if entry.nbytes > self.max_bytes:
+                # 单个地图超过上限时不缓存
+                return
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.nbytes -= entry.nbytes
+
+    def invalidate(self, path: Optional[str] = None):
+        """
+        移除一个地图（path为None时清空缓存）
+
+        Args:
+            path: 地图文件路径
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.nbytes = 0
+                return
+            key = os.path.abspath(path)
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """命中/未命中/淘汰/失效次数及当前条目数和内存占用"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_map_cache: Optional[MapCache] = None
+
+
+def get_map_cache() -> Optional[MapCache]:
+    """
+    获取按配置创建的全局地图缓存
+
+    Returns:
+        MapCache，配置中禁用时返回None
+    """
+    global _map_cache
+    if not config.get_map_cache_enabled():
+        return None
+    max_bytes = config.get_map_cache_max_bytes()
+    if _map_cache is None:
+        _map_cache = MapCache(max_bytes)
+    elif _map_cache.max_bytes != max_bytes:
+        _map_cache.max_bytes = max_bytes
+    return _map_cache
@@ -0,0 +1,225 @@
+"""
+单文件二进制地图容器（.navimap）
+一个文件保存物体（列式）、画布、分辨率和grid map：
+
+    [0, 8)    魔数 b"NAVIMAP\\0"
+    [8, 12)   格式版本 (uint32, 小端)
+    [12, 16)  头部长度 (uint32, 小端)
+    [16, ...) UTF-8 JSON头部：地图元数据、物体键/id/标签表，以及各数据段的偏移、dtype和形状
+    之后      各数据段（按64字节对齐、不压缩）：position/size (N, 3) float64、label_codes (N,) uint32、
+              grid (H, W) uint8
+
+grid段可以直接np.memmap，加载时没有解码开销；并提供与现有JSON+PNG之间的互相转换。
+"""
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+from core.data_structures import MapRepresentation, MapObject, SourceType
+
+MAGIC = b"NAVIMAP\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+CONTAINER_SUFFIX = ".navimap"
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_map_container(path: str) -> bool:
+    """
+    判断文件是否为二进制地图容器（按魔数判断）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        是否为地图容器
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save_map_container(map_rep: MapRepresentation, path: str, resolution: Optional[float] = None) -> str:
+    """
+    把地图保存为单个二进制容器文件
+
+    Args:
+        map_rep: 地图
+        path: 保存路径
+        resolution: grid map的分辨率，None时使用地图记录的分辨率或配置默认值
+
+    Returns:
+        保存文件的绝对路径
+    """
+    if resolution is None:
+        resolution = map_rep.grid_resolution or map_rep.resolution
+    keys = list(map_rep.objects)
+    objects = [map_rep.objects[key] for key in keys]
+    labels = sorted({obj.label for obj in objects})
+    label_code = {label: k for k, label in enumerate(labels)}
+
+    arrays: Dict[str, np.ndarray] = {
+        "position": np.array([obj.position for obj in objects], dtype="<f8").reshape(-1, 3),
+        "size": np.array([obj.size for obj in objects], dtype="<f8").reshape(-1, 3),
+        "label_codes": np.array([label_code[obj.label] for obj in objects], dtype="<u4"),
+    }
+    if map_rep.grid_shape is not None:
+        arrays["grid"] = np.ascontiguousarray(np.asarray(map_rep.grid_map), dtype=np.uint8)
+
+    header = {
+        "map_id": map_rep.map_id,
+        "source_type": map_rep.source_type.value,
+        "scene_description": map_rep.scene_description,
+        "canvas_size": list(map_rep.canvas_size) if map_rep.canvas_size is not None else None,
+        "resolution": resolution,
+        "origin": list(map_rep.origin),
+        "keys": keys,
+        # id与键相同时不重复保存
+        "ids": [obj.id if obj.id != key else None for key, obj in zip(keys, objects)],
+        "labels": labels,
+        "sections": {},
+    }
+    # 先用占位偏移估算头部长度，再确定各数据段位置
+    for name, array in arrays.items():
+        header["sections"][name] = {"offset": 0, "dtype": array.dtype.str, "shape": list(array.shape)}
+    header_len = len(json.dumps(header, ensure_ascii=False).encode("utf-8")) + 32 * len(arrays)
+    offset = _align(_PREAMBLE.size + header_len)
+    for name, array in arrays.items():
+        header["sections"][name]["offset"] = offset
+        offset = _align(offset + array.nbytes)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    header_bytes += b" " * (header_len - len(header_bytes))
+
+    save_path = Path(path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = save_path.with_name(save_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(header["sections"][name]["offset"])
+            array.tofile(f)
+        f.truncate(offset)
+    os.replace(tmp_path, save_path)
+    return str(save_path.absolute())
+
+
+def read_container_header(path: str) -> dict:
+    """
+    读取容器头部（不读取数据段）
+
+    Args:
+        path: 容器文件路径
+
+    Returns:
+        头部字典
+
+    Raises:
+        ValueError: 不是地图容器或版本不受支持
+    """
+    with open(path, "rb") as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"不是地图容器文件: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"不支持的地图容器版本: {version}")
+        return json.loads(f.read(header_len).decode("utf-8"))
+
+
+def _read_section(path: str, section: dict, mmap_mode: Optional[str]) -> np.ndarray:
+    dtype = np.dtype(section["dtype"])
+    shape = tuple(section["shape"])
+    count = int(np.prod(shape)) if shape else 1
+    if mmap_mode is not None and count > 0:
+        return np.memmap(path, dtype=dtype, mode=mmap_mode, offset=section["offset"], shape=shape)
+    with open(path, "rb") as f:
+        f.seek(section["offset"])
+        return np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+
+
+def load_map_container(path: str, mmap_mode: Optional[str] = "c") -> MapRepresentation:
+    """
+    加载二进制地图容器
+
+    Args:
+        path: 容器文件路径
+        mmap_mode: grid段的内存映射模式。默认"c"（写时复制：页面按需读入，修改不会写回文件）；
+                   "r"为只读映射；None表示一次性读入内存
+
+    Returns:
+        MapRepresentation，grid_resolution为容器中记录的分辨率
+    """
+    header = read_container_header(path)
+    sections = header["sections"]
+    position = _read_section(path, sections["position"], None)
+    size = _read_section(path, sections["size"], None)
+    label_codes = _read_section(path, sections["label_codes"], None)
+    labels = header["labels"]
+
+    objects = {}
+    for k, key in enumerate(header["keys"]):
+        object_id = header["ids"][k]
+        objects[key] = MapObject(
+            label=labels[int(label_codes[k])],
+            size=tuple(float(v) for v in size[k]),
+            position=tuple(float(v) for v in position[k]),
+            id=object_id if object_id is not None else key,
+        )
+    grid_map = _read_section(path, sections["grid"], mmap_mode) if "grid" in sections else None
+
+    map_rep = MapRepresentation(
+        map_id=header["map_id"],
+        source_type=SourceType(header["source_type"]),
+        objects=objects,
+        grid_map=grid_map,
+        scene_description=header.get("scene_description", ""),
+        canvas_size=tuple(header["canvas_size"]) if header.get("canvas_size") is not None else None,
+        resolution=header.get("resolution"),
+        origin=header.get("origin"),
+    )
+    map_rep.grid_resolution = header.get("resolution")
+    return map_rep
+
+
+def json_png_to_container(json_path: str, container_path: Optional[str] = None) -> str:
+    """
+    把现有的JSON地图（及按map_id查找的grid map PNG）转换为容器文件
+
+    Args:
+        json_path: JSON地图路径
+        container_path: 输出路径，默认与JSON同名、后缀为.navimap
+
+    Returns:
+        容器文件的绝对路径
+    """
+    map_rep = MapRepresentation.load_from_json(json_path)
+    if container_path is None:
+        container_path = str(Path(json_path).with_suffix(CONTAINER_SUFFIX))
+    return save_map_container(map_rep, container_path)
+
+
+def container_to_json_png(container_path: str, json_path: str) -> MapRepresentation:
+    """
+    把容器文件转换回JSON地图和grid map PNG（PNG按map_id保存到png_directory）
+
+    Args:
+        container_path: 容器文件路径
+        json_path: 输出的JSON路径
+
+    Returns:
+        加载出的MapRepresentation
+    """
+    map_rep = load_map_container(container_path, mmap_mode=None)
+    map_rep.save_to_json(json_path)
+    if map_rep.grid_shape is not None:
+        map_rep.save_grid_map_as_png()
+    return map_rep
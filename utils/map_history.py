@@ -0,0 +1,359 @@
+"""
+增量编码的地图版本历史
+同一基础场景的多个变体（例如随机化生成的版本）不再各自保存完整的JSON和PNG，而是保存为：
+- 关键帧：完整的地图字典和逐块压缩的grid map
+- 增量版本：相对父版本的物体级差异（新增/修改的物体及删除的键）和grid的块级差异（只保存与父版本不同的块）
+每条增量链最多连续history_keyframe_interval个增量版本，之后自动写入关键帧，
+因此检出任意版本最多回放这么多个增量；最近检出的版本缓存在内存中。
+实例标签栅格等派生层不保存，检出后按需重新生成。
+"""
+
+import io
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from core.bitgrid import PackedGrid
+from core.data_structures import MapRepresentation
+from core.tiled_grid import TiledGrid
+from utils.config import config
+from utils.persistence import atomic_write
+
+MANIFEST_NAME = "history.json"
+FORMAT_VERSION = 1
+
+
+def _grid_array(map_rep: MapRepresentation) -> Optional[np.ndarray]:
+    grid_map = map_rep.grid_map
+    if grid_map is None:
+        return None
+    if isinstance(grid_map, TiledGrid):
+        return grid_map.to_array()
+    return np.asarray(grid_map, dtype=np.uint8)
+
+
+def _tiles(grid: np.ndarray, tile_size: int) -> np.ndarray:
+    """把grid补零到块边长的整数倍，返回 (rows, cols, tile_size, tile_size) 的分块数组"""
+    h, w = grid.shape
+    rows, cols = -(-h // tile_size), -(-w // tile_size)
+    padded = np.zeros((rows * tile_size, cols * tile_size), dtype=np.uint8)
+    padded[:h, :w] = grid
+    return padded.reshape(rows, tile_size, cols, tile_size).swapaxes(1, 2)
+
+
+def tile_xor_delta(old: Optional[np.ndarray], new: np.ndarray, tile_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算grid的块级差异：内容变化的块及其与父版本的按位异或
+
+    Args:
+        old: 父版本grid，None或大小不同时视为全0（所有非空块都被记录）
+        new: 当前grid
+        tile_size: 块边长（格，8的倍数）
+
+    Returns:
+        (keys, xor)：(K, 2) 的块坐标和 (K, tile_size, tile_size // 8) 的按位压缩异或
+    """
+    new_tiles = _tiles(new, tile_size)
+    if old is None or old.shape != new.shape:
+        diff = new_tiles
+    else:
+        diff = new_tiles ^ _tiles(old, tile_size)
+    keys = np.argwhere(diff.any(axis=(2, 3)))
+    xor = np.packbits(diff[keys[:, 0], keys[:, 1]].astype(bool), axis=-1)
+    return keys, xor
+
+
+def apply_tile_xor_delta(old: Optional[np.ndarray], shape: Tuple[int, int], keys: np.ndarray,
+                         xor: np.ndarray, tile_size: int) -> np.ndarray:
+    """
+    把tile_xor_delta的结果应用到父版本grid
+
+    Args:
+        old: 父版本grid，None或大小不同时视为全0
+        shape: 当前grid大小
+        keys: 块坐标
+        xor: 按位压缩的异或
+        tile_size: 块边长（格）
+
+    Returns:
+        当前grid
+    """
+    base = old if old is not None and old.shape == tuple(shape) else np.zeros(shape, dtype=np.uint8)
+    tiles = _tiles(base, tile_size)
+    if len(keys):
+        tiles[keys[:, 0], keys[:, 1]] ^= np.unpackbits(xor, axis=-1, count=tile_size)
+    rows, cols = tiles.shape[:2]
+    return tiles.swapaxes(1, 2).reshape(rows * tile_size, cols * tile_size)[:shape[0], :shape[1]].copy()
+
+
+def full_copy_nbytes(map_rep: MapRepresentation) -> int:
+    """
+    估算把地图完整保存为JSON加grid map PNG（save_to_json + save_grid_map_as_png）所需的字节数
+
+    Args:
+        map_rep: 地图
+
+    Returns:
+        字节数
+    """
+    total = len(json.dumps(map_rep.to_dict(), ensure_ascii=False, indent=2).encode("utf-8"))
+    grid = _grid_array(map_rep)
+    if grid is not None:
+        packed = PackedGrid.from_array(grid)
+        height, width = packed.shape
+        buffer = io.BytesIO()
+        Image.frombytes('1', (width, height), packed.bits.tobytes()).save(
+            buffer, 'PNG', compress_level=config.get_png_compress_level())
+        total += buffer.tell()
+    return total
+
+
+class _State:
+    """检出过程中的版本状态：地图字典（不含grid）和只读的grid数组"""
+
+    def __init__(self, data: dict, grid: Optional[np.ndarray]):
+        self.data = data
+        self.grid = grid
+
+
+class MapHistory:
+    """保存在一个目录中的地图版本历史（关键帧 + 增量）"""
+
+    def __init__(self, directory: str, keyframe_interval: Optional[int] = None,
+                 tile_size: Optional[int] = None, cache_versions: int = 8):
+        """
+        Args:
+            directory: 历史目录，不存在时创建
+            keyframe_interval: 两个关键帧之间最多连续的增量版本数，None表示使用配置值
+            tile_size: grid增量的块边长（格），None表示使用配置值；已有历史沿用其记录的值
+            cache_versions: 内存中缓存的已检出版本数
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keyframe_interval = keyframe_interval or config.get_history_keyframe_interval()
+        self.cache_versions = int(cache_versions)
+        self._cache: "OrderedDict[int, _State]" = OrderedDict()
+        manifest_path = self.directory / MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"不支持的地图历史格式版本: {manifest.get('format_version')}")
+            self.tile_size = int(manifest["tile_size"])
+            self._versions: List[dict] = manifest["versions"]
+        else:
+            self.tile_size = int(tile_size or config.get_history_tile_size())
+            if self.tile_size <= 0 or self.tile_size % 8:
+                raise ValueError(f"grid增量的块边长必须是8的正整数倍: {self.tile_size}")
+            self._versions = []
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def versions(self) -> List[dict]:
+        """
+        所有版本的记录
+
+        Returns:
+            [{"version", "parent", "keyframe", "message", "stored_bytes", "full_bytes", ...}, ...]
+        """
+        return [dict(entry) for entry in self._versions]
+
+    @property
+    def latest(self) -> Optional[int]:
+        """最新版本号，历史为空时为None"""
+        return self._versions[-1]["version"] if self._versions else None
+
+    def _entry(self, version: int) -> dict:
+        if not 0 <= version < len(self._versions):
+            raise KeyError(f"地图历史中没有版本 {version}")
+        return self._versions[version]
+
+    def _path(self, version: int, suffix: str) -> Path:
+        return self.directory / f"v{version:06d}{suffix}"
+
+    def _write_manifest(self):
+        manifest = {"format_version": FORMAT_VERSION, "tile_size": self.tile_size, "versions": self._versions}
+        atomic_write(self.directory / MANIFEST_NAME, lambda path: Path(path).write_text(
+            json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"))
+
+    def commit(self, map_rep: MapRepresentation, parent: Optional[int] = None,
+               message: str = "", keyframe: Optional[bool] = None) -> int:
+        """
+        保存地图的一个新版本
+
+        Args:
+            map_rep: 地图（读取其物体、画布、分辨率和grid map）
+            parent: 父版本号，None表示最新版本；随机化变体通常以基础场景的版本为父版本
+            message: 版本说明
+            keyframe: 是否强制保存为关键帧，None表示按关键帧间隔自动决定
+
+        Returns:
+            新版本号
+        """
+        version = len(self._versions)
+        if parent is None:
+            parent = self.latest
+        # 经过一次JSON往返，使内存中的状态与从磁盘回放的状态（元组变为列表等）可以直接比较
+        data = json.loads(json.dumps(map_rep.to_dict(), ensure_ascii=False))
+        data["grid_resolution"] = map_rep.grid_resolution
+        grid = _grid_array(map_rep)
+
+        if parent is None:
+            keyframe = True
+        else:
+            depth = self._entry(parent)["depth"] + 1
+            if keyframe is None:
+                keyframe = depth >= self.keyframe_interval
+        entry = {"version": version, "parent": None if keyframe else parent, "keyframe": bool(keyframe),
+                 "depth": 0 if keyframe else depth, "message": message,
+                 "objects": len(data["objects"]), "has_grid": grid is not None}
+
+        files = []
+        if keyframe:
+            files.append(self._write_json(version, {"map": data}))
+            if grid is not None:
+                packed = PackedGrid.from_array(grid)
+                grid_path = self._path(version, "_grid.npz")
+                atomic_write(grid_path, lambda path: np.savez_compressed(
+                    path, bits=packed.bits, width=np.int64(packed.width)))
+                files.append(grid_path)
+        else:
+            base = self._state(parent)
+            files.append(self._write_json(version, self._object_delta(base.data, data)))
+            if grid is not None:
+                files.append(self._write_grid_delta(version, base.grid, grid, entry))
+
+        entry["stored_bytes"] = sum(os.path.getsize(path) for path in files)
+        entry["full_bytes"] = full_copy_nbytes(map_rep)
+        self._versions.append(entry)
+        self._write_manifest()
+        if grid is not None:
+            grid = grid.copy()
+            grid.setflags(write=False)
+        self._remember(version, _State(data, grid))
+        return version
+
+    def _write_json(self, version: int, payload: dict) -> Path:
+        path = self._path(version, ".json")
+        atomic_write(path, lambda tmp: Path(tmp).write_text(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")), encoding="utf-8"))
+        return path
+
+    @staticmethod
+    def _object_delta(base: dict, data: dict) -> dict:
+        """物体级差异：新增或修改的物体、删除的键，其余字段（画布、原点、分辨率等）直接记录"""
+        base_objects, objects = base["objects"], data["objects"]
+        changed = {k: v for k, v in objects.items() if base_objects.get(k) != v}
+        removed = [k for k in base_objects if k not in objects]
+        delta = {"header": {k: v for k, v in data.items() if k != "objects"},
+                 "changed": changed, "removed": removed}
+        # 按字典语义回放后物体顺序与当前不一致时（例如删除后重新添加同名物体），额外记录完整顺序
+        kept = [k for k in base_objects if k in objects]
+        if kept + [k for k in objects if k not in base_objects] != list(objects):
+            delta["order"] = list(objects)
+        return delta
+
+    def _write_grid_delta(self, version: int, base: Optional[np.ndarray], grid: np.ndarray, entry: dict) -> Path:
+        """只保存与父版本不同的块（按位异或后压缩，变化稀疏时几乎全为0）"""
+        keys, xor = tile_xor_delta(base, grid, self.tile_size)
+        entry["changed_tiles"] = int(len(keys))
+        path = self._path(version, "_grid_delta.npz")
+        atomic_write(path, lambda tmp: np.savez_compressed(
+            tmp, shape=np.array(grid.shape, dtype=np.int64), keys=keys.astype(np.int64), xor=xor))
+        return path
+
+    def _remember(self, version: int, state: _State):
+        self._cache[version] = state
+        self._cache.move_to_end(version)
+        while len(self._cache) > self.cache_versions:
+            self._cache.popitem(last=False)
+
+    def _state(self, version: int) -> _State:
+        """从最近的关键帧或已缓存的祖先开始回放增量，得到版本状态"""
+        if version in self._cache:
+            self._cache.move_to_end(version)
+            return self._cache[version]
+        chain = []
+        current = version
+        while current not in self._cache and not self._entry(current)["keyframe"]:
+            chain.append(current)
+            current = self._entry(current)["parent"]
+        state = self._cache[current] if current in self._cache else self._load_keyframe(current)
+        for step in reversed(chain):
+            state = self._apply_delta(state, step)
+        self._remember(version, state)
+        return state
+
+    def _load_keyframe(self, version: int) -> _State:
+        with open(self._path(version, ".json"), "r", encoding="utf-8") as f:
+            data = json.load(f)["map"]
+        grid = None
+        if self._entry(version)["has_grid"]:
+            with np.load(self._path(version, "_grid.npz")) as npz:
+                grid = PackedGrid(npz["bits"], int(npz["width"])).to_array()
+            grid.setflags(write=False)
+        return _State(data, grid)
+
+    def _apply_delta(self, base: _State, version: int) -> _State:
+        with open(self._path(version, ".json"), "r", encoding="utf-8") as f:
+            delta = json.load(f)
+        objects = dict(base.data["objects"])
+        for key in delta["removed"]:
+            del objects[key]
+        objects.update(delta["changed"])
+        if "order" in delta:
+            objects = {k: objects[k] for k in delta["order"]}
+        data = dict(delta["header"])
+        data["objects"] = objects
+
+        grid = None
+        if self._entry(version)["has_grid"]:
+            with np.load(self._path(version, "_grid_delta.npz")) as npz:
+                shape = tuple(int(v) for v in npz["shape"])
+                grid = apply_tile_xor_delta(base.grid, shape, npz["keys"], npz["xor"], self.tile_size)
+            grid.setflags(write=False)
+        return _State(data, grid)
+
+    def checkout(self, version: Optional[int] = None) -> MapRepresentation:
+        """
+        还原某个版本的地图
+
+        Args:
+            version: 版本号，None表示最新版本
+
+        Returns:
+            可自由编辑的MapRepresentation（不影响历史）
+        """
+        if version is None:
+            version = self.latest
+            if version is None:
+                raise KeyError("地图历史为空")
+        state = self._state(version)
+        map_rep = MapRepresentation.from_dict(state.data)
+        if state.grid is not None:
+            map_rep.grid_map = state.grid.copy()
+            map_rep.grid_resolution = state.data.get("grid_resolution")
+        return map_rep
+
+    def storage_report(self) -> Dict[str, object]:
+        """
+        历史占用的存储与每个版本都完整保存（JSON + PNG）相比的节省情况
+
+        Returns:
+            {"versions", "keyframes", "stored_bytes", "full_copy_bytes", "savings_ratio", "per_version"}
+        """
+        stored = sum(entry["stored_bytes"] for entry in self._versions)
+        full = sum(entry["full_bytes"] for entry in self._versions)
+        return {
+            "versions": len(self._versions),
+            "keyframes": sum(1 for entry in self._versions if entry["keyframe"]),
+            "stored_bytes": stored,
+            "full_copy_bytes": full,
+            "savings_ratio": full / stored if stored else 0.0,
+            "per_version": [(entry["version"], entry["keyframe"], entry["stored_bytes"], entry["full_bytes"])
+                            for entry in self._versions],
+        }
@@ -0,0 +1,271 @@
+"""
+后台写回（write-behind）持久化
+编辑过程中的grid map / 实例标签栅格保存请求交给后台线程完成，PNG压缩和磁盘I/O不再阻塞调用方：
+同一个键（例如某个map_id的grid map文件）在写入前的多次保存只保留最后一次；
+每次写入先写临时文件再原子替换，读取方不会看到写了一半的文件；
+带内容摘要提交时，与最近一次已提交（排队、写入中或已写入）的摘要相同则直接跳过。
+默认同步写入（grid_map.write_behind为false），开启后台写入时失败记录在errors中，由调用方通过error()查询。
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Optional
+import numpy as np
+from utils.config import config
+
+
+def atomic_write(path, write: Callable[[str], object]):
+    """
+    先写临时文件再原子替换目标文件
+
+    Args:
+        path: 目标文件路径
+        write: 以临时文件路径为参数的写入函数（临时文件保留目标文件的后缀，
+               np.savez、PIL等按后缀处理文件名的写入函数也能使用）
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+    try:
+        write(str(tmp_path))
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def content_digest(*values) -> str:
+    """
+    计算待保存内容的摘要，用于跳过内容没有变化的重复保存
+
+    Args:
+        values: numpy数组、TiledGrid（逐块计算，不组装整张数组）、字符串列表或None
+
+    Returns:
+        十六进制摘要
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for value in values:
+        if value is None:
+            h.update(b"N")
+        elif hasattr(value, "iter_tiles"):
+            h.update(f"T{value.shape}{value.dtype}{value.tile_size}".encode("ascii"))
+            for _, _, _, tile in value.iter_tiles():
+                if isinstance(tile, np.ndarray):
+                    h.update(np.ascontiguousarray(tile).tobytes())
+                else:
+                    h.update(b"U" + np.asarray(tile, dtype=value.dtype).tobytes())
+        elif isinstance(value, np.ndarray):
+            h.update(f"A{value.shape}{value.dtype}".encode("ascii"))
+            h.update(np.ascontiguousarray(value).tobytes())
+        else:
+            for item in value:
+                h.update(str(item).encode("utf-8"))
+                h.update(b"\0")
+        h.update(b"|")
+    return h.hexdigest()
+
+
+class WriteBehindPersister:
+    """
+    合并同键写入的后台持久化队列。
+    background为False时submit在调用线程中立即写入（仍按内容摘要跳过），便于关闭异步保存。
+    """
+
+    def __init__(self, background: bool = True):
+        self.background = background
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # 键 -> (内容摘要, 写入函数)，按首次排队的顺序写入
+        self._pending: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._in_flight: Optional[Hashable] = None
+        self._latest: Dict[Hashable, object] = {}  # 最近一次提交的内容摘要
+        self._persisted: Dict[Hashable, object] = {}  # 最近一次写入成功的内容摘要
+        self.errors: Dict[Hashable, BaseException] = {}  # 最近一次写入失败的异常
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.submitted = 0
+        self.written = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, key: Hashable, write: Callable[[], object], digest: Optional[str] = None,
+               target: Optional[str] = None) -> bool:
+        """
+        提交一次写入
+
+        Args:
+            key: 写入目标的键，同键尚未开始的写入会被这次提交替换
+            write: 无参数的写入函数，在后台线程中调用
+            digest: 被写入内容的摘要（见content_digest），与该键最近一次提交的摘要相同时跳过；None表示总是写入
+            target: 可选的目标文件路径，只有该文件存在（或该键的写入尚未完成）时才按摘要跳过
+
+        Returns:
+            是否已提交（False表示因内容相同而跳过）
+
+        Raises:
+            Exception: 同步写入（background为False）时写入函数抛出的异常
+        """
+        with self._lock:
+            if digest is not None and key in self._latest and self._latest[key] == digest and \
+                    (target is None or self._is_pending(key) or os.path.exists(target)):
+                self.skipped += 1
+                return False
+            self.submitted += 1
+            self._latest[key] = digest
+            # 新的提交覆盖之前的失败记录
+            self.errors.pop(key, None)
+            if not self.background or self._closed:
+                run_inline = True
+            else:
+                run_inline = False
+                if key in self._pending:
+                    self.coalesced += 1
+                self._pending[key] = (digest, write)
+                self._ensure_thread()
+                self._changed.notify_all()
+        if run_inline:
+            error = self._run(key, digest, write)
+            if error is not None:
+                raise error
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    if self._closed:
+                        return
+                    self._changed.wait()
+                key, (digest, write) = self._pending.popitem(last=False)
+                self._in_flight = key
+            try:
+                error = self._run(key, digest, write)
+                if error is not None:
+                    print(f"后台保存失败 {key}: {error}")
+            finally:
+                with self._lock:
+                    self._in_flight = None
+                    self._changed.notify_all()
+
+    def _run(self, key: Hashable, digest, write: Callable[[], object]) -> Optional[BaseException]:
+        try:
+            write()
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self.errors[key] = e
+                # 允许以相同内容重试
+                if self._latest.get(key) == digest:
+                    self._latest.pop(key, None)
+            return e
+        with self._lock:
+            self.written += 1
+            self._persisted[key] = digest
+            self.errors.pop(key, None)
+        return None
+
+    def persisted_digest(self, key: Hashable) -> Optional[str]:
+        """该键最近一次写入成功的内容摘要（从未写入时为None）"""
+        with self._lock:
+            return self._persisted.get(key)
+
+    def forget(self, key: Hashable):
+        """
+        忘记该键已提交和已写入的内容摘要及失败记录（目标文件被删除后调用，之后相同内容的提交会重新写入）
+
+        Args:
+            key: 写入目标的键
+        """
+        with self._lock:
+            self._latest.pop(key, None)
+            self._persisted.pop(key, None)
+            self.errors.pop(key, None)
+
+    def error(self, key: Hashable) -> Optional[BaseException]:
+        """该键最近一次写入失败的异常（最近一次写入成功或尚未写入时为None）"""
+        with self._lock:
+            return self.errors.get(key)
+
+    def is_pending(self, key: Optional[Hashable] = None) -> bool:
+        """该键（None表示任意键）是否还有未完成的写入"""
+        with self._lock:
+            return self._is_pending(key)
+
+    def _is_pending(self, key: Optional[Hashable]) -> bool:
+        if key is None:
+            return bool(self._pending) or self._in_flight is not None
+        return key in self._pending or self._in_flight == key
+
+    def wait(self, key: Hashable, timeout: Optional[float] = None) -> bool:
+        """
+        等待某个键已提交的写入完成（读取该文件前调用）
+
+        Args:
+            key: 写入目标的键
+            timeout: 超时时间（秒），None表示一直等待
+
+        Returns:
+            是否已完成（超时返回False）
+        """
+        with self._lock:
+            return self._changed.wait_for(lambda: not self._is_pending(key), timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有已提交的写入完成
+
+        Args:
+            timeout: 超时时间（秒），None表示一直等待
+
+        Returns:
+            是否已全部完成（超时返回False）
+        """
+        with self._lock:
+            return self._changed.wait_for(lambda: not self._is_pending(None), timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """写完已提交的内容后停止后台线程，之后的提交在调用线程中同步写入"""
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+_persister: Optional[WriteBehindPersister] = None
+_persister_lock = threading.Lock()
+
+
+def get_persister() -> WriteBehindPersister:
+    """
+    获取全局的持久化队列（默认同步写入，配置grid_map.write_behind为true时在后台线程中写入）
+
+    Returns:
+        WriteBehindPersister
+    """
+    global _persister
+    background = config.get_write_behind_enabled()
+    with _persister_lock:
+        if _persister is None:
+            _persister = WriteBehindPersister(background)
+        _persister.background = background
+        return _persister
+
+
+def flush_pending_writes(timeout: Optional[float] = None) -> bool:
+    """等待所有后台保存完成（进程退出时会自动调用）"""
+    return _persister.flush(timeout) if _persister is not None else True
+
+
+atexit.register(flush_pending_writes)
@@ -0,0 +1,270 @@
+"""
+跨进程共享地图
+SharedMapHost在主进程中把地图的grid map及派生层（各碰撞边缘的膨胀grid map）各放入一块
+POSIX共享内存，向工作进程分发可序列化的SharedMapHandle；工作进程用attach_shared_map以只读方式
+零拷贝映射这些内存，多个进程使用同一张地图时只占用一份grid内存。
+
+主进程按句柄引用计数，最后一个引用释放时才unlink共享内存。工作进程拿到的是只读快照，
+需要编辑时调用map_rep.fork()，只有被修改的块会被复制到私有内存。
+"""
+
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from core.data_structures import MapRepresentation
+
+
+def _tracker_pid() -> Optional[int]:
+    return getattr(getattr(resource_tracker, "_resource_tracker", None), "_pid", None)
+
+
+def _shares_host_tracker(tracker_pid: Optional[int]) -> bool:
+    """
+    当前进程是否与主进程共用同一个resource_tracker：
+    fork出的子进程继承了tracker的pid；spawn出的子进程只继承了与tracker通信的fd（pid未知）
+    """
+    tracker = getattr(resource_tracker, "_resource_tracker", None)
+    if tracker is None:
+        return False
+    pid, fd = getattr(tracker, "_pid", None), getattr(tracker, "_fd", None)
+    return (pid is not None and pid == tracker_pid) or (pid is None and fd is not None)
+
+
+class SharedMapHandle:
+    """
+    共享地图句柄，可通过pickle传给工作进程
+    （包含地图元数据和物体字典，以及各层共享内存的名称、形状和数据类型）
+    """
+
+    def __init__(self, key: str, map_data: dict, resolution: float,
+                 layers: Dict[str, Tuple[str, Tuple[int, int], str]], tracker_pid: Optional[int]):
+        self.key = key
+        self.map_data = map_data
+        self.resolution = resolution
+        # 层名 -> (共享内存名称, 形状, dtype)；"grid"为grid map，"inflated:<margin>"为膨胀grid map
+        self.layers = layers
+        self.tracker_pid = tracker_pid
+
+    @property
+    def margins(self) -> List[float]:
+        """已共享的膨胀层对应的碰撞边缘"""
+        return sorted(float(name.split(":", 1)[1]) for name in self.layers if name.startswith("inflated:"))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, shape, dtype in self.layers.values())
+
+    def __repr__(self) -> str:
+        return f"SharedMapHandle({self.key}, layers={list(self.layers)}, nbytes={self.nbytes})"
+
+
+class _HostedMap:
+    def __init__(self, handle: SharedMapHandle, segments: List[shared_memory.SharedMemory]):
+        self.handle = handle
+        self.segments = segments
+        self.refs = 1
+
+
+class SharedMapHost:
+    """
+    在共享内存中托管地图。同一个地图（map_id和版本相同）只托管一次，重复发布只增加引用计数。
+    可作为上下文管理器使用，退出时释放全部共享内存。
+    """
+
+    def __init__(self):
+        self._maps: Dict[str, _HostedMap] = {}
+
+    def __enter__(self) -> "SharedMapHost":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._maps)
+
+    def publish(self, map_rep: MapRepresentation, margins: Iterable[float] = (),
+                resolution: Optional[float] = None) -> SharedMapHandle:
+        """
+        把地图放入共享内存
+
+        Args:
+            map_rep: 地图，必须已有grid map
+            margins: 需要预先计算并共享的膨胀层的碰撞边缘（米）
+            resolution: grid map分辨率，None时使用地图记录的分辨率或配置默认值
+
+        Returns:
+            SharedMapHandle，引用计数加一
+        """
+        if map_rep.grid_shape is None:
+            raise ValueError("地图没有grid map，无法共享")
+        if resolution is None:
+            resolution = map_rep.grid_resolution or map_rep.resolution
+        margins = sorted({float(m) for m in margins})
+        key = f"{map_rep.map_id}@{map_rep.version}:{resolution}:{margins}"
+        hosted = self._maps.get(key)
+        if hosted is not None:
+            hosted.refs += 1
+            return hosted.handle
+
+        # 局部导入避免与interaction_api之间的循环依赖
+        from apis.interaction_api import get_inflated_grid_map
+        arrays = {"grid": np.asarray(map_rep.grid_map)}
+        for margin in margins:
+            arrays[f"inflated:{margin}"] = np.asarray(get_inflated_grid_map(map_rep, margin, resolution))
+
+        segments = []
+        layers = {}
+        try:
+            for name, array in arrays.items():
+                segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                segments.append(segment)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+                layers[name] = (segment.name, tuple(array.shape), array.dtype.str)
+        except BaseException:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+            raise
+
+        handle = SharedMapHandle(key, map_rep.to_dict(), resolution, layers, _tracker_pid())
+        self._maps[key] = _HostedMap(handle, segments)
+        return handle
+
+    def publish_file(self, map_file_path: str, margins: Iterable[float] = (),
+                     resolution: Optional[float] = None) -> SharedMapHandle:
+        """
+        加载地图文件（JSON或.navimap）并放入共享内存，没有grid map时先全量生成
+
+        Args:
+            map_file_path: 地图文件路径
+            margins: 需要共享的膨胀层的碰撞边缘（米）
+            resolution: grid map分辨率
+
+        Returns:
+            SharedMapHandle
+        """
+        from apis.interaction_api import load_existing_map, update_grid_map_full
+        map_rep = load_existing_map(map_file_path)
+        if map_rep.grid_shape is None:
+            update_grid_map_full(map_rep, resolution)
+        return self.publish(map_rep, margins, resolution)
+
+    def acquire(self, handle: SharedMapHandle) -> SharedMapHandle:
+        """为已发布的地图增加一个引用"""
+        hosted = self._maps.get(handle.key)
+        if hosted is None:
+            raise KeyError(f"地图未被托管或已释放: {handle.key}")
+        hosted.refs += 1
+        return handle
+
+    def refcount(self, handle: SharedMapHandle) -> int:
+        hosted = self._maps.get(handle.key)
+        return hosted.refs if hosted is not None else 0
+
+    def release(self, handle: SharedMapHandle) -> bool:
+        """
+        释放一个引用，引用计数归零时unlink对应的共享内存
+
+        Returns:
+            共享内存是否已被释放
+        """
+        hosted = self._maps.get(handle.key)
+        if hosted is None:
+            return False
+        hosted.refs -= 1
+        if hosted.refs > 0:
+            return False
+        del self._maps[handle.key]
+        for segment in hosted.segments:
+            segment.close()
+            segment.unlink()
+        return True
+
+    def close(self):
+        """释放全部托管的地图（工作进程中已建立的映射在其关闭前仍然有效）"""
+        for key in list(self._maps):
+            hosted = self._maps.pop(key)
+            for segment in hosted.segments:
+                segment.close()
+                segment.unlink()
+
+
+def _open_segment(name: str, tracker_pid: Optional[int]) -> shared_memory.SharedMemory:
+    """
+    以不登记资源回收的方式打开已有的共享内存。
+    Python 3.13之前打开已有共享内存也会在resource_tracker中登记，工作进程退出时会把它unlink，
+    因此打开后立即取消登记；由主进程以multiprocessing启动、与主进程共用同一个tracker时不能取消，
+    否则会撤销主进程的登记。
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shared_tracker = _shares_host_tracker(tracker_pid)
+        segment = shared_memory.SharedMemory(name=name)
+        if not shared_tracker:
+            resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class SharedMapView:
+    """工作进程中对共享地图的只读映射，持有共享内存直到close()"""
+
+    def __init__(self, handle: SharedMapHandle):
+        self.handle = handle
+        self._segments: List[shared_memory.SharedMemory] = []
+        arrays = {}
+        try:
+            for name, (segment_name, shape, dtype) in handle.layers.items():
+                segment = _open_segment(segment_name, handle.tracker_pid)
+                self._segments.append(segment)
+                array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+                array.flags.writeable = False
+                arrays[name] = array
+        except BaseException:
+            self._close_segments()
+            raise
+
+        from apis.interaction_api import inflated_grid_cache
+        map_rep = MapRepresentation.from_dict(handle.map_data)
+        map_rep.grid_map = arrays["grid"]
+        map_rep.grid_resolution = handle.resolution
+        cache = inflated_grid_cache(map_rep)
+        for name, array in arrays.items():
+            if name.startswith("inflated:"):
+                cache.put(array, float(name.split(":", 1)[1]), handle.resolution)
+        map_rep.freeze()
+        self.map_rep: Optional[MapRepresentation] = map_rep
+
+    def __enter__(self) -> "SharedMapView":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _close_segments(self):
+        for segment in self._segments:
+            try:
+                segment.close()
+            except BufferError:
+                # 仍有数组引用共享内存，映射在这些数组被回收后由系统释放
+                pass
+        self._segments = []
+
+    def close(self):
+        """解除映射（不会unlink，共享内存由主进程释放）；之后不应再使用map_rep及由它得到的数组"""
+        self.map_rep = None
+        self._close_segments()
+
+
+def attach_shared_map(handle: SharedMapHandle) -> SharedMapView:
+    """
+    在工作进程中映射共享地图
+
+    Args:
+        handle: 主进程SharedMapHost.publish返回的句柄
+
+    Returns:
+        SharedMapView，其map_rep为只读快照（grid map和预计算的膨胀层零拷贝映射共享内存）
+    """
+    return SharedMapView(handle)
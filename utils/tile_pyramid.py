@@ -0,0 +1,361 @@
+"""
+多级分块grid map档案（.gridpyr）
+把grid map按固定边长切块，逐级2x2降采样（粗格子内有任意障碍即为障碍，保守可用于规划），
+所有级别的块和索引保存在一个文件中：
+
+    [0, 8)    魔数 b"NAVIPYR\\0"
+    [8, 12)   格式版本 (uint32, 小端)
+    [12, 16)  头部长度 (uint32, 小端)
+    [16, ...) UTF-8 JSON头部：grid形状、分辨率、原点、块边长，以及每一级的形状、块行列数和索引偏移
+    之后      每一级的块索引 (行数*列数, 2) int64，按行优先排列：(数据偏移, 数据长度)；
+              长度为0表示取值均匀的块，此时偏移处记录的是该块的取值（0或1）
+    之后      各块数据：块的按位压缩数据（PackedGrid，行内高位在前）再经zlib压缩
+
+读取任意世界坐标窗口时只解码与窗口相交的块，不需要解码整张grid。
+"""
+
+import json
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+from core.bitgrid import PackedGrid
+from core.tiled_grid import TiledGrid
+from utils.config import config
+from utils.persistence import atomic_write
+
+MAGIC = b"NAVIPYR\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PYRAMID_SUFFIX = ".gridpyr"
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def downsample_min(grid: np.ndarray) -> np.ndarray:
+    """
+    2x2降采样：粗格子内有任意障碍（0）即为障碍，奇数边按可通行补齐
+
+    Args:
+        grid: 0/1 grid
+
+    Returns:
+        形状为 (ceil(h/2), ceil(w/2)) 的新数组
+    """
+    h, w = grid.shape
+    if h % 2 or w % 2:
+        padded = np.ones((h + h % 2, w + w % 2), dtype=np.uint8)
+        padded[:h, :w] = grid
+        grid = padded
+    return grid.reshape(grid.shape[0] // 2, 2, grid.shape[1] // 2, 2).min(axis=(1, 3))
+
+
+def _encode_tile(tile: np.ndarray, compress_level: int) -> bytes:
+    return zlib.compress(PackedGrid.from_array(tile).bits.tobytes(), compress_level)
+
+
+def _decode_tile(data: bytes, shape: Tuple[int, int]) -> np.ndarray:
+    height, width = shape
+    bits = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(height, (width + 7) // 8)
+    return PackedGrid(bits, width).to_array()
+
+
+def write_tile_pyramid(grid_map: Union[np.ndarray, TiledGrid, PackedGrid], path: str, resolution: float,
+                       origin: Tuple[float, float] = (0.0, 0.0), tile_size: Optional[int] = None,
+                       num_levels: Optional[int] = None, canvas_size: Optional[Tuple[float, float]] = None,
+                       digest: Optional[str] = None, grid_version: Optional[int] = None) -> str:
+    """
+    把grid map写成多级分块档案（先写临时文件再原子替换）
+
+    Args:
+        grid_map: 0/1 grid（numpy数组、TiledGrid或PackedGrid），第0级直接按窗口读取，不组装整张数组
+        path: 档案路径
+        resolution: 第0级的网格分辨率
+        origin: grid第(0, 0)格左下角的世界坐标
+        tile_size: 块边长（格，必须为偶数），None表示使用配置值
+        num_levels: 级数，None表示一直降采样到整级只有一个块
+        canvas_size: 可选的画布大小，写入头部
+        digest: 可选的内容摘要（见utils.grid_cache）
+        grid_version: 可选的grid版本号
+
+    Returns:
+        档案的绝对路径
+    """
+    if tile_size is None:
+        tile_size = config.get_grid_pyramid_tile_size()
+    if tile_size <= 0 or tile_size % 2:
+        raise ValueError(f"块边长必须为正偶数: {tile_size}")
+    compress_level = config.get_png_compress_level()
+    shape = tuple(int(v) for v in grid_map.shape)
+
+    levels = []
+    blobs: List[bytes] = []
+    source = grid_map
+    level_shape = shape
+    while True:
+        height, width = level_shape
+        rows, cols = -(-height // tile_size), -(-width // tile_size)
+        index = np.zeros((rows * cols, 2), dtype="<i8")
+        last = (num_levels is not None and len(levels) + 1 >= num_levels) or (rows <= 1 and cols <= 1)
+        coarse = None if last else np.ones((-(-height // 2), -(-width // 2)), dtype=np.uint8)
+        half = tile_size // 2
+        for tr in range(rows):
+            for tc in range(cols):
+                r0, c0 = tr * tile_size, tc * tile_size
+                tile = np.asarray(source[r0:min(r0 + tile_size, height), c0:min(c0 + tile_size, width)], dtype=np.uint8)
+                k = tr * cols + tc
+                low, high = int(tile.min()), int(tile.max())
+                if low == high:
+                    index[k] = (low, 0)
+                else:
+                    blobs.append(_encode_tile(tile, compress_level))
+                    index[k] = (len(blobs) - 1, -1)  # 暂存块序号，写入时换成文件偏移
+                if coarse is not None:
+                    small = downsample_min(tile) if low != high else None
+                    h2, w2 = -(-tile.shape[0] // 2), -(-tile.shape[1] // 2)
+                    coarse[tr * half:tr * half + h2, tc * half:tc * half + w2] = low if small is None else small
+        levels.append({"shape": [height, width], "tiles": [rows, cols], "index": index})
+        if last:
+            break
+        source = coarse
+        level_shape = coarse.shape
+
+    header = {
+        "shape": list(shape),
+        "resolution": float(resolution),
+        "origin": [float(origin[0]), float(origin[1])],
+        "canvas_size": [float(v) for v in canvas_size] if canvas_size is not None else None,
+        "tile_size": int(tile_size),
+        "grid_version": grid_version,
+        "digest": digest,
+        "levels": [{"shape": level["shape"], "tiles": level["tiles"], "index_offset": 0} for level in levels],
+    }
+    # 先用占位偏移估算头部长度，再确定索引和块数据的位置
+    header_len = len(json.dumps(header).encode("utf-8")) + 32 * len(levels)
+    offset = _align(_PREAMBLE.size + header_len)
+    for meta, level in zip(header["levels"], levels):
+        meta["index_offset"] = offset
+        offset = _align(offset + level["index"].nbytes)
+    blob_offsets = []
+    for blob in blobs:
+        blob_offsets.append(offset)
+        offset += len(blob)
+    for level in levels:
+        index = level["index"]
+        stored = index[:, 1] < 0
+        slots = index[stored, 0]
+        index[stored, 0] = np.array(blob_offsets, dtype="<i8")[slots] if len(slots) else slots
+        index[stored, 1] = np.array([len(blobs[s]) for s in slots], dtype="<i8")
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (header_len - len(header_bytes))
+
+    def write(tmp_path: str):
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+            f.write(header_bytes)
+            for meta, level in zip(header["levels"], levels):
+                f.seek(meta["index_offset"])
+                level["index"].tofile(f)
+            if blobs:
+                f.seek(blob_offsets[0])
+                for blob in blobs:
+                    f.write(blob)
+            f.truncate(offset)
+
+    save_path = Path(path)
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(save_path, write)
+    return str(save_path.absolute())
+
+
+class TilePyramid:
+    """
+    只读打开的多级分块档案。块按需读取解码，最近使用的块缓存在内存中（线程安全）。
+    """
+
+    def __init__(self, path: str, cache_tiles: int = 256):
+        self.path = str(path)
+        self._file = open(self.path, "rb")
+        try:
+            magic, version, header_len = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"不是grid map分块档案: {path}")
+            if version > FORMAT_VERSION:
+                raise ValueError(f"不支持的分块档案版本: {version}")
+            self.header = json.loads(self._file.read(header_len).decode("utf-8"))
+            self._indexes = []
+            for meta in self.header["levels"]:
+                rows, cols = meta["tiles"]
+                self._file.seek(meta["index_offset"])
+                index = np.fromfile(self._file, dtype="<i8", count=rows * cols * 2)
+                self._indexes.append(index.reshape(rows * cols, 2))
+        except BaseException:
+            self._file.close()
+            raise
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[int, int, int], np.ndarray]" = OrderedDict()
+        self.cache_tiles = int(cache_tiles)
+        self.tiles_decoded = 0
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "TilePyramid":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """第0级的grid形状"""
+        return tuple(self.header["shape"])
+
+    @property
+    def resolution(self) -> float:
+        """第0级的网格分辨率"""
+        return self.header["resolution"]
+
+    @property
+    def origin(self) -> Tuple[float, float]:
+        return tuple(self.header["origin"])
+
+    @property
+    def tile_size(self) -> int:
+        return self.header["tile_size"]
+
+    @property
+    def num_levels(self) -> int:
+        return len(self.header["levels"])
+
+    def level_shape(self, level: int) -> Tuple[int, int]:
+        return tuple(self.header["levels"][level]["shape"])
+
+    def level_resolution(self, level: int) -> float:
+        """第level级的网格分辨率（每级为上一级的2倍）"""
+        return self.resolution * (2 ** level)
+
+    def select_level(self, resolution: Optional[float]) -> int:
+        """
+        选择分辨率不粗于resolution的最粗一级
+
+        Args:
+            resolution: 期望的网格分辨率，None或比第0级更细时返回0
+
+        Returns:
+            级别
+        """
+        if resolution is None:
+            return 0
+        level = 0
+        while level + 1 < self.num_levels and self.level_resolution(level + 1) <= resolution * (1 + 1e-9):
+            level += 1
+        return level
+
+    def read_tile(self, level: int, tr: int, tc: int) -> np.ndarray:
+        """
+        读取一个块（均匀块不读文件）
+
+        Returns:
+            0/1 uint8数组，调用方不应原地修改
+        """
+        rows, cols = self.header["levels"][level]["tiles"]
+        offset, length = self._indexes[level][tr * cols + tc]
+        height, width = self.level_shape(level)
+        ts = self.tile_size
+        shape = (min(ts, height - tr * ts), min(ts, width - tc * ts))
+        if length == 0:
+            return np.full(shape, offset, dtype=np.uint8)
+        key = (level, tr, tc)
+        with self._lock:
+            tile = self._cache.get(key)
+            if tile is not None:
+                self._cache.move_to_end(key)
+                return tile
+            self._file.seek(int(offset))
+            data = self._file.read(int(length))
+        tile = _decode_tile(data, shape)
+        with self._lock:
+            self.tiles_decoded += 1
+            self._cache[key] = tile
+            while len(self._cache) > self.cache_tiles:
+                self._cache.popitem(last=False)
+        return tile
+
+    def read_cells(self, level: int, window: Tuple[int, int, int, int]) -> np.ndarray:
+        """
+        读取第level级的一个格子窗口，只解码相交的块
+
+        Args:
+            level: 级别
+            window: (row_start, row_end, col_start, col_end)，左闭右开，会裁剪到该级范围内
+
+        Returns:
+            0/1 uint8数组
+        """
+        height, width = self.level_shape(level)
+        r0, r1, c0, c1 = window
+        r0, c0 = max(r0, 0), max(c0, 0)
+        r1, c1 = min(r1, height), min(c1, width)
+        out = np.ones((max(r1 - r0, 0), max(c1 - c0, 0)), dtype=np.uint8)
+        if out.size == 0:
+            return out
+        ts = self.tile_size
+        for tr in range(r0 // ts, (r1 - 1) // ts + 1):
+            for tc in range(c0 // ts, (c1 - 1) // ts + 1):
+                tile = self.read_tile(level, tr, tc)
+                tr0, tc0 = tr * ts, tc * ts
+                a0, a1 = max(r0, tr0), min(r1, tr0 + tile.shape[0])
+                b0, b1 = max(c0, tc0), min(c1, tc0 + tile.shape[1])
+                out[a0 - r0:a1 - r0, b0 - c0:b1 - c0] = tile[a0 - tr0:a1 - tr0, b0 - tc0:b1 - tc0]
+        return out
+
+    def read_window(self, bbox_2d: Tuple[float, float, float, float], resolution: Optional[float] = None,
+                    level: Optional[int] = None) -> Tuple[np.ndarray, Tuple[float, float], float]:
+        """
+        读取与世界坐标矩形相交的所有格子（裁剪到grid范围内）
+
+        Args:
+            bbox_2d: (min_x, min_y, max_x, max_y)，世界坐标
+            resolution: 期望的分辨率，选择不粗于它的最粗一级；None表示第0级
+            level: 直接指定级别（优先于resolution）
+
+        Returns:
+            (grid, origin, resolution)：窗口grid（0为障碍，1为可通行），窗口第(0, 0)格左下角的世界坐标，
+            以及该级的分辨率。三者可以直接作为规划器的grid_map、origin和resolution参数
+        """
+        if level is None:
+            level = self.select_level(resolution)
+        res = self.level_resolution(level)
+        ox, oy = self.origin
+        height, width = self.level_shape(level)
+        min_x, min_y, max_x, max_y = bbox_2d
+        c0 = max(int(np.floor((min_x - ox) / res)), 0)
+        r0 = max(int(np.floor((min_y - oy) / res)), 0)
+        c1 = min(int(np.ceil((max_x - ox) / res)), width)
+        r1 = min(int(np.ceil((max_y - oy) / res)), height)
+        grid = self.read_cells(level, (r0, max(r1, r0), c0, max(c1, c0)))
+        return grid, (ox + c0 * res, oy + r0 * res), res
+
+    def read_level(self, level: int) -> np.ndarray:
+        """读取整级grid（粗级别可用作全局规划的概览图）"""
+        height, width = self.level_shape(level)
+        return self.read_cells(level, (0, height, 0, width))
+
+    def stats(self) -> Dict[str, dict]:
+        """每级的块数、均匀块数和块数据字节数"""
+        result = {}
+        for level, index in enumerate(self._indexes):
+            stored = index[:, 1] > 0
+            result[f"level_{level}"] = {
+                "tiles": int(len(index)),
+                "uniform_tiles": int((~stored).sum()),
+                "bytes": int(index[stored, 1].sum()),
+            }
+        return result
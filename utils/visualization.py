@@ -33,6 +33,8 @@ def plot_map(map_rep: MapRepresentation, agent_state: AgentState = None, show_gr
     :param show_collision_margin: 是否显示碰撞边缘
     """
     fig, ax = plt.subplots(figsize=figsize)
+    # 画布左下角的世界坐标
+    ox, oy = getattr(map_rep, "origin", (0.0, 0.0))
 
     # 1. 绘制栅格地图
     if map_rep.grid_map is not None and show_grid:
@@ -42,16 +44,16 @@ def plot_map(map_rep: MapRepresentation, agent_state: AgentState = None, show_gr
             origin='lower',
             cmap='Greys',
             alpha=config.get_visualization_alpha(),
-            extent=[0, map_rep.canvas_size[0], 0, map_rep.canvas_size[1]],
+            extent=[ox, ox + map_rep.canvas_size[0], oy, oy + map_rep.canvas_size[1]],
             interpolation='nearest',
             aspect='auto'  # 保证拉伸到整个画布
         )
-        ax.set_xlim(0, map_rep.canvas_size[0])
-        ax.set_ylim(0, map_rep.canvas_size[1])
+        ax.set_xlim(ox, ox + map_rep.canvas_size[0])
+        ax.set_ylim(oy, oy + map_rep.canvas_size[1])
     else:
         if hasattr(map_rep, "canvas_size") and map_rep.canvas_size is not None:
-            ax.set_xlim(0, map_rep.canvas_size[0])
-            ax.set_ylim(0, map_rep.canvas_size[1])
+            ax.set_xlim(ox, ox + map_rep.canvas_size[0])
+            ax.set_ylim(oy, oy + map_rep.canvas_size[1])
 
     # 2. 绘制所有物体的2D bbox
     for obj in map_rep.objects.values():